@@ -0,0 +1,281 @@
+# backends.py
+# Translation backend registry used by translate.py.
+# Each backend exposes the same small interface (translate one, translate a batch, supported
+# languages, limits), so new engines can be added here without touching the translation loop.
+
+import itertools
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from deep_translator import GoogleTranslator
+from deep_translator.constants import BASE_URLS
+from deep_translator.exceptions import AuthorizationException, ServerException, TooManyRequests, TranslationNotFound
+
+
+# Backend endpoints can be redirected (e.g. to mock_translate_server.py) with environment variables
+GOOGLE_URL = os.environ.get("TRANSLATOR_GOOGLE_URL")
+LIBRE_URL = os.environ.get("TRANSLATOR_LIBRE_URL")
+
+
+def google_translator(source, target):
+    translator = GoogleTranslator(source=source, target=target)
+    if GOOGLE_URL:
+        translator._base_url = GOOGLE_URL
+    return translator
+
+
+class TranslationBackend:
+    name = ""          # registry key
+    label = ""         # shown in menus, logs and metrics
+    network = True     # False for engines that run entirely on this machine
+    max_chars = 5000   # longest single text the engine accepts
+    max_batch = 1      # texts per translate_batch request
+    quota_rpm = 0      # requests per minute the engine allows (0 = no quota)
+    quota_cpm = 0      # characters per minute the engine allows (0 = no quota)
+
+    def translate(self, text, source, target):
+        raise NotImplementedError
+
+    # Default batch implementation: one request per text
+    def translate_batch(self, texts, source, target):
+        return [self.translate(text, source, target) for text in texts]
+
+    def supported_languages(self):
+        return set()
+
+    # Per-minute quotas, overridable with TRANSLATOR_<NAME>_RPM / TRANSLATOR_<NAME>_CPM
+    def quotas(self):
+        prefix = f"TRANSLATOR_{self.name.upper()}_"
+        return (int(os.environ.get(prefix + "RPM", self.quota_rpm)),
+                int(os.environ.get(prefix + "CPM", self.quota_cpm)))
+
+    def limits(self):
+        rpm, cpm = self.quotas()
+        return {"max_chars": self.max_chars, "max_batch": self.max_batch, "quota_rpm": rpm, "quota_cpm": cpm}
+
+
+BACKENDS = {}  # name -> backend class
+_instances = {}
+_instances_lock = threading.Lock()
+_factory = None  # name -> backend instance, replaces the registry classes (cassette.py record/replay)
+
+
+def register_backend(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+# Backends are created lazily and shared, so model loads and connection pools are reused
+def get_backend(name):
+    with _instances_lock:
+        if name not in _instances:
+            if name not in BACKENDS:
+                raise KeyError(f"Unknown translation backend '{name}'. Available: {', '.join(BACKENDS)}")
+            _instances[name] = _factory(name) if _factory else BACKENDS[name]()
+        return _instances[name]
+
+
+# Create backends through factory(name) from now on (None restores the registry classes)
+def set_backend_factory(factory):
+    global _factory
+    with _instances_lock:
+        _factory = factory
+        _instances.clear()
+
+
+@register_backend
+class GoogleBackend(TranslationBackend):
+    name = "google"
+    label = "Google"
+
+    def translate(self, text, source, target):
+        return google_translator(source, target).translate(text)
+
+    def supported_languages(self):
+        return set(GoogleTranslator().get_supported_languages(as_dict=True).values())
+
+
+# Libre endpoints: LIBRE_URLS is a comma-separated list of self-hosted instances (TRANSLATOR_LIBRE_URL
+# is still accepted for a single one). LIBRE_API_KEYS gives one key per URL in the same order, or a
+# single key for all of them; LIBRE_API_KEY is used when neither is set.
+def libre_endpoints():
+    urls = [u.strip() for u in os.environ.get("LIBRE_URLS", LIBRE_URL or "").split(",") if u.strip()]
+    if not urls:
+        urls = [BASE_URLS.get("LIBRE_FREE")]
+    keys = [k.strip() for k in os.environ.get("LIBRE_API_KEYS", os.environ.get("LIBRE_API_KEY", "")).split(",")]
+    if len(keys) == 1:
+        keys = keys * len(urls)
+    if len(keys) != len(urls):
+        raise ValueError(f"LIBRE_API_KEYS has {len(keys)} entries but LIBRE_URLS has {len(urls)}")
+    return [(url if url.endswith("/") else url + "/", key or None) for url, key in zip(urls, keys)]
+
+
+# Talks to the LibreTranslate API directly: array-batched /translate requests over a pooled
+# keep-alive session, spread round-robin across all configured endpoints. An endpoint that
+# fails (connection error, 5xx, 429) is skipped for a short cooldown and the request moves on.
+@register_backend
+class LibreBackend(TranslationBackend):
+    name = "libre"
+    label = "Libre"
+    max_chars = 5000
+    cooldown = 30  # seconds an endpoint is skipped after a failure
+
+    def __init__(self):
+        self.endpoints = libre_endpoints()
+        self.max_batch = int(os.environ.get("LIBRE_BATCH_SIZE", "32"))
+        pool_size = int(os.environ.get("LIBRE_POOL_SIZE", "8"))
+        self.timeout = float(os.environ.get("LIBRE_TIMEOUT", "15"))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.rotation = itertools.cycle(range(len(self.endpoints)))
+        self.down_until = [0.0] * len(self.endpoints)
+        self.lock = threading.Lock()
+        self.languages = None
+
+    # Endpoints in the order to try them: next in rotation first, endpoints in cooldown last
+    def _endpoint_order(self):
+        with self.lock:
+            first = next(self.rotation)
+        order = [(first + i) % len(self.endpoints) for i in range(len(self.endpoints))]
+        now = time.monotonic()
+        return sorted(order, key=lambda i: self.down_until[i] > now)
+
+    def _post(self, payload):
+        error = None
+        for i in self._endpoint_order():
+            url, key = self.endpoints[i]
+            body = dict(payload, api_key=key) if key else payload
+            try:
+                response = self.session.post(url + "translate", json=body, timeout=self.timeout)
+            except requests.RequestException:
+                error = ServerException(503)
+                self.down_until[i] = time.monotonic() + self.cooldown
+                continue
+            if response.status_code == 403:
+                raise AuthorizationException(key)
+            if response.status_code == 429 or response.status_code >= 500:
+                error = TooManyRequests() if response.status_code == 429 else ServerException(response.status_code)
+                self.down_until[i] = time.monotonic() + self.cooldown
+                continue
+            if response.status_code != 200:
+                raise ServerException(response.status_code)
+            return response.json()
+        raise error
+
+    def translate(self, text, source, target):
+        if source == target or not str(text).strip():
+            return text
+        result = self._post({"q": text, "source": source, "target": target, "format": "text"})
+        if not result or "translatedText" not in result:
+            raise TranslationNotFound(text)
+        return result["translatedText"]
+
+    # LibreTranslate accepts an array of q values and answers with an array in the same order
+    def translate_batch(self, texts, source, target):
+        if source == target:
+            return list(texts)
+        results = []
+        for start in range(0, len(texts), self.max_batch):
+            chunk = list(texts[start:start + self.max_batch])
+            result = self._post({"q": chunk, "source": source, "target": target, "format": "text"})
+            translated = result.get("translatedText") if result else None
+            if not isinstance(translated, list) or len(translated) != len(chunk):
+                raise TranslationNotFound(chunk)
+            results.extend(translated)
+        return results
+
+    def supported_languages(self):
+        if self.languages is None:
+            error = None
+            for i in self._endpoint_order():
+                try:
+                    response = self.session.get(self.endpoints[i][0] + "languages", timeout=min(self.timeout, 5))
+                    response.raise_for_status()
+                    self.languages = {lang["code"] for lang in response.json()}
+                    break
+                except requests.RequestException as e:
+                    error = e
+            else:
+                raise error
+        return self.languages
+
+
+# Local CPU engine: MarianMT (opus-mt) models loaded from disk with batched inference.
+# Models are looked up as <TRANSLATOR_LOCAL_MODEL_DIR>/opus-mt-<source>-<target>, so air-gapped
+# hosts only need the model folders copied over. Needs the optional packages transformers,
+# sentencepiece and torch (CPU build is enough).
+@register_backend
+class LocalModelBackend(TranslationBackend):
+    name = "local"
+    label = "Local"
+    network = False
+    max_chars = 2000
+
+    def __init__(self):
+        self.model_dir = os.environ.get("TRANSLATOR_LOCAL_MODEL_DIR", "models")
+        self.max_batch = int(os.environ.get("TRANSLATOR_LOCAL_BATCH_SIZE", "16"))
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def _model_path(self, source, target):
+        for src, tgt in ((source, target), (source.split("-")[0].lower(), target.split("-")[0].lower())):
+            path = os.path.join(self.model_dir, f"opus-mt-{src}-{tgt}")
+            if os.path.isdir(path):
+                return path
+        raise ValueError(f"No local model for {source} -> {target} (expected folder 'opus-mt-{source}-{target}' in '{self.model_dir}')")
+
+    def _load(self, source, target):
+        path = self._model_path(source, target)
+        with self.lock:
+            if path not in self.models:
+                try:
+                    import torch
+                    from transformers import MarianMTModel, MarianTokenizer
+                except ImportError as e:
+                    raise RuntimeError("The local backend needs 'transformers', 'sentencepiece' and 'torch'. "
+                                       "Install them with 'pip install transformers sentencepiece torch'.") from e
+                tokenizer = MarianTokenizer.from_pretrained(path)
+                model = MarianMTModel.from_pretrained(path)
+                model.eval()
+                self.models[path] = (tokenizer, model, torch)
+            return self.models[path]
+
+    def translate(self, text, source, target):
+        return self.translate_batch([text], source, target)[0]
+
+    def translate_batch(self, texts, source, target):
+        tokenizer, model, torch = self._load(source, target)
+        # Batch texts of similar length together to keep padding (wasted compute) low
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        results = [None] * len(texts)
+        for start in range(0, len(order), self.max_batch):
+            chunk = order[start:start + self.max_batch]
+            encoded = tokenizer([texts[i] for i in chunk], return_tensors="pt", padding=True, truncation=True, max_length=512)
+            with torch.inference_mode():
+                generated = model.generate(**encoded, num_beams=1, max_new_tokens=512)
+            for i, decoded in zip(chunk, tokenizer.batch_decode(generated, skip_special_tokens=True)):
+                results[i] = decoded
+        return results
+
+    def supported_languages(self):
+        codes = set()
+        if os.path.isdir(self.model_dir):
+            for entry in os.listdir(self.model_dir):
+                parts = entry.split("-")
+                if entry.startswith("opus-mt-") and len(parts) >= 4:
+                    codes.update(parts[2:4])
+        return codes
+
+
+# Backend menu for translate.py: each choice is a chain of backends tried in order
+BACKEND_CHOICES = {
+    "1": ("GoogleTranslator", ["google"]),
+    "2": ("LibreTranslator", ["libre"]),
+    "3": ("Try Google, fallback to Libre", ["google", "libre"]),
+    "4": ("Local CPU model (offline, batched)", ["local"]),
+}
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for translate.py, run fully offline against mock_translate_server.py.
+
+Generates synthetic workbooks (varying rows, languages, [BOLD] density and duplicate
+ratio), runs the real translate.py pipeline on each one in a scratch directory and
+reports cells/sec, p50/p95 backend request latency and peak RSS of the run.
+--check-libre only checks the pooled Libre backend against mock instances instead.
+
+Example:
+    python benchmark.py --rows 20 50 --langs 2 4 --bold-density 0.2 --latency-ms 20
+    python benchmark.py --check-libre
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import mock_translate_server
+from backends import LibreBackend
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LANGUAGE_POOL = ["fr", "de", "es", "it", "nl", "pt", "pl", "sv", "ar-SA", "ar-EG", "en-UK", "zh-CN"]
+WORDS = ("payment card transaction merchant fraud rule checkout cancel order amount limit "
+         "customer account risk score decline approve review device country currency").split()
+
+
+# Build a synthetic workbook: source column, empty language columns, optional [BOLD] rows and duplicates
+def make_workbook(path, rows, langs, bold_density=0.0, dup_ratio=0.0, seed=0):
+    rng = random.Random(seed)
+    sources = []
+    for i in range(rows):
+        if sources and rng.random() < dup_ratio:
+            sentence = rng.choice(sources)
+        else:
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14))).capitalize() + "."
+        sources.append(sentence)
+    records = []
+    for sentence in sources:
+        records.append(sentence)
+        if rng.random() < bold_density:
+            records.append("[BOLD] " + rng.choice(sentence.rstrip(".").split()))
+    columns = ["English"] + LANGUAGE_POOL[:langs]
+    df = pd.DataFrame([[text] + [""] * langs for text in records], columns=columns)
+    df.to_excel(path, index=False)
+    return len(sources), langs
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+# Run translate.py in workdir, answering its prompts on stdin; returns (wall seconds, exit code, peak RSS in MB)
+def run_translate(workdir, env, backend="1"):
+    answers = "\n".join(["en", "1", "", "", backend]) + "\n"
+    log_path = os.path.join(workdir, "translate_stdout.txt")
+    with open(log_path, "w", encoding="utf-8") as log:
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIR, "translate.py")], cwd=workdir, env=env,
+                                stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT)
+        proc.stdin.write(answers.encode("utf-8"))
+        proc.stdin.close()
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        elapsed = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return elapsed, proc.returncode, peak_rss_mb
+
+
+def run_scenario(servers, rows, langs, bold_density, dup_ratio, backend, seed):
+    server = servers[0]
+    host, port = server.server_address
+    env = dict(os.environ)
+    env["TRANSLATOR_GOOGLE_URL"] = f"http://{host}:{port}/m"
+    # Libre requests are spread over every mock instance, like a self-hosted cluster
+    env["LIBRE_URLS"] = ",".join(f"http://{h}:{p}/" for h, p in (s.server_address for s in servers))
+    with tempfile.TemporaryDirectory(prefix="translate_bench_") as workdir:
+        n_rows, n_langs = make_workbook(os.path.join(workdir, "bench.xlsx"), rows, langs, bold_density, dup_ratio, seed)
+        for s in servers:
+            s.state.reset()
+        elapsed, code, peak_rss_mb = run_translate(workdir, env, backend)
+        snapshots = [s.state.snapshot() for s in servers]
+        stats = {key: sum(snap[key] for snap in snapshots) for key in ("requests", "segments", "characters")}
+        stats["latencies"] = [lat for snap in snapshots for lat in snap["latencies"]]
+        if code != 0:
+            with open(os.path.join(workdir, "translate_stdout.txt"), encoding="utf-8") as log:
+                print(log.read()[-2000:])
+    cells = n_rows * n_langs
+    return {
+        "rows": rows,
+        "langs": langs,
+        "bold_density": bold_density,
+        "dup_ratio": dup_ratio,
+        "backend": backend,
+        "exit_code": code,
+        "cells": cells,
+        "wall_s": round(elapsed, 3),
+        "cells_per_s": round(cells / elapsed, 3) if elapsed else 0.0,
+        "requests": stats["requests"],
+        "segments": stats["segments"],
+        "characters": stats["characters"],
+        "p50_ms": round(percentile(stats["latencies"], 50) * 1000, 2),
+        "p95_ms": round(percentile(stats["latencies"], 95) * 1000, 2),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+    }
+
+
+# Check the pooled Libre backend against mock instances: texts go out as array-batched requests,
+# single requests alternate between the endpoints, and an endpoint that errors is put on cooldown
+# and skipped. Raises AssertionError on the first behaviour that doesn't hold.
+def check_libre_pool():
+    healthy = [mock_translate_server.start_in_thread(seed=i) for i in range(2)]
+    failing = mock_translate_server.start_in_thread(error_rate=1.0, seed=2)
+    saved = {name: os.environ.get(name) for name in ("LIBRE_URLS", "LIBRE_BATCH_SIZE", "LIBRE_API_KEYS", "LIBRE_API_KEY")}
+
+    def pool(servers):
+        os.environ["LIBRE_URLS"] = ",".join(f"http://{h}:{p}/" for h, p in (s.server_address for s in servers))
+        for server in servers:
+            server.state.reset()
+        return LibreBackend()
+
+    def sent(servers):
+        return [s.state.snapshot()["requests"] for s in servers]
+
+    try:
+        for name in ("LIBRE_API_KEYS", "LIBRE_API_KEY"):
+            os.environ.pop(name, None)
+        os.environ["LIBRE_BATCH_SIZE"] = "4"
+
+        backend = pool(healthy)
+        texts = [f"Decline payment rule {i}." for i in range(8)]
+        translated = backend.translate_batch(texts, "en", "fr")
+        assert translated == [mock_translate_server.fake_translate(t, "en", "fr") for t in texts], translated
+        snapshots = [s.state.snapshot() for s in healthy]
+        batches = sum(snap["batches"] for snap in snapshots)
+        assert sum(sent(healthy)) == 2 and batches == 2, f"8 texts in batches of 4: {snapshots}"
+        print(f"  batching: {len(texts)} texts in {batches} array requests")
+
+        backend = pool(healthy)
+        for i in range(6):
+            backend.translate(f"Review order {i}.", "en", "de")
+        assert sent(healthy) == [3, 3], f"round-robin: {sent(healthy)}"
+        print(f"  round-robin: {sent(healthy)} requests per endpoint")
+
+        backend = pool([healthy[0], failing])
+        for i in range(6):
+            assert backend.translate(f"Approve card {i}.", "en", "es").endswith("~es")
+        assert sent([healthy[0], failing]) == [6, 1], f"cooldown: {sent([healthy[0], failing])}"
+        print(f"  cooldown: the failing endpoint got 1 request, then was skipped for {backend.cooldown}s")
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        for server in healthy + [failing]:
+            server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark for translate.py")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--langs", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--bold-density", type=float, nargs="+", default=[0.0, 0.3])
+    parser.add_argument("--dup-ratio", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--backend", choices=["1", "2", "3"], default="1", help="Backend menu choice passed to translate.py")
+    parser.add_argument("--libre-servers", type=int, default=1, help="Number of mock Libre instances to pool across")
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rpm", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--check-libre", action="store_true",
+                        help="Only check the pooled Libre backend (batching, round-robin, cooldown) against mock servers")
+    args = parser.parse_args()
+
+    if args.check_libre:
+        print("Checking the pooled Libre backend against mock servers ...")
+        check_libre_pool()
+        print("Libre pool check passed.")
+        return
+
+    servers = [mock_translate_server.start_in_thread(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                                     error_rate=args.error_rate, throttle_rpm=args.throttle_rpm,
+                                                     seed=args.seed + i)
+               for i in range(max(1, args.libre_servers))]
+    results = []
+    try:
+        grid = itertools.product(args.rows, args.langs, args.bold_density, args.dup_ratio)
+        for rows, langs, bold_density, dup_ratio in grid:
+            print(f"Running rows={rows} langs={langs} bold={bold_density} dup={dup_ratio} ...", flush=True)
+            result = run_scenario(servers, rows, langs, bold_density, dup_ratio, args.backend, args.seed)
+            results.append(result)
+            print(f"  {result['cells_per_s']} cells/s, p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                  f"peak RSS {result['peak_rss_mb']} MB, {result['requests']} requests for {result['segments']} segments, exit {result['exit_code']}")
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        json.dump(results, out, indent=2)
+    print(f"\nResults saved to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
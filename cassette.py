@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# cassette.py
+# Record/replay of backend traffic for reproducible performance runs. In record mode every backend
+# call of a real run (forward, batch, [BOLD], back-translation QA, language lists) is written with its
+# result or error and its latency to a gzip-compressed JSON-lines cassette. In replay mode the
+# backends are replaced by the cassette: the same requests get the same answers in the same order,
+# offline and without spending quota, optionally with the recorded latencies.
+#
+#   python translate.py --record Fraud_Rules.cassette
+#   python translate.py --replay Fraud_Rules.cassette --profile                (as fast as possible)
+#   python translate.py --replay Fraud_Rules.cassette --replay-latency 1       (original latencies)
+#   python cassette.py info Fraud_Rules.cassette
+#
+# A cassette holds the workbook's text and its translations, so keep it as private as the workbook.
+
+import argparse
+import atexit
+import gzip
+import json
+import threading
+import time
+from collections import Counter, deque
+
+from backends import BACKENDS, TranslationBackend, set_backend_factory
+
+
+FORMAT_VERSION = 1
+# Backend attributes the engine reads; saved once per backend so replay behaves the same way
+ATTRIBUTES = ("label", "network", "max_chars", "max_batch", "quota_rpm", "quota_cpm")
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+# Error raised in replay where the recorded call failed (the original type is kept in the message)
+class ReplayedError(Exception):
+    pass
+
+
+def _key(op, source, target, query):
+    return (op, source, target, json.dumps(query, ensure_ascii=False))
+
+
+class CassetteWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.count = 0
+        self._write({"cassette": FORMAT_VERSION, "created": time.time()})
+
+    def _write(self, entry):
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def backend(self, name, backend):
+        self._write({"backend": name, **{attr: getattr(backend, attr) for attr in ATTRIBUTES}})
+
+    def call(self, name, op, source, target, query, seconds, result=None, error=None):
+        entry = {"b": name, "op": op, "s": source, "t": target, "q": query, "ms": round(seconds * 1000, 3)}
+        if error is None:
+            entry["r"] = result
+        else:
+            entry["e"] = f"{type(error).__name__}: {error}"
+        self._write(entry)
+        self.count += 1
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def read_cassette(path):
+    meta, calls = {}, []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("cassette") != FORMAT_VERSION:
+            raise ValueError(f"'{path}' is not a version {FORMAT_VERSION} cassette")
+        try:
+            for line in f:
+                entry = json.loads(line)
+                if "backend" in entry:
+                    meta[entry.pop("backend")] = entry
+                else:
+                    calls.append(entry)
+        except (EOFError, json.JSONDecodeError):
+            pass  # recording was killed mid-write; everything before that is still usable
+    return meta, calls
+
+
+# Real backend wrapped so that every call is written to the cassette
+class RecordingBackend(TranslationBackend):
+    def __init__(self, name, inner, writer):
+        self.name = name
+        self.inner = inner
+        self.writer = writer
+        for attr in ATTRIBUTES:
+            setattr(self, attr, getattr(inner, attr))
+        writer.backend(name, inner)
+
+    def _record(self, op, source, target, query, func):
+        started = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            self.writer.call(self.name, op, source, target, query, time.perf_counter() - started, error=e)
+            raise
+        self.writer.call(self.name, op, source, target, query, time.perf_counter() - started,
+                         sorted(result) if isinstance(result, set) else result)
+        return result
+
+    def translate(self, text, source, target):
+        return self._record("translate", source, target, text, lambda: self.inner.translate(text, source, target))
+
+    def translate_batch(self, texts, source, target):
+        return self._record("translate_batch", source, target, list(texts),
+                            lambda: self.inner.translate_batch(texts, source, target))
+
+    def supported_languages(self):
+        return self._record("supported_languages", None, None, None, self.inner.supported_languages)
+
+
+# Answers from the cassette. Identical requests get their recorded answers in order; once those run
+# out the last one is repeated, so retries and re-runs stay deterministic.
+class ReplayBackend(TranslationBackend):
+    def __init__(self, name, meta, calls, latency=0.0):
+        self.name = name
+        for attr, value in meta.items():
+            setattr(self, attr, value)
+        self.latency = latency  # multiplier for the recorded latency (0 = answer immediately)
+        self.answers = {}
+        for entry in calls:
+            self.answers.setdefault(_key(entry["op"], entry["s"], entry["t"], entry["q"]), deque()).append(entry)
+        self.lock = threading.Lock()
+        self.misses = 0
+
+    def _replay(self, op, source, target, query):
+        with self.lock:
+            answers = self.answers.get(_key(op, source, target, query))
+            if not answers:
+                self.misses += 1
+                raise CassetteMiss(f"{self.name}.{op}({source}->{target}) not in cassette: {str(query)[:80]}")
+            entry = answers.popleft() if len(answers) > 1 else answers[0]
+        if self.latency:
+            time.sleep(entry["ms"] / 1000 * self.latency)
+        if "e" in entry:
+            raise ReplayedError(entry["e"])
+        return entry["r"]
+
+    def translate(self, text, source, target):
+        return self._replay("translate", source, target, text)
+
+    def translate_batch(self, texts, source, target):
+        return self._replay("translate_batch", source, target, list(texts))
+
+    def supported_languages(self):
+        return set(self._replay("supported_languages", None, None, None))
+
+
+# Route all backends through a cassette; returns the writer (record) so it can be closed at the end
+def start_recording(path):
+    writer = CassetteWriter(path)
+    atexit.register(writer.close)  # early exits still leave a readable file
+    set_backend_factory(lambda name: RecordingBackend(name, BACKENDS[name](), writer))
+    return writer
+
+
+def start_replay(path, latency=0.0):
+    meta, calls = read_cassette(path)
+    by_backend = {}
+    for entry in calls:
+        by_backend.setdefault(entry["b"], []).append(entry)
+    set_backend_factory(lambda name: ReplayBackend(name, meta.get(name, {"label": BACKENDS[name].label}),
+                                                   by_backend.get(name, []), latency))
+    return len(calls)
+
+
+def info(path):
+    meta, calls = read_cassette(path)
+    counts, errors, seconds, characters = Counter(), Counter(), Counter(), Counter()
+    for entry in calls:
+        key = (entry["b"], entry["op"])
+        counts[key] += 1
+        errors[key] += "e" in entry
+        seconds[key] += entry["ms"] / 1000
+        query = entry["q"]
+        characters[key] += len(query) if isinstance(query, str) else sum(map(len, query or []))
+    print(f"{path}: {len(calls)} calls, backends: {', '.join(sorted(meta)) or 'none'}")
+    for (backend, op), n in sorted(counts.items()):
+        print(f"  {backend:>8} {op:<20} {n:>6} calls  {errors[backend, op]:>4} errors  "
+              f"{characters[backend, op]:>9} chars  {seconds[backend, op]:8.2f}s recorded latency")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend traffic cassettes (record with translate.py --record)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("info", help="Calls, errors, characters and recorded latency per backend and operation")
+    p.add_argument("cassette")
+    args = parser.parse_args()
+    info(args.cassette)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# classifier.py
+# Segments that don't need translation: empty cells, numbers and amounts, URLs, e-mail addresses,
+# IDs and error codes, bare placeholders, and cells made up only of ignore terms. They are copied
+# into every language column as they are, without a backend request or back-translation QA, and
+# count as skipped cells. The checks are deliberately conservative: a cell with even one ordinary
+# word in it is translated.
+
+import re
+
+import pandas as pd
+
+
+URL = re.compile(r"(?:[a-z][a-z0-9+.-]*://|www\.)\S+", re.IGNORECASE)
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Single token with a digit, an underscore or an inner capital: ERR_4021, TXN-2023-0001, 0x1F, maxAmount
+IDENTIFIER = re.compile(r"(?=\S*(?:\d|_|[a-z][A-Z]))[A-Za-z0-9_.:/#-]+")
+# Only bracketed/braced placeholders and format specifiers: [CARD_NUMBER], {amount}, %s
+PLACEHOLDERS = re.compile(r"(?:\[[^\]]+\]|\{[^}]+\}|%[sd]|\s|[.,:;-])+")
+SEPARATORS = re.compile(r"[\s.,:;!?()\[\]{}/|&+*-]+")
+
+
+# Why a source cell is copied through instead of translated, or None if it needs translating
+def skip_reason(value, ignore_terms=()):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return "empty"
+    text = str(value).strip()
+    if not text:
+        return "empty"
+    if not any(ch.isalpha() for ch in text):
+        return "number"  # digits, amounts, dates, percentages, punctuation
+    if URL.fullmatch(text):
+        return "url"
+    if EMAIL.fullmatch(text):
+        return "email"
+    if IDENTIFIER.fullmatch(text):
+        return "identifier"
+    if PLACEHOLDERS.fullmatch(text):
+        return "placeholder"
+    if ignore_terms:
+        rest = text
+        for term in sorted(ignore_terms, key=len, reverse=True):
+            rest = re.sub(re.escape(term), " ", rest, flags=re.IGNORECASE)
+        if not SEPARATORS.sub("", rest):
+            return "ignore terms"
+    return None
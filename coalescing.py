@@ -0,0 +1,51 @@
+# coalescing.py
+# Single-flight request coalescing. When a request is already in flight for the same key (same
+# backend, languages and text), a second caller doesn't send it again: it waits for the first call
+# and gets the same result, or the same exception. Nothing is kept once the call returns, so this
+# is not a cache; it only merges requests that overlap in time, e.g. two service jobs with the same
+# rows, or concurrent workers reaching the same segment.
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}  # key -> _Call in flight
+        self.lock = threading.Lock()
+
+    # func(*args), or the result of the identical call already in flight. Returns (value, shared);
+    # joined() is called when this caller joins another call instead of making its own.
+    def do(self, key, func, *args, joined=None):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+        if not leader:
+            if joined:
+                joined()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = func(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.value, False
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
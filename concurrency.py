@@ -0,0 +1,135 @@
+# concurrency.py
+# Adaptive concurrency per backend (AIMD). Each backend gets a controller that caps how many of its
+# requests are in flight. After every window of completed requests whose p95 latency and error rate
+# look healthy, the cap goes up by one (additive increase). A timeout or a 429 halves it at once
+# (multiplicative decrease); latency creeping above LATENCY_FACTOR x the healthy baseline or an
+# error rate above ERROR_BUDGET shrinks it by a quarter. Only one decrease is applied per
+# congestion event: failures of requests that were sent before the last change are ignored.
+# Every change is kept in the controller's history for the run report.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+LATENCY_FACTOR = 2.0  # p95 above this multiple of the healthy baseline counts as congestion
+ERROR_BUDGET = 0.1    # share of failed requests in a window that still counts as healthy
+MIN_WINDOW = 8        # completed requests per evaluation (at least the current limit)
+
+
+# 429 / rate-limit errors from any backend (deep_translator's TooManyRequests, HTTP 429, replayed ones)
+def is_throttled(error):
+    text = f"{type(error).__name__}: {error}"
+    return "TooManyRequests" in text or "429" in text or "Too Many Requests" in text
+
+
+class AIMDController:
+    def __init__(self, label, maximum=8, minimum=1, initial=1):
+        self.label = label
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = max(minimum, min(initial, maximum))
+        self.in_flight = 0
+        self.peak = self.limit
+        self.cond = threading.Condition()
+        self.samples = []         # (seconds, outcome) since the last evaluation
+        self.baseline = None      # p95 of a healthy window, in seconds
+        self.changed = time.monotonic()
+        self.history = []         # (time.time(), old limit, new limit, reason)
+
+    # Wait for a free slot; returns the start time to pass to release()
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= self.limit:
+                self.cond.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    # outcome: "ok", "error", "timeout" or "throttled"
+    def release(self, started, seconds, outcome):
+        with self.cond:
+            self.in_flight -= 1
+            if outcome in ("timeout", "throttled"):
+                if started >= self.changed:
+                    self._set(self.limit // 2, outcome)
+            else:
+                self.samples.append((seconds, outcome))
+                if len(self.samples) >= max(MIN_WINDOW, self.limit):
+                    self._evaluate()
+            self.cond.notify_all()
+
+    # Run func(*args) in a slot, classifying its outcome
+    def call(self, func, *args):
+        started = self.acquire()
+        outcome = "ok"
+        try:
+            return func(*args)
+        except Exception as e:
+            outcome = "throttled" if is_throttled(e) else "error"
+            raise
+        finally:
+            self.release(started, time.monotonic() - started, outcome)
+
+    def _evaluate(self):
+        latencies = sorted(seconds for seconds, outcome in self.samples if outcome == "ok")
+        error_rate = 1 - len(latencies) / len(self.samples)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        if self.limit == self.minimum and p95 is not None:
+            self.baseline = p95  # at the floor the latency is the backend's own, whatever the time of day
+        if error_rate > ERROR_BUDGET:
+            self._set(self.limit * 3 // 4, f"error rate {error_rate:.0%}")
+        elif self.baseline is not None and p95 > LATENCY_FACTOR * self.baseline:
+            self._set(self.limit * 3 // 4, f"p95 {p95:.2f}s > {LATENCY_FACTOR:g}x baseline {self.baseline:.2f}s")
+        else:
+            if p95 is not None:
+                self.baseline = p95 if self.baseline is None else min(self.baseline, p95)
+            self._set(self.limit + 1, f"healthy (p95 {p95 or 0:.2f}s, errors {error_rate:.0%})")
+
+    def _set(self, limit, reason):
+        limit = max(self.minimum, min(self.maximum, limit))
+        if limit != self.limit:
+            self.history.append((time.time(), self.limit, limit, reason))
+            self.limit = limit
+            self.peak = max(self.peak, limit)
+        self.changed = time.monotonic()
+        self.samples = []
+
+    def report_lines(self, since=0.0):
+        changes = [entry for entry in self.history if entry[0] >= since]
+        lines = [f"{self.label}: limit {self.limit} (peak {self.peak}, max {self.maximum}), {len(changes)} changes"]
+        for stamp, old, new, reason in changes:
+            when = f"+{stamp - since:.1f}s" if since else time.strftime("%H:%M:%S", time.localtime(stamp))
+            lines.append(f"  {when:>9} {old:>3} -> {new:<3} {reason}")
+        return lines
+
+
+# One controller per backend label, shared by everything in the process (like the quota windows)
+class ConcurrencyLimits:
+    def __init__(self):
+        self.controllers = {}
+        self.lock = threading.Lock()
+
+    def controller(self, label, maximum):
+        with self.lock:
+            if label not in self.controllers:
+                self.controllers[label] = AIMDController(label, maximum)
+            controller = self.controllers[label]
+        with controller.cond:
+            controller.maximum = maximum
+            controller.limit = min(controller.limit, maximum)
+        return controller
+
+    def get(self, label):
+        return self.controllers.get(label)
+
+
+# func over items on `workers` threads (the controllers decide how many requests are really in flight).
+# Results in input order; a call that raised leaves its exception in its place.
+def map_concurrently(func, items, workers):
+    def run(item):
+        try:
+            return func(item)
+        except Exception as e:
+            return e
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(run, items))
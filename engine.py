@@ -0,0 +1,944 @@
+# engine.py
+# Importable translation engine: everything translate.py does between loading a workbook and
+# writing the output, as translate_dataframe(df, targets, options). translate.py,
+# test_translate.py and translation_service.py all run on it. Backends, their connection pools,
+# the supported-language catalogue, quota windows, concurrency controllers, requests in flight and
+# the chunking pool are module-level and shared, so a long-running process keeps them warm between
+# jobs (and jobs running at the same time share identical requests).
+
+import csv
+import difflib
+import re
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import openpyxl
+import pandas as pd
+from langdetect import DetectorFactory, detect, LangDetectException
+from langdetect.detector_factory import init_factory
+from openpyxl.styles import Font
+
+from backends import BACKENDS, BACKEND_CHOICES, get_backend
+from classifier import skip_reason
+from coalescing import SingleFlight
+from concurrency import ConcurrencyLimits, is_throttled, map_concurrently
+from metrics import Metrics
+from profiling import PhaseProfiler
+from results_store import ResultStore, STATUS_NAMES, STATUS_OK, STATUS_SUSPECT, STATUS_FAILED, STATUS_SKIPPED
+from scheduler import QuotaScheduler, interleave_by_length, format_duration
+from segmenter import split_into_chunks, translate_chunked
+from sharding import ShardPool
+from tracing import TraceRecorder
+
+# Import mapping from language_mapping.py
+try:
+    from language_mapping import LANGUAGE_MAPPING, resolve_language
+except ImportError:
+    LANGUAGE_MAPPING = {}
+    def resolve_language(header):
+        return header
+
+
+# Preprocess input for clarity: clean whitespace, remove unnecessary punctuation, standardize casing
+def preprocess_text(text):
+    # Remove extra whitespace
+    text = ' '.join(str(text).split())
+    # Remove unnecessary punctuation except for basic sentence structure
+    allowed_punct = set('.!?,-:;')
+    text = ''.join(ch for ch in text if ch.isalnum() or ch.isspace() or ch in allowed_punct)
+    # Standardize casing (capitalize first letter, rest lower)
+    if text:
+        text = text[0].upper() + text[1:]
+    return text
+
+
+# CPU-bound stages, written as batch functions so ShardPool can run them in worker processes
+def preprocess_batch(texts):
+    return [preprocess_text(text) for text in texts]
+
+
+# langdetect publishes its detector factory before the language profiles are loaded, so a second
+# thread detecting during the first load sees only some languages (German comes back as Polish).
+# Jobs that run in step, e.g. with shared requests, hit that at once, so the first load is locked.
+_langdetect_lock = threading.Lock()
+# langdetect samples at random; a fixed seed gives the same detected language for the same text on
+# every run, so a --replay reproduces the recorded run's QA results exactly
+DetectorFactory.seed = 0
+
+
+# Back-translation similarity and detected language for each translated cell
+def qa_batch(sources, back_translations, translations):
+    with _langdetect_lock:
+        init_factory()
+    results = []
+    for source, back_translated, translated in zip(sources, back_translations, translations):
+        similarity = difflib.SequenceMatcher(None, source, back_translated).ratio() if back_translated else 0.0
+        try:
+            detected_lang = detect(translated)
+        except LangDetectException:
+            detected_lang = "unknown"
+        results.append((similarity, detected_lang))
+    return results
+
+
+# Markdown bold (**...**) and italics (*...*) to (plain text, font) for the formatting pass
+def format_batch(values):
+    results = []
+    for value in values:
+        font = None
+        if "**" in value and re.search(r"\*\*([^*]+)\*\*", value):
+            value = re.sub(r"\*\*([^*]+)\*\*", r"\1", value)
+            font = "bold"
+        # Italic formatting for ignored terms
+        if "*" in value and re.search(r"\*([^*]+)\*", value):
+            value = re.sub(r"\*([^*]+)\*", r"\1", value)
+            font = "italic"
+        results.append((value, font))
+    return results
+
+
+# Detect [BOLD] rows: returns (bold_pairs, rows_to_translate), where bold_pairs holds
+# (main_row_idx, bold_words, bold_row_idx) and rows_to_translate the main text rows
+def find_bold_rows(df):
+    bold_pairs = []
+    rows_to_translate = []
+    i = 0
+    while i < len(df):
+        cell_val = str(df.iloc[i, 0]) if pd.notna(df.iloc[i, 0]) else ""
+        if cell_val.strip().startswith("[BOLD]"):
+            # This is a [BOLD] row, pair with previous row
+            if i > 0:
+                bold_words = [w.strip() for w in cell_val.strip()[6:].split(",") if w.strip()]
+                bold_pairs.append((i-1, bold_words, i))
+            i += 1
+        else:
+            rows_to_translate.append(i)
+            i += 1
+    return bold_pairs, rows_to_translate
+
+
+# Language codes known to any registered backend (backends that can't be reached are skipped).
+# The catalogue is fetched once per process and reused by later jobs.
+_supported_codes = None
+_supported_codes_lock = threading.Lock()
+
+
+def supported_language_codes():
+    global _supported_codes
+    with _supported_codes_lock:
+        if _supported_codes is None:
+            supported_codes = set()
+            for name in BACKENDS:
+                try:
+                    supported_codes |= get_backend(name).supported_languages()
+                except Exception:
+                    pass
+            _supported_codes = supported_codes
+        return _supported_codes
+
+
+# Validate columns: support codes, mapped names, or a mix. Returns ([(col_name, target_code)], skipped_headers)
+def find_language_columns(df, supported_codes):
+    valid_columns = []
+    skipped_codes = []
+    for col in [str(col).strip() for col in df.columns[1:]]:
+        if not col:
+            skipped_codes.append("<empty header>")
+        elif col in supported_codes or col in LANGUAGE_MAPPING or len(col) == 2:
+            # Always keep the original header; only the code sent to the backend is resolved
+            valid_columns.append((col, resolve_language(col)))
+        else:
+            skipped_codes.append(col)
+    return valid_columns, skipped_codes
+
+
+# Technical document: more forgiving criteria
+def is_suspect(similarity, detected_lang, target_code, lang_code):
+    return similarity < 0.7 or detected_lang not in [target_code, lang_code, "unknown", "en"]
+
+
+# Insert [BOLD] rows as new rows in the main sheet after each main row (always).
+# bold_translate(bold_word, target_code, main_row_idx) returns the translation, or "" if there is none.
+def add_bold_rows(df, bold_pairs, valid_columns, bold_translate):
+    bold_rows = {bold_row_idx: (main_idx, bold_words) for (main_idx, bold_words, bold_row_idx) in bold_pairs}
+    new_rows = []
+    for idx in range(df.shape[0]):
+        # If this is a [BOLD] row, insert the bold row only (do not add extra row above)
+        if idx not in bold_rows:
+            new_rows.append(df.iloc[idx])
+            continue
+        # Build a new row for bold words, keep '[BOLD]' in the source column for clarity
+        phrase = df.iloc[idx, 0].strip()
+        if not phrase.startswith('[BOLD]'):
+            phrase = '[BOLD] ' + phrase
+        bold_row = pd.Series([phrase], index=[df.columns[0]])
+        for col_name, target_code in valid_columns:
+            translated_bolds = []
+            main_idx, bold_words = bold_rows[idx]
+            for bold_word in bold_words:
+                bold_translated = bold_translate(bold_word, target_code, main_idx)
+                if not bold_translated or str(bold_translated).strip() == "":
+                    # Italicize if not translated
+                    translated_bolds.append(f"*{bold_word}*")
+                else:
+                    translated_bolds.append(str(bold_translated))
+            bold_row[col_name] = ", ".join(translated_bolds)
+        new_rows.append(bold_row)
+    # Rebuild DataFrame
+    return pd.DataFrame(new_rows, columns=df.columns)
+
+
+# Save main results and suspects to separate sheets in the same Excel file
+def write_workbook(df_with_bold, suspect_translations, output_file):
+    # Ensure output file is created even if there are no translations
+    # Output columns should always match input headers, never auto-corrected or mapped
+    output_cols = list(df_with_bold.columns)
+    with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+        if df_with_bold.shape[0] == 0:
+            empty_df = pd.DataFrame(columns=output_cols)
+            empty_df.to_excel(writer, index=False, sheet_name="Translations")
+        else:
+            df_with_bold[output_cols].to_excel(writer, index=False, sheet_name="Translations")
+        if suspect_translations:
+            suspects_df = pd.DataFrame(suspect_translations)
+            suspects_df.to_excel(writer, index=False, sheet_name="SuspectTranslations")
+
+
+# Apply real bold and italic formatting in Excel for markdown bold (**...**) and italics (*...*)
+def format_workbook(output_file, shard_pool):
+    wb = openpyxl.load_workbook(output_file)
+    for sheet_name in ["Translations", "SuspectTranslations"]:
+        if sheet_name in wb.sheetnames:
+            ws = wb[sheet_name]
+            # Only cells with markdown need work; the regex part is sharded, openpyxl updates stay here
+            marked = [cell for row in ws.iter_rows(min_row=2)  # skip header
+                      for cell in row if cell.value and isinstance(cell.value, str) and "*" in cell.value]
+            for cell, (new_val, font) in zip(marked, shard_pool.map(format_batch, [cell.value for cell in marked])):
+                if font:
+                    cell.value = new_val
+                    cell.font = Font(bold=True) if font == "bold" else Font(italic=True)
+    wb.save(output_file)
+
+
+def write_failed_log(failed_translations, path="failed_translations_log.csv"):
+    with open(path, mode="w", newline="", encoding="utf-8") as log_file:
+        writer = csv.DictWriter(
+            log_file,
+            fieldnames=["row", "english_text", "language_code", "short_code", "error"]
+        )
+        writer.writeheader()
+        writer.writerows(failed_translations)
+
+
+# [BOLD] alignment: wrap each bold word's first occurrence in placeholder markers before the main
+# translation (__BOLD_0__ word __END_0__), so its translation can be read straight from the output.
+# Returns (marked text, [whether each bold word was found and marked]); marker i belongs to bold word i.
+def mark_bold_spans(text, bold_words):
+    spans = []
+    for bold_word in bold_words:
+        match = re.search(re.escape(bold_word), text, re.IGNORECASE)
+        taken = match and any(start < match.end() and match.start() < end for start, end in spans)
+        spans.append(None if not match or taken else match.span())
+    marked = text
+    # Insert from the right so earlier offsets stay valid
+    for i, span in sorted(enumerate(spans), key=lambda item: item[1] or (-1, -1), reverse=True):
+        if span:
+            start, end = span
+            marked = f"{marked[:start]}__BOLD_{i}__ {marked[start:end]} __END_{i}__{marked[end:]}"
+    return marked, [span is not None for span in spans]
+
+
+BOLD_SPAN_PATTERN = re.compile(r"__BOLD_(\d+)__\s*(.*?)\s*__END_\1__", re.DOTALL)
+BOLD_MARKER_LEFTOVER = re.compile(r"(?i)(?:bold|end)\s*_\s*\d+")
+
+
+# Translated text with the markers removed and {marker index: translated span}.
+# The text is None when the backend mangled the markers, so the row has to be translated again unmarked.
+def read_bold_spans(translated):
+    spans = {int(i): span for i, span in BOLD_SPAN_PATTERN.findall(translated) if span.strip()}
+    plain = re.sub(r"\s*__END_\d+__", "", re.sub(r"__BOLD_\d+__\s*", "", translated))
+    if BOLD_MARKER_LEFTOVER.search(plain):
+        return None, {}
+    return plain, spans
+
+
+# Shared, warm state: one quota window and one concurrency controller per backend, the requests in
+# flight, and one pool for translating chunks of long cells
+_scheduler = QuotaScheduler()
+_concurrency = ConcurrencyLimits()
+_inflight = SingleFlight()
+_chunk_executor = ThreadPoolExecutor(max_workers=4)
+
+
+# Cells longer than a backend accepts are split at sentence boundaries, the chunks are
+# translated in parallel and joined back in order (forward translation and back-translation QA)
+def chunked(backend):
+    def translate(text, source, target):
+        return translate_chunked(lambda chunk: backend.translate(chunk, source, target), text, backend.max_chars, _chunk_executor)
+    return translate
+
+
+# Oversized cells get one timeout per chunk they are split into
+def request_timeout(text, backend, timeout=15):
+    return timeout * max(1, -(-len(text) // backend.max_chars))
+
+
+# Backend requests a cell turns into: one, or one per non-blank chunk when it is too long
+def request_count(text, backend):
+    if len(text) <= backend.max_chars:
+        return 1
+    return max(1, sum(1 for chunk, _ in split_into_chunks(text, backend.max_chars) if chunk.strip()))
+
+
+# Trace span names per request kind (translate.py --trace)
+REQUEST_SPANS = {"forward": "forward", "batch": "batch", "qa": "QA back-translation", "bold": "[BOLD] lookup"}
+
+
+# Helper: run translation with timeout, recording latency/outcome when a backend label is given
+def translate_with_timeout(func, args=(), timeout=15, backend=None, language=None, kind="forward", metrics=None,
+                           tracer=None, requests=1):
+    result = {}
+    def wrapper():
+        try:
+            result['value'] = func(*args)
+        except Exception as e:
+            result['error'] = e
+    text = args[0] if args else ""
+    characters = len(text) if isinstance(text, str) else sum(len(t) for t in text if isinstance(t, str))
+    queued = time.perf_counter()
+    # With --concurrency the backend's AIMD controller decides how many requests may be in flight
+    controller = _concurrency.get(backend) if backend else None
+    if controller:
+        slot = controller.acquire()
+    if backend:
+        # Quota waits happen before the timeout starts, so queueing never counts as a failure
+        waited = _scheduler.acquire(backend, characters, requests)
+        if waited and metrics:
+            metrics.inc("quota_waits_total", backend=backend)
+            metrics.inc("quota_wait_seconds_total", waited, backend=backend)
+    started = time.perf_counter()
+    if tracer and started - queued >= 0.001:
+        tracer.add("queue wait", "queue", queued, started, backend=backend, kind=kind, language=language,
+                   quota_seconds=round(waited, 3) if backend else 0)
+    # A request that outlives its timeout can't be cancelled; as a daemon thread it at least never
+    # holds a pool slot or keeps the process from exiting
+    thread = threading.Thread(target=wrapper, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    timed_out = thread.is_alive()
+    outcome = "timeout" if timed_out else ("error" if 'error' in result else "ok")
+    if controller:
+        throttled = outcome == "error" and is_throttled(result['error'])
+        controller.release(slot, time.perf_counter() - started, "throttled" if throttled else outcome)
+    if backend and metrics:
+        metrics.observe_request(backend, language or "", time.perf_counter() - started, kind, characters, outcome)
+    if tracer:
+        tracer.add(f"{REQUEST_SPANS.get(kind, kind)} {backend or ''}".strip(), "request", started, time.perf_counter(),
+                   backend=backend, language=language, characters=characters, outcome=outcome,
+                   **({"error": f"{type(result['error']).__name__}: {result['error']}"} if outcome == "error" else {}))
+    if timed_out:
+        return None, TimeoutError('Translation timed out')
+    return result.get('value'), result.get('error')
+
+
+class EngineOptions:
+    def __init__(self, source_lang="en", backend_choice="1", ignore_terms=(), processes=1, shard_pool=None,
+                 profiler=None, metrics=None, log=print, timeout=15, max_attempts=3, pacing=0.3, memory=None,
+                 bold_alignment=True, skip_untranslatable=True, concurrency=1, tracer=None, retry_delay=5.0):
+        self.source_lang = source_lang
+        self.backend_choice = backend_choice  # key of BACKEND_CHOICES
+        self.ignore_terms = list(ignore_terms)
+        self.processes = processes            # worker processes for CPU-bound stages (see sharding.py)
+        self.shard_pool = shard_pool          # reuse a caller's ShardPool instead of starting one
+        self.profiler = profiler or PhaseProfiler(enabled=False)
+        self.tracer = tracer or TraceRecorder(enabled=False)  # per-cell timeline (translate.py --trace)
+        self.metrics = metrics or Metrics()
+        self.log = log                        # progress/warning messages
+        self.timeout = timeout                # seconds per backend request
+        self.max_attempts = max_attempts      # attempts per cell before it is marked failed (1 + deferred retry rounds)
+        self.retry_delay = retry_delay        # seconds before the first deferred retry round, doubling per round
+        self.pacing = pacing                  # pause between cells, seconds
+        self.memory = memory                  # TranslationMemory consulted before the backends (None = off)
+        self.bold_alignment = bold_alignment  # read [BOLD] words from the marked main translation
+        self.skip_untranslatable = skip_untranslatable  # copy numbers, IDs, URLs, ... through (see classifier.py)
+        # Most requests in flight per backend. Above 1, forward translations and back-translations are
+        # sent concurrently without the pause between cells, and an AIMD controller per backend finds
+        # the level between 1 and this from latency, errors, timeouts and 429s (see concurrency.py)
+        self.concurrency = concurrency
+
+
+class TranslationResult:
+    def __init__(self, df, store, valid_columns, skipped_codes, metrics):
+        self.df = df                          # input rows with the language columns filled in
+        self.df_with_bold = None              # df with [BOLD] rows replaced by their translations
+        self.store = store
+        self.valid_columns = valid_columns    # [(col_name, target_code)]
+        self.skipped_codes = skipped_codes    # headers that were not translated
+        self.metrics = metrics
+        self.interrupted = False
+        self.failed_translations = []
+        self.suspect_translations = []
+        self.memory_hits = {"exact": 0, "fuzzy": 0, "reviewed": 0}  # cells served from the translation memory
+        self.concurrency_report = []          # concurrency changes per backend during the run (--concurrency)
+        self.coalesced = 0                    # requests that joined an identical one already in flight
+        self.retry_queued = 0                 # cells whose first attempt failed and went to the deferred retry queue
+        self.retry_recovered = 0              # of those, cells a deferred retry round translated
+
+    @property
+    def success_count(self):
+        return self.store.count(STATUS_OK, STATUS_SUSPECT)
+
+    @property
+    def skip_count(self):
+        return self.store.count(STATUS_SKIPPED)
+
+    @property
+    def fail_count(self):
+        return self.store.count(STATUS_FAILED)
+
+    @property
+    def exclusion_report(self):
+        if not self.skipped_codes:
+            return ""
+        return f"Excluded columns (unsupported or empty): {', '.join(map(str, self.skipped_codes))}"
+
+
+# Everything a run decides before its first request: which rows and columns are translated, the
+# preprocessed and [BOLD]-marked texts, translation memory hits, and the backend traffic that is left
+class RunPlan:
+    def __init__(self, df, bold_pairs, rows_to_translate, valid_columns, skipped_codes, backend_chain, assist_backend):
+        self.df = df                          # copy of the input with empty language columns added
+        self.bold_pairs = bold_pairs          # [(main_row_idx, bold_words, bold_row_idx)]
+        self.rows_to_translate = rows_to_translate
+        self.skipped_rows = {}                # row_idx -> why it is copied through (classifier.skip_reason)
+        self.valid_columns = valid_columns    # [(col_name, target_code)]
+        self.skipped_codes = skipped_codes
+        self.language_groups = {}             # target_code -> [col_name, ...]
+        for col, target_code in valid_columns:
+            self.language_groups.setdefault(target_code, []).append(col)
+        self.backend_chain = backend_chain    # tried in order for each cell (more than one means fallback)
+        self.assist_backend = assist_backend  # [BOLD] lookups and back-translation QA
+        self.bold_by_row = {main_idx: bold_words for main_idx, bold_words, _ in bold_pairs}
+        self.prepped_texts = {}               # row_idx -> preprocessed source text
+        self.request_texts = {}               # row_idx -> what is actually sent (with [BOLD] markers)
+        self.marked_rows = {}                 # row_idx -> [whether each bold word was marked]
+        self.memory_hits = {}                 # target_code -> {row_idx: translation_memory.Match}
+        self.concurrency = 1                  # EngineOptions.concurrency
+
+    @property
+    def unique_segments(self):
+        return len(set(self.prepped_texts.values()))
+
+    @property
+    def cells(self):
+        return len(self.rows_to_translate) * len(self.language_groups)
+
+    # Requests and characters each backend will be sent, by kind: {(label, kind): [requests, characters]}.
+    # Retries and fallback after errors can't be known up front and are not included.
+    def traffic(self):
+        primary, assist = self.backend_chain[0], self.assist_backend
+        planned = {}
+        def add(label, kind, requests, characters):
+            totals = planned.setdefault((label, kind), [0, 0])
+            totals[0] += requests
+            totals[1] += characters
+        def pieces(text, backend):
+            return max(1, -(-len(text) // backend.max_chars))
+        for target_code in self.language_groups:
+            hits = self.memory_hits.get(target_code, {})
+            rows = [r for r in self.rows_to_translate if r not in hits]
+            texts = [self.request_texts[r] for r in rows]
+            oversized = texts
+            if primary.max_batch > 1:
+                # Batches carry each distinct text once; oversized cells go one by one, in chunks
+                unique_texts = list(dict.fromkeys(t for t in texts if len(t) <= primary.max_chars))
+                add(primary.label, "batch", -(-len(unique_texts) // primary.max_batch), sum(map(len, unique_texts)))
+                oversized = [t for t in texts if len(t) > primary.max_chars]
+            qa_texts = [self.prepped_texts[r] for r in rows]
+            if self.concurrency > 1:
+                # Concurrent runs send each distinct text once (and back-translate each distinct translation)
+                oversized = list(dict.fromkeys(oversized))
+                qa_texts = list(dict.fromkeys(qa_texts))
+            if oversized:
+                add(primary.label, "forward", sum(pieces(t, primary) for t in oversized), sum(map(len, oversized)))
+            # Back-translation QA: one call per cell, roughly as long as the source
+            add(assist.label, "qa", sum(pieces(t, assist) for t in qa_texts), sum(map(len, qa_texts)))
+            # Standalone [BOLD] lookups for words alignment can't cover: one per word in the loop, then
+            # one per distinct word for the [BOLD] row (memory hits carry no markers, so all their words;
+            # rows copied through have no note, but their [BOLD] row is still filled)
+            words = [(main_idx, w) for main_idx, bold_words in self.bold_by_row.items()
+                     for w, found in zip(bold_words, self.marked_rows.get(main_idx, [False] * len(bold_words)))
+                     if main_idx in hits or main_idx in self.skipped_rows or not found]
+            in_loop = [w for main_idx, w in words if main_idx not in self.skipped_rows]
+            distinct = set(w for _, w in words)
+            add(assist.label, "bold", len(in_loop) + len(distinct), sum(map(len, in_loop)) + sum(map(len, distinct)))
+        return planned
+
+    # Expected duration in seconds: requests one after another at the measured latency plus the pause
+    # between cells, but never shorter than the quotas allow. latency: {(backend, kind): mean seconds}.
+    # Concurrent runs have no pause and are counted at full concurrency, which makes them a lower bound.
+    # Returns (seconds, backend labels without a measurement).
+    def estimate_seconds(self, latency=None, pacing=0.3):
+        latency = latency or {}
+        traffic = self.traffic()
+        memory_cells = sum(len(hits) for hits in self.memory_hits.values())
+        seconds = pacing * (self.cells - memory_cells) if self.concurrency <= 1 else 0.0
+        unmeasured = set()
+        for (label, kind), (requests, _) in traffic.items():
+            measured = latency.get((label, kind))
+            if measured is None:
+                # Same backend, other request kind (e.g. no batches measured yet)
+                same_backend = [v for (b, _), v in latency.items() if b == label]
+                measured = sum(same_backend) / len(same_backend) if same_backend else None
+            if measured is None:
+                if requests:
+                    unmeasured.add(label)
+            else:
+                seconds += requests * measured / (self.concurrency if kind in ("forward", "qa") else 1)
+        by_backend = {}
+        for (label, _), (requests, characters) in traffic.items():
+            totals = by_backend.setdefault(label, [0, 0])
+            totals[0] += requests
+            totals[1] += characters
+        quota_bound = [_scheduler.projected_seconds(label, requests, characters) or 0
+                       for label, (requests, characters) in by_backend.items()]
+        return max([seconds] + quota_bound), unmeasured
+
+    # Human-readable dry-run report (translate.py --dry-run)
+    def report_lines(self, latency=None, pacing=0.3):
+        lines = [f"Rows to translate: {len(self.rows_to_translate)} (+ {len(self.bold_pairs)} [BOLD] rows)"]
+        if self.skipped_rows:
+            reasons = Counter(self.skipped_rows.values())
+            lines.append(f"Copied through without translation: {len(self.skipped_rows)} rows ("
+                         + ", ".join(f"{reason} {n}" for reason, n in reasons.most_common()) + ")")
+        lines.append(f"Target languages: {len(self.language_groups)} ("
+                     + ", ".join(code if cols == [code] else f"{code} <- {', '.join(cols)}"
+                                 for code, cols in self.language_groups.items()) + ")")
+        if self.skipped_codes:
+            lines.append(f"Excluded columns (unsupported or empty): {', '.join(map(str, self.skipped_codes))}")
+        lines.append(f"Unique segments: {self.unique_segments}, "
+                     f"{sum(len(t) for t in set(self.prepped_texts.values()))} characters per language")
+        if self.memory_hits:
+            exact = sum(m.similarity >= 1.0 for hits in self.memory_hits.values() for m in hits.values())
+            fuzzy = sum(len(hits) for hits in self.memory_hits.values()) - exact
+            lines.append(f"Translation memory: {exact} exact and {fuzzy} near matches out of {self.cells} cells")
+        traffic = self.traffic()
+        for label in dict.fromkeys(label for label, _ in traffic):
+            kinds = {kind: totals for (b, kind), totals in traffic.items() if b == label}
+            requests = sum(r for r, _ in kinds.values())
+            characters = sum(c for _, c in kinds.values())
+            rpm, cpm = _scheduler.quotas.get(label, (0, 0))
+            seconds = _scheduler.projected_seconds(label, requests, characters)
+            quota = (f"quota {rpm or '∞'} req/min, {cpm or '∞'} chars/min -> at least {format_duration(seconds)}"
+                     if seconds is not None else "no quota")
+            lines.append(f"{label}: {requests} requests, {characters} characters "
+                         f"({', '.join(f'{kind} {r}' for kind, (r, _) in kinds.items() if r)}); {quota}")
+        for backend in self.backend_chain[1:]:
+            if backend.label not in {label for label, _ in traffic}:
+                lines.append(f"{backend.label}: fallback only (requests only when {self.backend_chain[0].label} fails)")
+        seconds, unmeasured = self.estimate_seconds(latency, pacing)
+        lines.append(f"Estimated duration: ~{format_duration(seconds)}"
+                     + (f" at the least, with {self.concurrency} requests in flight per backend throughout" if self.concurrency > 1 else "")
+                     + (f" (no measured latency for {', '.join(sorted(unmeasured))}: counted as instant)" if unmeasured else ""))
+        return lines
+
+
+# Preprocessing, [BOLD] detection, column validation, dedup and translation memory lookups: the work
+# done before the first backend request, without sending any (translate.py --dry-run reports it)
+def plan_dataframe(df, targets=None, options=None, shard_pool=None):
+    options = options or EngineOptions()
+    profiler, log = options.profiler, options.log
+    df = df.copy()
+
+    with profiler.phase("bold handling"):
+        bold_pairs, rows_to_translate = find_bold_rows(df)
+
+    with profiler.phase("language validation"):
+        if targets is None:
+            # Validate columns: support codes, mapped names, or a mix
+            valid_columns, skipped_codes = find_language_columns(df, supported_language_codes())
+        else:
+            valid_columns = [(t, resolve_language(t)) if isinstance(t, str) else tuple(t) for t in targets]
+            skipped_codes = []
+        if skipped_codes:
+            log(f"Warning: Skipping unsupported or empty language columns: {', '.join(map(str, skipped_codes))}")
+
+        # Check for empty language columns and alert the user
+        empty_lang_cols = []
+        for col, _ in valid_columns:
+            # Always include the column, even if empty, and ensure it is filled by translation
+            if col not in df.columns or df[col].isnull().all() or (df[col].astype(str).str.strip() == '').all():
+                empty_lang_cols.append(col)
+                # Fill the column with empty strings to ensure it is present and will be filled
+                df[col] = ""
+        if empty_lang_cols:
+            log(f"Note: The following language columns are completely empty and will be filled by translation: {', '.join(map(str, empty_lang_cols))}")
+
+    backend_chain = [get_backend(name) for name in BACKEND_CHOICES[options.backend_choice][1]]
+    # [BOLD] lookups and back-translation QA use Google, unless the run is offline-only
+    assist_backend = get_backend("google") if backend_chain[0].network else backend_chain[0]
+    # Headers that resolve to the same code share one translation (e.g. all ar-* variants -> "ar")
+    plan = RunPlan(df, bold_pairs, rows_to_translate, valid_columns, skipped_codes, backend_chain, assist_backend)
+    plan.concurrency = options.concurrency
+
+    # Numbers, IDs, URLs, empty cells, ... are copied through instead of translated
+    if options.skip_untranslatable:
+        for row_idx in rows_to_translate:
+            reason = skip_reason(df.iat[row_idx, 0], options.ignore_terms)
+            if reason:
+                plan.skipped_rows[row_idx] = reason
+        if plan.skipped_rows:
+            rows_to_translate = plan.rows_to_translate = [r for r in rows_to_translate if r not in plan.skipped_rows]
+
+    # Source texts are the same for every language, so preprocess them once up front
+    with profiler.phase("preprocessing"):
+        source_texts = [str(df.iat[r, 0]).strip() for r in rows_to_translate]
+        pool = shard_pool or ShardPool(options.processes)
+        plan.prepped_texts = dict(zip(rows_to_translate, pool.map(preprocess_batch, source_texts)))
+        if shard_pool is None:
+            pool.close()
+
+    # [BOLD] alignment: rows with bold words are sent with the bold spans marked, so the translated
+    # words come back inside the main translation instead of costing one request per word
+    plan.request_texts = dict(plan.prepped_texts)
+    if options.bold_alignment:
+        with profiler.phase("bold handling"):
+            for row_idx, bold_words in plan.bold_by_row.items():
+                if row_idx in plan.prepped_texts:
+                    marked, found = mark_bold_spans(plan.prepped_texts[row_idx], bold_words)
+                    if any(found):
+                        plan.request_texts[row_idx] = marked
+                        plan.marked_rows[row_idx] = found
+
+    # Translation memory: exact hits are used as they are, near matches are used and flagged for review
+    if options.memory is not None:
+        with profiler.phase("translation memory"):
+            for target_code in plan.language_groups:
+                hits = plan.memory_hits[target_code] = {}
+                for row_idx in rows_to_translate:
+                    match = options.memory.lookup(plan.prepped_texts[row_idx], options.source_lang, target_code)
+                    if match:
+                        hits[row_idx] = match
+
+    # Requests wait for room in each backend's per-minute quota (TRANSLATOR_<NAME>_RPM/_CPM) before dispatch
+    for backend in backend_chain + [assist_backend]:
+        _scheduler.add(backend)
+    return plan
+
+
+# Translate the first column of df into each target column.
+# targets: None to validate the headers like translate.py does, or a list of headers / (header, code) pairs.
+def translate_dataframe(df, targets=None, options=None):
+    options = options or EngineOptions()
+    profiler, metrics, log = options.profiler, options.metrics, options.log
+    tracer = options.tracer if options.tracer.enabled else None
+    source_lang = options.source_lang
+
+    # CPU-bound stages are sharded over worker processes with --processes (inline otherwise)
+    shard_pool = options.shard_pool or ShardPool(options.processes)
+    with options.tracer.span("plan", "plan"):
+        plan = plan_dataframe(df, targets, options, shard_pool)
+    df, bold_pairs, rows_to_translate = plan.df, plan.bold_pairs, plan.rows_to_translate
+    valid_columns, language_groups = plan.valid_columns, plan.language_groups
+    backend_chain, assist_backend = plan.backend_chain, plan.assist_backend
+    prepped_texts, request_texts, bold_by_row = plan.prepped_texts, plan.request_texts, plan.bold_by_row
+
+    # rows_to_translate now only includes main text rows (not [BOLD] rows)
+    # Per-cell results (translations, status codes, QA details) are kept in a compact store;
+    # the DataFrame columns and the failed/suspect reports are built from it after the loop
+    store = ResultStore(len(df), [col for col, _ in valid_columns], [code for _, code in valid_columns])
+    result = TranslationResult(df, store, valid_columns, plan.skipped_codes, metrics)
+    aligned_spans = {}  # (row_idx, bold_word, target_code) -> translated span
+
+    if any(_scheduler.buckets[b.label].limited for b in backend_chain + [assist_backend]):
+        # Longest and shortest texts alternate, so the character and request budgets run out together
+        rows_to_translate = interleave_by_length(rows_to_translate, lambda r: len(prepped_texts[r]))
+        # Projected minimum duration from the traffic this run needs per backend
+        planned = {}  # label -> [requests, characters]
+        for (label, _), (requests, characters) in plan.traffic().items():
+            totals = planned.setdefault(label, [0, 0])
+            totals[0] += requests
+            totals[1] += characters
+        for label, (requests, characters) in planned.items():
+            rpm, cpm = _scheduler.quotas[label]
+            seconds = _scheduler.projected_seconds(label, requests, characters)
+            estimate = f"at least {format_duration(seconds)} at {rpm or '∞'} req/min, {cpm or '∞'} chars/min" if seconds is not None else "no quota"
+            log(f"Quota plan: {label}: ~{requests} requests, ~{characters} characters -> {estimate}")
+
+    # A request identical to one in flight (same kind, backend, text and languages), from this run or
+    # another job in the process, waits for that one's answer instead of being sent again
+    coalesced_lock = threading.Lock()
+    def joined(backend, language, kind):
+        metrics.inc("requests_coalesced_total", backend=backend, kind=kind, language=language)
+        with coalesced_lock:
+            result.coalesced += 1
+
+    def call(func, args, timeout, backend, language, kind="forward", requests=1):
+        key = (kind, backend) + tuple(tuple(a) if isinstance(a, list) else a for a in args)
+        started = time.perf_counter()
+        response, shared = _inflight.do(key, translate_with_timeout, func, args, timeout, backend, language, kind,
+                                        metrics, tracer, requests, joined=lambda: joined(backend, language, kind))
+        if shared and tracer:
+            tracer.add(f"{REQUEST_SPANS.get(kind, kind)} {backend} (joined)", "request", started, time.perf_counter(),
+                       backend=backend, language=language, outcome="error" if response[1] else "ok")
+        return response
+
+    concurrent = options.concurrency > 1
+    if concurrent:
+        run_started = time.time()
+        for backend in backend_chain + [assist_backend]:
+            _concurrency.controller(backend.label, options.concurrency)
+
+    # Forward translation through the backend chain, each backend once; returns (translation, backend label).
+    # When all of them fail the cell is retried later from the deferred retry queue, not here.
+    def forward(text, target_code):
+        error = None
+        for i, candidate in enumerate(backend_chain):
+            if i > 0:
+                options.tracer.instant(f"fallback to {candidate.label}", "fallback", after=backend_chain[i - 1].label,
+                                       language=target_code, error=f"{type(error).__name__}: {error}")
+            translated, error = call(
+                chunked(candidate),
+                (text, source_lang, target_code), request_timeout(text, candidate, options.timeout),
+                candidate.label, target_code, requests=request_count(text, candidate))
+            if not error:
+                return translated, candidate.label
+        raise error
+
+    # Back-translation for QA ("" when it fails)
+    def back_translate(translated_str, target_code):
+        back_translated, bt_error = call(
+            chunked(assist_backend),
+            (translated_str, target_code, source_lang), request_timeout(translated_str, assist_backend, options.timeout),
+            assist_backend.label, target_code, "qa", request_count(translated_str, assist_backend))
+        metrics.inc("qa_calls_total", check="back_translation", language=target_code)
+        return "" if bt_error else str(back_translated or "")
+
+    # Cells that need no translation keep the source text (empty sources leave the cell as it is)
+    for row_idx, reason in plan.skipped_rows.items():
+        text = None if reason == "empty" else str(df.iat[row_idx, 0]).strip()
+        for col, target_code in valid_columns:
+            store.mark_skipped(row_idx, col, text)
+            metrics.inc("segments_skipped_total", reason=reason, language=target_code)
+
+    # One pass per resolved language, with one attempt per cell; results are copied into every variant
+    # column. Cells that fail are queued behind all languages as a deferred retry pass, so a struggling
+    # backend doesn't hold up the loop and gets time to recover: up to max_attempts - 1 retry rounds,
+    # the first retry_delay seconds after the failure and each round twice as long after the previous.
+    passes = deque((target_code, group_cols, rows_to_translate, 0, 0.0) for target_code, group_cols in language_groups.items())
+    try:
+        while passes:
+            target_code, group_cols, pass_rows, retry_round, ready_at = passes.popleft()
+            col_name = group_cols[0]
+            lang_code = col_name
+            # Translation memory hits were looked up by the plan
+            memory_hits = plan.memory_hits.get(target_code, {})  # row_idx -> translation_memory.Match
+            if retry_round:
+                with profiler.phase("pacing"), options.tracer.span("deferred retry wait", "retry", language=target_code,
+                                                                   round=retry_round):
+                    time.sleep(max(0.0, ready_at - time.monotonic()))
+                column_started = time.perf_counter()
+                log(f"Retrying {len(pass_rows) * len(group_cols)} failed cells in column: {', '.join(group_cols)} "
+                    f"(round {retry_round} of {options.max_attempts - 1})")
+                metrics.inc("retries_total", len(pass_rows), backend=backend_chain[0].label, language=target_code)
+            else:
+                column_started = time.perf_counter()
+                log(f"Translating column: {', '.join(group_cols)} (using code: {target_code})")
+                log(f"[DEBUG] lang_code: {lang_code}, target_code: {target_code}")
+                for match in memory_hits.values():
+                    kind = "exact" if match.similarity >= 1.0 else "fuzzy"
+                    result.memory_hits[kind] += len(group_cols)
+                    if match.origin == "reviewed":
+                        result.memory_hits["reviewed"] += len(group_cols)
+                    metrics.inc("cache_hits_total", source="memory", match=kind, origin=match.origin, language=target_code)
+            # Batch-capable backends translate the whole column up front; the per-cell loop
+            # below only calls the backend for texts the batch didn't cover (and for retries/fallback)
+            prefetched = {}
+            primary = backend_chain[0]
+            if primary.max_batch > 1:
+                with profiler.phase("forward translation"), options.tracer.span("batch prefetch", "stage", language=target_code):
+                    # Oversized cells are left to the per-cell loop, which chunks them
+                    unique_texts = list(dict.fromkeys(request_texts[r] for r in pass_rows
+                                                      if len(request_texts[r]) <= primary.max_chars
+                                                      and r not in memory_hits))
+                    for start in range(0, len(unique_texts), primary.max_batch):
+                        chunk = unique_texts[start:start + primary.max_batch]
+                        results, error = call(
+                            primary.translate_batch,
+                            (chunk, source_lang, target_code), options.timeout + 2 * len(chunk), primary.label, target_code, "batch")
+                        if not error and results and len(results) == len(chunk):
+                            prefetched.update(zip(chunk, results))
+            # Concurrent runs send the remaining forward translations up front, each distinct text once;
+            # a text that failed every attempt keeps its exception, raised again for its cells below
+            forwarded = {}  # request text -> (translation, backend label) or exception
+            if concurrent:
+                with profiler.phase("forward translation"), options.tracer.span("concurrent forward", "stage", language=target_code):
+                    pending = list(dict.fromkeys(request_texts[r] for r in pass_rows
+                                                 if r not in memory_hits and request_texts[r] not in prefetched))
+                    forwarded = dict(zip(pending, map_concurrently(lambda text: forward(text, target_code),
+                                                                   pending, options.concurrency)))
+            # Back-translations collected during the loop; similarity and langdetect run afterwards in one (sharded) pass
+            qa_rows, qa_sources, qa_back, qa_translated = [], [], [], []
+            failed_rows = []  # for the deferred retry queue
+            for row_idx in pass_rows:
+                cell_started = time.perf_counter()
+                english_text = str(df.iat[row_idx, 0]).strip()
+                store.set_source(row_idx, english_text)
+                prepped_text = prepped_texts[row_idx]
+                request_text = request_texts[row_idx]
+                from_memory = row_idx in memory_hits
+                # Always translate and overwrite, regardless of current cell contents
+                try:
+                    with profiler.phase("forward translation"):
+                        if from_memory:
+                            translated, backend = memory_hits[row_idx].translation, "memory"
+                        elif request_text in prefetched:
+                            translated, backend = prefetched[request_text], backend_chain[0].label
+                        elif request_text in forwarded:
+                            if isinstance(forwarded[request_text], Exception):
+                                raise forwarded[request_text]
+                            translated, backend = forwarded[request_text]
+                        else:
+                            translated, backend = forward(request_text, target_code)
+                        translated_str = str(translated)
+                        aligned = {}  # bold word index -> translated span
+                        if request_text != prepped_text and not from_memory:
+                            translated_str, aligned = read_bold_spans(translated_str)
+                            if translated_str is None:
+                                # The backend mangled the markers: translate the row again without them
+                                translated, backend = forward(prepped_text, target_code)
+                                translated_str = str(translated)
+                    for variant in group_cols:
+                        store.set_translation(row_idx, variant, translated_str)
+
+                    with profiler.phase("bold handling"):
+                        # Context-aware [BOLD] handling
+                        bold_words = bold_by_row.get(row_idx)
+                        if bold_words:
+                            bold_translations = []
+                            for i, bold_word in enumerate(bold_words):
+                                # Check if bold_word is in main text
+                                if bold_word not in english_text:
+                                    log(f"[WARN] [BOLD] word '{bold_word}' not found in main text at row {row_idx+2}")
+                                if i in aligned:
+                                    aligned_spans[(row_idx, bold_word, target_code)] = aligned[i]
+                                    metrics.inc("bold_aligned_total", language=target_code)
+                                    bold_translations.append(f"{bold_word} → {aligned[i]} (aligned)")
+                                    continue
+                                # Fallback: translate bold_word on its own and look for it in translated_str
+                                try:
+                                    bold_translated, _ = call(
+                                        assist_backend.translate,
+                                        (bold_word, source_lang, target_code), options.timeout, assist_backend.label, target_code, "bold")
+                                except Exception:
+                                    bold_translated = ""
+                                if bold_translated and bold_translated in translated_str:
+                                    bold_translations.append(f"{bold_word} → {bold_translated} (in sentence)")
+                                else:
+                                    matches = difflib.get_close_matches(bold_translated, translated_str.split(), n=1, cutoff=0.7)
+                                    if matches:
+                                        bold_translations.append(f"{bold_word} → {matches[0]} (fuzzy match)")
+                                    else:
+                                        bold_translations.append(f"{bold_word} → {bold_translated} (not found)")
+                            for variant in group_cols:
+                                store.set_bold_note(row_idx, variant, "; ".join(bold_translations))
+
+                    # Stored translations passed QA when they were added; concurrent runs back-translate after the loop
+                    if not from_memory:
+                        with profiler.phase("qa"):
+                            try:
+                                qa_back.append(None if concurrent else back_translate(translated_str, target_code))
+                                qa_rows.append(row_idx)
+                                qa_sources.append(english_text)
+                                qa_translated.append(translated_str)
+                            except Exception:
+                                pass
+
+                except Exception as e:
+                    for variant in group_cols:
+                        store.mark_failed(row_idx, variant, str(e))
+                    backend = "FAILED"
+                    failed_rows.append(row_idx)
+                if tracer:
+                    tracer.add(f"row {row_idx + 2}", "cell", cell_started, time.perf_counter(), row=row_idx + 2,
+                               language=target_code, backend=backend, status=STATUS_NAMES[store.get_status(row_idx, col_name)])
+                if not from_memory and not concurrent:
+                    with profiler.phase("pacing"), options.tracer.span("pacing", "pacing"):
+                        time.sleep(options.pacing)
+            with profiler.phase("qa"):
+                if concurrent and qa_translated:
+                    with options.tracer.span("concurrent QA back-translation", "stage", language=target_code):
+                        distinct = list(dict.fromkeys(qa_translated))
+                        back = dict(zip(distinct, map_concurrently(lambda text: back_translate(text, target_code),
+                                                                   distinct, options.concurrency)))
+                    qa_back = [back[t] if isinstance(back[t], str) else "" for t in qa_translated]
+                # Similarity and langdetect are scored for the whole column at once, so they are one span
+                with options.tracer.span("QA scoring (similarity, langdetect)", "qa", language=target_code, cells=len(qa_rows)):
+                    scores = shard_pool.map(qa_batch, qa_sources, qa_back, qa_translated)
+                metrics.inc("qa_calls_total", len(scores), check="langdetect", language=target_code)
+                for row_idx, back_translated, (similarity, detected_lang) in zip(qa_rows, qa_back, scores):
+                    if is_suspect(similarity, detected_lang, target_code, lang_code):
+                        for variant in group_cols:
+                            store.mark_suspect(row_idx, variant, back_translated, similarity, detected_lang)
+            if options.memory is not None:
+                for row_idx, match in memory_hits.items():
+                    if match.similarity < 1.0 and store.get_status(row_idx, col_name) == STATUS_OK:
+                        note = f"Translation memory match ({match.similarity:.0%}) for: {match.source}"
+                        for variant in group_cols:
+                            store.mark_suspect(row_idx, variant, "", match.similarity, "", note)
+                # Only new translations that passed QA are remembered
+                options.memory.add_many(
+                    [(prepped_texts[r], store.get_translation(r, col_name), str(df.iat[r, 0]).strip()) for r in qa_rows
+                     if store.get_status(r, col_name) == STATUS_OK], source_lang, target_code)
+            options.tracer.add(f"column {', '.join(group_cols)}" + (f" (retry {retry_round})" if retry_round else ""),
+                               "language", column_started, time.perf_counter(), language=target_code, cells=len(pass_rows))
+            # Counted in cells like the other summary counters: a row fills every variant column of the code
+            if retry_round:
+                result.retry_recovered += (len(pass_rows) - len(failed_rows)) * len(group_cols)
+            elif failed_rows:
+                result.retry_queued += len(failed_rows) * len(group_cols)
+            if failed_rows and retry_round + 1 < options.max_attempts:
+                passes.append((target_code, group_cols, failed_rows, retry_round + 1,
+                               time.monotonic() + options.retry_delay * 2 ** retry_round))
+                log(f"{len(failed_rows) * len(group_cols)} cells in column {', '.join(group_cols)} failed and will be retried at the end")
+            log(f"Finished translating column: {', '.join(group_cols)}")
+    except KeyboardInterrupt:
+        result.interrupted = True
+        options.tracer.instant("interrupted", "run")
+        if options.shard_pool is None:
+            shard_pool.close()
+        return result
+    finally:
+        if concurrent:
+            for label in dict.fromkeys(b.label for b in backend_chain + [assist_backend]):
+                result.concurrency_report += _concurrency.get(label).report_lines(run_started)
+
+    # Build the output columns and reports from the results store
+    for col in store.languages:
+        df[col] = store.column_values(col, df[col])
+    result.failed_translations = store.failed_records()
+    result.suspect_translations = store.suspect_records()
+
+    with profiler.phase("dataframe rebuild"), options.tracer.span("dataframe rebuild", "stage"):
+        # Variant columns sharing a code reuse the same bold word translation
+        bold_word_cache = {}
+        def bold_translate(bold_word, target_code, main_idx):
+            if (main_idx, bold_word, target_code) in aligned_spans:
+                return aligned_spans[(main_idx, bold_word, target_code)]
+            if (bold_word, target_code) not in bold_word_cache:
+                with profiler.phase("bold handling"):
+                    try:
+                        bold_translated, _ = call(
+                            assist_backend.translate,
+                            (bold_word, source_lang, target_code), options.timeout, assist_backend.label, target_code, "bold")
+                    except Exception:
+                        bold_translated = ""
+                bold_word_cache[(bold_word, target_code)] = bold_translated
+            return bold_word_cache[(bold_word, target_code)]
+        result.df_with_bold = add_bold_rows(df, bold_pairs, valid_columns, bold_translate)
+
+    if options.shard_pool is None:
+        shard_pool.close()
+    return result
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+# job_queue.py
+# Distributed mode for translate.py: a job (workbook x languages) is split into cell tasks in a
+# shared SQLite file, and any number of worker processes, on any host that can reach the file, pull
+# tasks from it. Workers lease tasks in small batches and keep the leases alive with a heartbeat;
+# tasks whose lease expires (worker crashed, host lost) go back to the queue and are retried up to
+# --max-attempts times. Requests go through the engine's wrapper like in translate.py (quota
+# windows, --concurrency controllers, metrics and timeouts, per worker process). Identical pending
+# tasks (same text, languages and backend), in one job or across all jobs in the queue, are leased
+# together and translated with a single request. The finalizer builds the output workbook with the
+# same Translations/SuspectTranslations sheets and failed_translations_log.csv as translate.py (or,
+# for a .csv/.jsonl/.parquet output, the same table plus a _suspects file).
+#   python job_queue.py submit Fraud_Rules.xlsx --db jobs.sqlite --backend 3
+#   python job_queue.py work --db jobs.sqlite          (run on as many hosts as you like)
+#   python job_queue.py status --db jobs.sqlite
+#   python job_queue.py finalize 1 --db jobs.sqlite --output Fraud_Rules_translated.xlsx
+#
+# Put the database on a filesystem every worker can lock (a local disk shared by processes, or a
+# network share with working POSIX locks); the input workbook path must be readable by the finalizer.
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+import engine
+from backends import BACKEND_CHOICES, get_backend
+from classifier import skip_reason
+from concurrency import map_concurrently
+from metrics import Metrics
+from results_store import ResultStore, STATUS_OK, STATUS_SKIPPED, STATUS_SUSPECT
+from sharding import ShardPool
+from tabular_io import read_table, write_results_table
+from engine import (add_bold_rows, chunked, find_bold_rows, find_language_columns, format_workbook, is_suspect,
+                    preprocess_batch, qa_batch, request_count, request_timeout, supported_language_codes,
+                    translate_with_timeout, write_failed_log, write_workbook)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    input_file TEXT NOT NULL,
+    source_lang TEXT NOT NULL,
+    backend_choice TEXT NOT NULL,
+    columns TEXT NOT NULL,        -- JSON [[col_name, target_code], ...]
+    bold_pairs TEXT NOT NULL,     -- JSON [[main_row_idx, [bold words], bold_row_idx], ...]
+    created REAL NOT NULL,
+    finalized REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    kind TEXT NOT NULL,           -- 'forward' (row x language) or 'bold' (bold word x language)
+    row INTEGER,
+    target_code TEXT NOT NULL,
+    lang_code TEXT NOT NULL,      -- first column header of the language group, for the QA check
+    source TEXT NOT NULL,         -- original source text
+    text TEXT NOT NULL,           -- text sent to the backend
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending, leased, done, failed, skipped (copied through)
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    back_translated TEXT,
+    similarity REAL,
+    detected_lang TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, lease_expires);
+CREATE INDEX IF NOT EXISTS tasks_job ON tasks (job_id, kind);
+CREATE INDEX IF NOT EXISTS tasks_request ON tasks (text, target_code, kind);
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 60000")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# Split a workbook into tasks: one per (row, resolved language) and one per ([BOLD] word, language).
+# Rows that need no translation (classifier.py) are stored as already 'skipped', with the source as result.
+def submit_job(conn, input_file, source_lang="en", backend_choice="1"):
+    df = read_table(input_file)
+    bold_pairs, rows_to_translate = find_bold_rows(df)
+    valid_columns, skipped_codes = find_language_columns(df, supported_language_codes())
+    if skipped_codes:
+        print(f"Warning: Skipping unsupported or empty language columns: {', '.join(map(str, skipped_codes))}")
+    language_groups = {}
+    for col, target_code in valid_columns:
+        language_groups.setdefault(target_code, []).append(col)
+
+    reasons = {r: skip_reason(df.iat[r, 0]) for r in rows_to_translate}
+    sources = [str(df.iat[r, 0]).strip() for r in rows_to_translate]
+    tasks = []
+    for target_code, group_cols in language_groups.items():
+        for row_idx, source, prepped in zip(rows_to_translate, sources, preprocess_batch(sources)):
+            if reasons[row_idx]:
+                copied = None if reasons[row_idx] == "empty" else source
+                tasks.append(("forward", row_idx, target_code, group_cols[0], source, source, "skipped", copied))
+            else:
+                tasks.append(("forward", row_idx, target_code, group_cols[0], source, prepped, "pending", None))
+        bold_words = dict.fromkeys(w for _, words, _ in bold_pairs for w in words)
+        for bold_word in bold_words:
+            tasks.append(("bold", None, target_code, group_cols[0], bold_word, bold_word, "pending", None))
+
+    conn.execute("BEGIN IMMEDIATE")
+    cursor = conn.execute(
+        "INSERT INTO jobs (input_file, source_lang, backend_choice, columns, bold_pairs, created) VALUES (?, ?, ?, ?, ?, ?)",
+        (os.path.abspath(input_file), source_lang, backend_choice, json.dumps(valid_columns), json.dumps(bold_pairs), time.time()))
+    job_id = cursor.lastrowid
+    conn.executemany(
+        "INSERT INTO tasks (job_id, kind, row, target_code, lang_code, source, text, status, result) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(job_id,) + task for task in tasks])
+    conn.execute("COMMIT")
+    return job_id, len(tasks)
+
+
+# Lease up to `limit` runnable tasks: pending ones, or leased ones whose lease has expired.
+# Expired tasks that already used all their attempts are marked failed instead. Pending tasks in
+# any job that need the same request as a leased one come along (beyond the limit), so one
+# backend call serves them all.
+def claim_tasks(conn, owner, limit, lease_seconds, max_attempts):
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE tasks SET status = 'failed', error = COALESCE(error, 'Lease expired') "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, max_attempts))
+        rows = conn.execute(
+            "SELECT t.id, t.job_id, t.kind, t.target_code, t.lang_code, t.source, t.text, j.source_lang, j.backend_choice "
+            "FROM tasks t JOIN jobs j ON j.id = t.job_id "
+            "WHERE t.status = 'pending' OR (t.status = 'leased' AND t.lease_expires < ?) "
+            "ORDER BY t.job_id, t.target_code, t.id LIMIT ?", (now, limit)).fetchall()
+        if rows:
+            ids = [row[0] for row in rows]
+            marks = ",".join("?" * len(ids))
+            rows += conn.execute(
+                "SELECT DISTINCT d.id, d.job_id, d.kind, d.target_code, d.lang_code, d.source, d.text, dj.source_lang, dj.backend_choice "
+                "FROM tasks t JOIN jobs j ON j.id = t.job_id "
+                "JOIN tasks d ON d.text = t.text AND d.target_code = t.target_code AND d.kind = t.kind "
+                "JOIN jobs dj ON dj.id = d.job_id AND dj.source_lang = j.source_lang AND dj.backend_choice = j.backend_choice "
+                f"WHERE t.id IN ({marks}) AND d.status = 'pending' AND d.id NOT IN ({marks})", ids + ids).fetchall()
+        conn.executemany(
+            "UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+            [(owner, now + lease_seconds, row[0]) for row in rows])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return rows
+
+
+# Results only count if this worker still holds the lease (it may have expired and been re-leased)
+def complete_task(conn, owner, task_id, result, back_translated=None, similarity=None, detected_lang=None):
+    conn.execute(
+        "UPDATE tasks SET status = 'done', result = ?, back_translated = ?, similarity = ?, detected_lang = ?, error = NULL "
+        "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+        (result, back_translated, similarity, detected_lang, task_id, owner))
+
+
+def fail_task(conn, owner, task_id, error, max_attempts):
+    conn.execute(
+        "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "error = ?, lease_owner = NULL, lease_expires = NULL "
+        "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+        (max_attempts, error, task_id, owner))
+
+
+# Background thread that keeps extending this worker's leases while it is alive
+class Heartbeat(threading.Thread):
+    def __init__(self, db_path, owner, lease_seconds):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+
+    def run(self):
+        conn = connect(self.db_path)
+        while not self.stopped.wait(self.lease_seconds / 3):
+            conn.execute("UPDATE tasks SET lease_expires = ? WHERE lease_owner = ? AND status = 'leased'",
+                         (time.time() + self.lease_seconds, self.owner))
+        conn.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+# A task's backend chain and QA backend, registered with this process's quota windows and, with
+# --concurrency, given adaptive concurrency controllers (as translate_dataframe does)
+def task_backends(backend_choice, concurrency):
+    backend_chain = [get_backend(name) for name in BACKEND_CHOICES[backend_choice][1]]
+    assist_backend = get_backend("google") if backend_chain[0].network else backend_chain[0]
+    for backend in backend_chain + [assist_backend]:
+        engine._scheduler.add(backend)
+        if concurrency > 1:
+            engine._concurrency.controller(backend.label, concurrency)
+    return backend_chain, assist_backend
+
+
+# One request through the engine's wrapper: oversized texts split at sentence boundaries (one timeout
+# and one quota request per chunk), latency and outcome recorded in metrics
+def send(backend, text, source, target, kind, timeout, metrics, language=None):
+    translated, error = translate_with_timeout(
+        chunked(backend), (text, source, target), request_timeout(text, backend, timeout),
+        backend.label, language or target, kind, metrics, requests=request_count(text, backend))
+    if error:
+        raise error
+    return translated
+
+
+# Translate one leased task through the backend chain; forward tasks also get back-translated for QA
+def run_task(task, timeout, metrics, concurrency=1):
+    _, _, kind, target_code, _, _, text, source_lang, backend_choice = task
+    backend_chain, assist_backend = task_backends(backend_choice, concurrency)
+    if kind == "bold":
+        return send(assist_backend, text, source_lang, target_code, "bold", timeout, metrics), None
+    error = None
+    for candidate in backend_chain:
+        try:
+            translated = send(candidate, text, source_lang, target_code, "forward", timeout, metrics)
+            break
+        except Exception as e:
+            error = e
+    else:
+        raise error
+    try:
+        back_translated = send(assist_backend, str(translated), target_code, source_lang, "qa", timeout, metrics,
+                               target_code)
+    except Exception:
+        back_translated = ""
+    metrics.inc("qa_calls_total", check="back_translation", language=target_code)
+    return str(translated), str(back_translated or "")
+
+
+def work(db_path, batch_size=20, lease_seconds=60, max_attempts=3, timeout=15, idle_exit=True, concurrency=1,
+         metrics_path=None):
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    conn = connect(db_path)
+    heartbeat = Heartbeat(db_path, owner, lease_seconds)
+    heartbeat.start()
+    metrics = Metrics()
+    done = failed = shared = 0
+    print(f"Worker {owner} polling '{db_path}'")
+    try:
+        while True:
+            tasks = claim_tasks(conn, owner, batch_size, lease_seconds, max_attempts)
+            if not tasks:
+                if idle_exit:
+                    break
+                time.sleep(5)
+                continue
+            # Tasks needing the same request (kind, target, text, source language, backend) share one call
+            groups = {}
+            for task in tasks:
+                groups.setdefault(task[2:4] + task[6:], []).append(task)
+            groups = list(groups.values())
+            # With --concurrency the groups are sent at once and the controllers decide how many are in
+            # flight; results are written to the database on this thread only
+            outcomes = map_concurrently(lambda group: run_task(group[0], timeout, metrics, concurrency),
+                                        groups, concurrency)
+            forward = []
+            for group, outcome in zip(groups, outcomes):
+                try:
+                    if isinstance(outcome, Exception):
+                        raise outcome
+                    translated, back_translated = outcome
+                    if not translated or not translated.strip():
+                        raise ValueError("Backend returned an empty translation")
+                except Exception as e:
+                    for task in group:
+                        fail_task(conn, owner, task[0], f"{type(e).__name__}: {e}", max_attempts)
+                    failed += len(group)
+                    continue
+                for task in group:
+                    if task[2] == "bold":
+                        complete_task(conn, owner, task[0], translated)
+                    else:
+                        forward.append((task, translated, back_translated))
+                done += len(group)
+                shared += len(group) - 1
+            # Same QA scoring as translate.py, one pass per claimed batch
+            scores = qa_batch([t[5] for t, _, _ in forward], [b for _, _, b in forward], [r for _, r, _ in forward])
+            for target_code, n in Counter(task[3] for task, _, _ in forward).items():
+                metrics.inc("qa_calls_total", n, check="langdetect", language=target_code)
+            for (task, translated, back_translated), (similarity, detected_lang) in zip(forward, scores):
+                complete_task(conn, owner, task[0], translated, back_translated, similarity, detected_lang)
+    finally:
+        heartbeat.stop()
+        conn.close()
+        if metrics_path:
+            metrics.write_json(metrics_path)
+            metrics.write_prometheus(os.path.splitext(metrics_path)[0] + ".prom")
+    print(f"Worker {owner} finished: {done} tasks done ({shared} of them by sharing an identical task's request), "
+          f"{failed} attempts failed")
+    if concurrency > 1:
+        for controller in engine._concurrency.controllers.values():
+            print(f"  {controller.report_lines()[0]}")
+
+
+def job_status(conn, job_id=None):
+    query = "SELECT job_id, status, COUNT(*) FROM tasks" + (" WHERE job_id = ?" if job_id else "") + " GROUP BY job_id, status"
+    counts = {}
+    for jid, status, n in conn.execute(query, (job_id,) if job_id else ()):
+        counts.setdefault(jid, {})[status] = n
+    return counts
+
+
+# Build the output workbook from finished tasks, the same way translate.py does at the end of a run
+def finalize_job(conn, job_id, output_file, allow_incomplete=False, processes=1):
+    job = conn.execute("SELECT input_file, columns, bold_pairs FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if job is None:
+        raise ValueError(f"No job with id {job_id}")
+    counts = job_status(conn, job_id).get(job_id, {})
+    unfinished = counts.get("pending", 0) + counts.get("leased", 0)
+    if unfinished and not allow_incomplete:
+        raise RuntimeError(f"Job {job_id} still has {unfinished} unfinished tasks (use --allow-incomplete to finalize anyway)")
+    input_file, columns, bold_pairs = job[0], json.loads(job[1]), json.loads(job[2])
+    valid_columns = [tuple(c) for c in columns]
+    language_groups = {}
+    for col, target_code in valid_columns:
+        language_groups.setdefault(target_code, []).append(col)
+
+    df = read_table(input_file)
+    for col, _ in valid_columns:
+        df[col] = df[col].fillna("")
+    store = ResultStore(len(df), [col for col, _ in valid_columns], [code for _, code in valid_columns])
+    bold_words = {}
+    # Ordered like translate.py's loop: language group by group, then row
+    tasks = conn.execute(
+        "SELECT kind, row, target_code, lang_code, source, status, result, back_translated, similarity, detected_lang, error "
+        "FROM tasks WHERE job_id = ? ORDER BY id", (job_id,))
+    for kind, row_idx, target_code, lang_code, source, status, result, back_translated, similarity, detected_lang, error in tasks:
+        if kind == "bold":
+            bold_words[(source, target_code)] = result if status == "done" else ""
+            continue
+        store.set_source(row_idx, source)
+        for variant in language_groups[target_code]:
+            if status == "done":
+                store.set_translation(row_idx, variant, result)
+                if is_suspect(similarity, detected_lang, target_code, lang_code):
+                    store.mark_suspect(row_idx, variant, back_translated, similarity, detected_lang)
+            elif status == "failed":
+                store.mark_failed(row_idx, variant, error or "")
+            elif status == "skipped":
+                store.mark_skipped(row_idx, variant, result)
+    for col in store.languages:
+        df[col] = store.column_values(col, df[col])
+
+    df_with_bold = add_bold_rows(df, [tuple(p) for p in bold_pairs], valid_columns,
+                                 lambda word, code, _: bold_words.get((word, code), ""))
+    failed_translations = store.failed_records()
+    suspect_translations = store.suspect_records()
+    if output_file.lower().endswith(".xlsx"):
+        write_workbook(df_with_bold, suspect_translations, output_file)
+        with ShardPool(processes) as shard_pool:
+            format_workbook(output_file, shard_pool)
+    else:
+        write_results_table(df_with_bold, suspect_translations, output_file)
+    if failed_translations:
+        write_failed_log(failed_translations)
+    conn.execute("UPDATE jobs SET finalized = ? WHERE id = ?", (time.time(), job_id))
+    return store, failed_translations, suspect_translations
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Shared SQLite job queue for translating one workbook on many workers.")
+    parser.add_argument("--db", default="translation_jobs.sqlite", help="Queue database shared by all workers")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("submit", help="Split a workbook into cell tasks")
+    p.add_argument("input_file")
+    p.add_argument("--source-lang", default="en")
+    p.add_argument("--backend", choices=list(BACKEND_CHOICES), default="1", help="Backend menu choice, as in translate.py")
+
+    p = sub.add_parser("work", help="Pull and translate tasks until the queue is empty")
+    p.add_argument("--batch-size", type=int, default=20, help="Tasks leased per claim")
+    p.add_argument("--lease", type=float, default=60, help="Lease length in seconds (renewed by the heartbeat)")
+    p.add_argument("--max-attempts", type=int, default=3)
+    p.add_argument("--timeout", type=float, default=15, help="Per-request backend timeout in seconds")
+    p.add_argument("--concurrency", type=int, default=1, metavar="MAX",
+                   help="Send up to MAX requests per backend at once, adapted to latency, errors and 429s (default 1)")
+    p.add_argument("--metrics", default="translation_metrics_worker.json", metavar="PATH",
+                   help="Where this worker writes its run metrics when it stops, plus a Prometheus textfile with "
+                        "the same name and .prom (give each worker on a host its own path)")
+    p.add_argument("--forever", action="store_true", help="Keep polling for new jobs instead of exiting when idle")
+
+    p = sub.add_parser("status", help="Task counts per job")
+    p.add_argument("job_id", type=int, nargs="?")
+
+    p = sub.add_parser("finalize", help="Build the output workbook for a finished job")
+    p.add_argument("job_id", type=int)
+    p.add_argument("--output", help="Output file, .xlsx/.csv/.jsonl/.parquet (default: <input>_translated in the input's format)")
+    p.add_argument("--allow-incomplete", action="store_true", help="Finalize even if tasks are still pending or leased")
+    p.add_argument("--processes", type=int, default=1, help="Worker processes for the formatting pass (0 = one per core)")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.command == "work":
+        work(args.db, args.batch_size, args.lease, args.max_attempts, args.timeout, idle_exit=not args.forever,
+             concurrency=args.concurrency, metrics_path=args.metrics)
+        return
+    conn = connect(args.db)
+    if args.command == "submit":
+        job_id, n_tasks = submit_job(conn, args.input_file, args.source_lang, args.backend)
+        print(f"Submitted job {job_id}: {n_tasks} tasks in '{args.db}'")
+    elif args.command == "status":
+        for job_id, counts in sorted(job_status(conn, args.job_id).items()):
+            print(f"Job {job_id}: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    elif args.command == "finalize":
+        input_file = conn.execute("SELECT input_file FROM jobs WHERE id = ?", (args.job_id,)).fetchone()
+        base_name, ext = os.path.splitext(os.path.basename(input_file[0])) if input_file else ("", "")
+        output_file = args.output or (f"{base_name}_translated{ext.lower()}" if input_file else "")
+        try:
+            store, failed_translations, suspect_translations = finalize_job(
+                conn, args.job_id, output_file, args.allow_incomplete, args.processes)
+        except (ValueError, RuntimeError) as e:
+            print(e)
+            sys.exit(1)
+        print(f"\n✅ Job {args.job_id} finalized. Results saved to '{output_file}'.")
+        print(f"  Successful translations: {store.count(STATUS_OK, STATUS_SUSPECT)}")
+        print(f"  Skipped cells (no translation needed): {store.count(STATUS_SKIPPED)}")
+        print(f"  Failed translations: {len(failed_translations)}")
+        print(f"  Suspect translations (review): {len(suspect_translations)}")
+        if failed_translations:
+            print(f"⚠️ {len(failed_translations)} failures logged to 'failed_translations_log.csv'")
+
+
+if __name__ == "__main__":
+    main()
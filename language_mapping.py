@@ -420,3 +420,16 @@ LANGUAGE_MAPPING = {
     # Zimbabwe
     "Zimbabwe": "en"
 }
+
+
+# Per-variant overrides: a header listed here is translated with its own code instead of sharing
+# the translation of the language it maps to above, e.g. {"zh-HK": "zh-TW", "pt-BR": "pt"}.
+VARIANT_OVERRIDES = {}
+
+
+# Resolve a column header to the language code actually sent to the backend
+def resolve_language(header):
+    header = str(header).strip()
+    if header in VARIANT_OVERRIDES:
+        return VARIANT_OVERRIDES[header]
+    return LANGUAGE_MAPPING.get(header, header)
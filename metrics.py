@@ -0,0 +1,163 @@
+# metrics.py
+# Run telemetry for the translation scripts: per-backend / per-language request latency
+# histograms and counters (retries, timeouts, characters sent, cache hits, QA calls).
+# Exported as JSON next to the summary report and as a Prometheus textfile for node exporter.
+
+import json
+import os
+import threading
+
+
+# Latency bucket upper bounds in seconds (the request timeout is 15s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+
+COUNTER_HELP = {
+    "requests_total": "Backend translation requests by outcome",
+    "retries_total": "Retried translation attempts",
+    "timeouts_total": "Backend requests that hit the timeout",
+    "characters_sent_total": "Characters sent to translation backends",
+    "cache_hits_total": "Translations served from cache instead of a backend",
+    "requests_coalesced_total": "Requests that waited for an identical request already in flight instead of being sent",
+    "bold_aligned_total": "[BOLD] words read from the marked main translation instead of a standalone request",
+    "segments_skipped_total": "Cells copied through without translation (numbers, IDs, URLs, ignore terms, ...)",
+    "qa_calls_total": "Quality-check calls (back-translation and language detection)",
+    "quota_waits_total": "Requests held back until the backend quota had room",
+    "quota_wait_seconds_total": "Seconds spent waiting for backend quota",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    # Approximate quantile from the bucket counts (upper bound of the bucket holding it)
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {str(b): n for b, n in zip(list(self.buckets) + ["+Inf"], self.counts)},
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (backend, language, kind) -> Histogram
+        self.counters = {}  # (name, labels tuple) -> value
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe_request(self, backend, language, seconds, kind="forward", characters=0, outcome="ok"):
+        with self.lock:
+            hist = self.histograms.setdefault((backend, language, kind), Histogram())
+            hist.observe(seconds)
+        self.inc("requests_total", backend=backend, language=language, kind=kind, outcome=outcome)
+        if characters:
+            self.inc("characters_sent_total", characters, backend=backend, language=language)
+        if outcome == "timeout":
+            self.inc("timeouts_total", backend=backend, language=language)
+
+    def counter_total(self, name):
+        with self.lock:
+            return sum(v for (n, _), v in self.counters.items() if n == name)
+
+    def to_dict(self):
+        with self.lock:
+            latency = {}
+            per_backend = {}
+            for (backend, language, kind), hist in sorted(self.histograms.items()):
+                latency.setdefault(backend, {}).setdefault(language, {})[kind] = hist.to_dict()
+                total = per_backend.setdefault(backend, Histogram())
+                total.counts = [a + b for a, b in zip(total.counts, hist.counts)]
+                total.count += hist.count
+                total.sum += hist.sum
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {
+            "latency_seconds": latency,
+            "latency_seconds_by_backend": {b: h.to_dict() for b, h in per_backend.items()},
+            "counters": counters,
+        }
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def to_prometheus(self, prefix="translator_"):
+        lines = []
+        with self.lock:
+            name = f"{prefix}request_duration_seconds"
+            lines.append(f"# HELP {name} Backend translation request latency")
+            lines.append(f"# TYPE {name} histogram")
+            for (backend, language, kind), hist in sorted(self.histograms.items()):
+                labels = f'backend="{_escape(backend)}",language="{_escape(language)}",kind="{_escape(kind)}"'
+                cumulative = 0
+                for bound, n in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {hist.sum:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {hist.count}")
+            for counter in sorted({n for n, _ in self.counters}):
+                name = f"{prefix}{counter}"
+                lines.append(f"# HELP {name} {COUNTER_HELP.get(counter, counter)}")
+                lines.append(f"# TYPE {name} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == counter:
+                        label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                        lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    # Textfile collector reads *.prom files, so write to a temp file and rename to avoid partial reads
+    def write_prometheus(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+# Mean request latency per (backend, kind) from an exported translation_metrics.json, for run estimates
+def read_mean_latency(path):
+    with open(path, encoding="utf-8") as f:
+        latency = json.load(f).get("latency_seconds", {})
+    totals = {}  # (backend, kind) -> [seconds, count]
+    for backend, languages in latency.items():
+        for kinds in languages.values():
+            for kind, hist in kinds.items():
+                total = totals.setdefault((backend, kind), [0.0, 0])
+                total[0] += hist["sum"]
+                total[1] += hist["count"]
+    return {key: seconds / count for key, (seconds, count) in totals.items() if count}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
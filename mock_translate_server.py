@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the translation backends used by translate.py.
+
+Serves a Google-like endpoint (GET /m?sl=..&tl=..&q=..) and the LibreTranslate API
+(POST /translate, GET /languages) on localhost, with configurable latency, error rate
+and 429 throttling. Point translate.py at it with:
+
+    TRANSLATOR_GOOGLE_URL=http://127.0.0.1:5005/m
+    TRANSLATOR_LIBRE_URL=http://127.0.0.1:5005/
+
+Translations are deterministic and reversible: every word gets a "~<target>" suffix,
+and translating back to the source language strips it again, so back-translation QA
+sees a perfect match.
+"""
+import argparse
+import html
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from deep_translator.constants import LIBRE_LANGUAGES_TO_CODES
+
+
+SUFFIX_PATTERN = re.compile(r"~[A-Za-z-]+(?=\s|$|[.!?,:;])")
+PLACEHOLDER_WORD = re.compile(r"^_{2}[A-Za-z]+_?\d*_{2}\W*$")
+
+
+# Fake translation: tag each word with the target code, or strip tags when going back to the source
+def fake_translate(text, source, target):
+    if SUFFIX_PATTERN.search(text):
+        return SUFFIX_PATTERN.sub("", text)
+    if source == target:
+        return text
+    # Placeholder tokens like __PH_0__ / __BOLD_1__ pass through untouched, as with the real backends
+    return " ".join(f"{word}~{target}" if any(ch.isalnum() for ch in word) and not PLACEHOLDER_WORD.match(word) else word
+                    for word in text.split())
+
+
+class MockState:
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, throttle_rpm=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rpm = throttle_rpm
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.batches = 0  # requests with an array of texts
+            self.segments = 0
+            self.characters = 0
+            self.errors = 0
+            self.throttled = 0
+            self.latencies = []
+            self.window.clear()
+
+    # Decide how this request is answered: "ok", "error" or "throttle"
+    def admit(self):
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.throttle_rpm:
+                while self.window and now - self.window[0] > 60:
+                    self.window.popleft()
+                if len(self.window) >= self.throttle_rpm:
+                    self.throttled += 1
+                    return "throttle"
+                self.window.append(now)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return "error"
+            delay = self.latency_ms + (self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        return "ok"
+
+    def record(self, texts, started, batch=False):
+        with self.lock:
+            self.batches += batch
+            self.segments += len(texts)
+            self.characters += sum(len(t) for t in texts)
+            self.latencies.append(time.perf_counter() - started)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "segments": self.segments,
+                "characters": self.characters,
+                "errors": self.errors,
+                "throttled": self.throttled,
+                "latencies": list(self.latencies),
+            }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _reject(self, outcome):
+        if outcome == "throttle":
+            self._send(429, json.dumps({"error": "Too many requests"}))
+        else:
+            self._send(500, json.dumps({"error": "Injected server error"}))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/languages":
+            languages = [{"code": code, "name": name} for name, code in LIBRE_LANGUAGES_TO_CODES.items()]
+            self._send(200, json.dumps(languages))
+        elif url.path == "/stats":
+            self._send(200, json.dumps(self.state.snapshot()))
+        elif url.path == "/m":
+            started = time.perf_counter()
+            outcome = self.state.admit()
+            if outcome != "ok":
+                return self._reject(outcome)
+            text = params.get("q", [""])[0]
+            translated = fake_translate(text, params.get("sl", ["auto"])[0], params.get("tl", ["en"])[0])
+            self.state.record([text], started)
+            body = f'<html><body><div class="result-container">{html.escape(translated)}</div></body></html>'
+            self._send(200, body, "text/html; charset=utf-8")
+        else:
+            self._send(404, json.dumps({"error": "Not found"}))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if url.path == "/reset":
+            self.state.reset()
+            return self._send(200, json.dumps({"ok": True}))
+        if url.path != "/translate":
+            return self._send(404, json.dumps({"error": "Not found"}))
+        # LibreTranslate accepts query-string, form or JSON parameters
+        params = {k: v if len(v) > 1 else v[0] for k, v in parse_qs(url.query).items()}
+        if raw:
+            if "json" in (self.headers.get("Content-Type") or ""):
+                params.update(json.loads(raw.decode("utf-8")))
+            else:
+                params.update({k: v if len(v) > 1 else v[0] for k, v in parse_qs(raw.decode("utf-8")).items()})
+        started = time.perf_counter()
+        outcome = self.state.admit()
+        if outcome != "ok":
+            return self._reject(outcome)
+        q = params.get("q", "")
+        texts = q if isinstance(q, list) else [q]
+        translated = [fake_translate(t, params.get("source", "auto"), params.get("target", "en")) for t in texts]
+        self.state.record(texts, started, isinstance(q, list))
+        self._send(200, json.dumps({"translatedText": translated if isinstance(q, list) else translated[0]}))
+
+
+def make_server(host="127.0.0.1", port=0, **options):
+    state = MockState(**options)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+# Start a server on a background thread and return it (server.server_address has the port)
+def start_in_thread(**options):
+    server = make_server(**options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline mock Google/LibreTranslate server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Base latency added to each request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random +/- jitter on top of the base latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--throttle-rpm", type=int, default=0, help="Answer 429 above this many requests per minute (0 = off)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         error_rate=args.error_rate, throttle_rpm=args.throttle_rpm, seed=args.seed)
+    host, port = server.server_address
+    print(f"Mock translation server listening on http://{host}:{port}/ (Google: /m, Libre: /translate)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping mock server.")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# profiling.py
+# Phase timing and cProfile support for translate.py --profile.
+# Phases may repeat (e.g. QA runs once per cell) and nest; each phase reports its exclusive
+# wall and CPU time, so nested [BOLD] handling is not double-counted in its parent phase.
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager
+
+
+class PhaseProfiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = {}  # name -> {"wall": s, "cpu": s, "calls": n}
+        self.order = []
+        self.stack = []
+        self.profiler = cProfile.Profile() if enabled else None
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        # frame: [name, wall start, cpu start, child wall, child cpu]
+        frame = [name, time.perf_counter(), time.process_time(), 0.0, 0.0]
+        self.stack.append(frame)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            wall = time.perf_counter() - frame[1]
+            cpu = time.process_time() - frame[2]
+            if self.stack:
+                self.stack[-1][3] += wall
+                self.stack[-1][4] += cpu
+            entry = self.phases.get(name)
+            if entry is None:
+                entry = self.phases[name] = {"wall": 0.0, "cpu": 0.0, "calls": 0}
+                self.order.append(name)
+            entry["wall"] += wall - frame[3]
+            entry["cpu"] += cpu - frame[4]
+            entry["calls"] += 1
+
+    def start(self):
+        if self.profiler:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.disable()
+
+    def report_lines(self):
+        total_wall = sum(p["wall"] for p in self.phases.values()) or 1.0
+        lines = [f"{'Phase':<24}{'Wall (s)':>12}{'CPU (s)':>12}{'Calls':>8}{'% wall':>9}"]
+        for name in self.order:
+            p = self.phases[name]
+            lines.append(f"{name:<24}{p['wall']:>12.3f}{p['cpu']:>12.3f}{p['calls']:>8}{100 * p['wall'] / total_wall:>8.1f}%")
+        return lines
+
+    # Write phases.json, phases.txt and the cProfile dump (profile.pstats + readable top list) into run_dir
+    def write(self, run_dir):
+        os.makedirs(run_dir, exist_ok=True)
+        with open(os.path.join(run_dir, "phases.json"), "w", encoding="utf-8") as f:
+            json.dump({name: self.phases[name] for name in self.order}, f, indent=2)
+        with open(os.path.join(run_dir, "phases.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(self.report_lines()) + "\n")
+        if self.profiler:
+            self.profiler.dump_stats(os.path.join(run_dir, "profile.pstats"))
+            buffer = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=buffer)
+            stats.sort_stats("cumulative").print_stats(40)
+            with open(os.path.join(run_dir, "profile_top.txt"), "w", encoding="utf-8") as f:
+                f.write(buffer.getvalue())
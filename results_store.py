@@ -0,0 +1,167 @@
+# results_store.py
+# Compact in-memory store for per-cell translation results.
+# Cells are addressed by integer (row, language) ids and kept in typed arrays (status codes,
+# string ids, similarity); every string is interned once in a shared pool, so the English
+# source, fanned-out variant translations and repeated error messages are stored a single time
+# no matter how many languages reference them. The report lists (failed, suspects, [BOLD]
+# notes) are built from it on demand instead of being accumulated as dicts during the run.
+
+from array import array
+
+
+STATUS_PENDING = 0
+STATUS_OK = 1
+STATUS_SUSPECT = 2   # translated, but flagged by QA
+STATUS_FAILED = 3
+STATUS_SKIPPED = 4
+
+STATUS_NAMES = {
+    STATUS_PENDING: "pending",
+    STATUS_OK: "ok",
+    STATUS_SUSPECT: "suspect",
+    STATUS_FAILED: "failed",
+    STATUS_SKIPPED: "skipped",
+}
+
+
+class StringPool:
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, value):
+        value = str(value)
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def get(self, string_id):
+        return self.strings[string_id] if string_id >= 0 else ""
+
+
+class ResultStore:
+    # languages: output column names; codes: the backend code used for each of them
+    def __init__(self, n_rows, languages, codes=None):
+        self.n_rows = n_rows
+        self.languages = list(languages)
+        self.language_ids = {lang: i for i, lang in enumerate(self.languages)}
+        self.pool = StringPool()
+        self.codes = [self.pool.intern(c) for c in (codes or self.languages)]
+        n_cells = n_rows * len(self.languages)
+        self.sources = array("i", [-1]) * n_rows
+        self.status = array("b", [STATUS_PENDING]) * n_cells
+        self.text = array("i", [-1]) * n_cells
+        # Sparse extras, only for the few cells that need them: cell -> (string id, ...)
+        self.suspects = {}  # cell -> (back_translated id, similarity, detected_lang id, note id)
+        self.errors = {}  # cell -> error id
+        self.bold_notes = {}  # cell -> note id
+
+    def _cell(self, row, language):
+        return row * len(self.languages) + self.language_ids[language]
+
+    def set_source(self, row, text):
+        self.sources[row] = self.pool.intern(text)
+
+    def set_translation(self, row, language, text):
+        cell = self._cell(row, language)
+        self.text[cell] = self.pool.intern(text)
+        self.status[cell] = STATUS_OK
+
+    # note: why the cell needs review, when it isn't the QA check (e.g. a translation memory match)
+    def mark_suspect(self, row, language, back_translated, similarity, detected_lang, note=""):
+        cell = self._cell(row, language)
+        self.status[cell] = STATUS_SUSPECT
+        self.suspects[cell] = (self.pool.intern(back_translated), float(similarity), self.pool.intern(detected_lang),
+                               self.pool.intern(note) if note else -1)
+
+    def mark_failed(self, row, language, error):
+        cell = self._cell(row, language)
+        self.status[cell] = STATUS_FAILED
+        self.text[cell] = -1
+        self.errors[cell] = self.pool.intern(error)
+
+    def mark_skipped(self, row, language, text=None):
+        cell = self._cell(row, language)
+        self.status[cell] = STATUS_SKIPPED
+        if text is not None:
+            self.text[cell] = self.pool.intern(text)
+
+    def set_bold_note(self, row, language, note):
+        self.bold_notes[self._cell(row, language)] = self.pool.intern(note)
+
+    def get_status(self, row, language):
+        return self.status[self._cell(row, language)]
+
+    def get_translation(self, row, language):
+        return self.pool.get(self.text[self._cell(row, language)])
+
+    def count(self, *statuses):
+        return sum(self.status.count(s) for s in statuses)
+
+    # Values for one output column: translated cells get their text, failed cells are emptied,
+    # cells that were never touched (e.g. [BOLD] rows) keep their existing value
+    def column_values(self, language, existing):
+        lang_id = self.language_ids[language]
+        width = len(self.languages)
+        values = list(existing)
+        for row in range(self.n_rows):
+            cell = row * width + lang_id
+            status = self.status[cell]
+            if status == STATUS_FAILED:
+                values[row] = ""
+            elif status != STATUS_PENDING and self.text[cell] >= 0:
+                values[row] = self.pool.strings[self.text[cell]]
+        return values
+
+    def _record(self, cell):
+        row, lang_id = divmod(cell, len(self.languages))
+        return row, {
+            "row": row,
+            "english_text": self.pool.get(self.sources[row]),
+            "language_code": self.languages[lang_id],
+            "short_code": self.pool.get(self.codes[lang_id]),
+        }
+
+    # Column by column, then row, like the translation loop
+    def _sorted(self, cells):
+        width = len(self.languages)
+        return sorted(cells, key=lambda cell: (cell % width, cell // width))
+
+    # Report rows in the same shape translate.py has always written
+    def failed_records(self):
+        records = []
+        for cell in self._sorted(self.errors):
+            if self.status[cell] == STATUS_FAILED:
+                _, record = self._record(cell)
+                record["error"] = self.pool.get(self.errors[cell])
+                records.append(record)
+        return records
+
+    def suspect_records(self):
+        records = []
+        for cell in self._sorted(self.suspects):
+            if self.status[cell] == STATUS_SUSPECT:
+                _, record = self._record(cell)
+                back_id, similarity, detected_id, note_id = self.suspects[cell]
+                record["translated_text"] = self.pool.get(self.text[cell])
+                record["back_translated"] = self.pool.get(back_id)
+                record["similarity"] = similarity
+                record["detected_lang"] = self.pool.get(detected_id)
+                if note_id >= 0:
+                    record["note"] = self.pool.get(note_id)
+                records.append(record)
+        return records
+
+    def context_bold_records(self):
+        records = []
+        for cell in self._sorted(self.bold_notes):
+            row, record = self._record(cell)
+            records.append({
+                "Row": row + 2,
+                "Language": record["language_code"],
+                "Source": record["english_text"],
+                "Bold Words & Translations": self.pool.get(self.bold_notes[cell]),
+            })
+        return records
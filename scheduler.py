@@ -0,0 +1,123 @@
+# scheduler.py
+# Quota-aware dispatch for translation backends. Google and self-hosted Libre clusters enforce
+# requests-per-minute and characters-per-minute quotas; instead of sending until calls start
+# failing with 429s (and burning retries on them), every request reserves its characters in a
+# sliding one-minute window first and waits for room when the quota is used up. Exhausting a
+# quota then shows up as predictable queueing instead of failed cells.
+
+import math
+import threading
+import time
+from collections import deque
+
+
+WINDOW = 60.0  # quotas are per minute
+
+
+class QuotaBucket:
+    def __init__(self, rpm=0, cpm=0):
+        self.rpm = rpm
+        self.cpm = cpm
+        self.sent = deque()  # (timestamp, characters) of requests inside the window
+        self.characters = 0
+        self.lock = threading.Lock()
+
+    @property
+    def limited(self):
+        return bool(self.rpm or self.cpm)
+
+    def _expire(self, now):
+        while self.sent and now - self.sent[0][0] >= WINDOW:
+            self.characters -= self.sent.popleft()[1]
+
+    # Seconds until `requests` requests with this many characters fit in the window (0 = send now)
+    def _wait_time(self, characters, now, requests=1):
+        self._expire(now)
+        if not self.sent:
+            return 0.0  # a single oversized request still has to go out at some point
+        waits = [0.0]
+        requests = min(requests, self.rpm) if self.rpm else requests
+        if self.rpm and len(self.sent) + requests > self.rpm:
+            waits.append(self.sent[len(self.sent) + requests - 1 - self.rpm][0] + WINDOW - now)
+        if self.cpm and self.characters + characters > self.cpm:
+            # Oldest requests that have to leave the window before these characters fit
+            excess = self.characters + characters - self.cpm
+            for timestamp, size in self.sent:
+                excess -= size
+                if excess <= 0:
+                    waits.append(timestamp + WINDOW - now)
+                    break
+        return max(waits)
+
+    # Block until the request fits, then count it; returns the seconds spent waiting.
+    # A long cell split into chunks is sent as `requests` requests and reserves a slot for each.
+    def acquire(self, characters, requests=1):
+        if not self.limited:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                delay = self._wait_time(characters, now, requests)
+                if delay <= 0:
+                    self.sent.append((now, characters))
+                    self.sent.extend((now, 0) for _ in range(requests - 1))
+                    self.characters += characters
+                    return waited
+            time.sleep(delay)
+            waited += delay
+
+
+class QuotaScheduler:
+    def __init__(self, backends=()):
+        # One bucket per backend label, shared by forward, [BOLD] and QA calls to that backend
+        self.buckets = {}
+        self.quotas = {}
+        self.lock = threading.Lock()
+        for backend in backends:
+            self.add(backend)
+
+    def add(self, backend):
+        with self.lock:
+            if backend.label not in self.buckets:
+                rpm, cpm = backend.quotas()
+                self.quotas[backend.label] = (rpm, cpm)
+                self.buckets[backend.label] = QuotaBucket(rpm, cpm)
+
+    @property
+    def limited(self):
+        return any(bucket.limited for bucket in self.buckets.values())
+
+    def acquire(self, label, characters, requests=1):
+        bucket = self.buckets.get(label)
+        return bucket.acquire(characters, requests) if bucket else 0.0
+
+    # Shortest time the quota allows for this much traffic, in seconds (None if the backend is unlimited).
+    # The first window's worth goes out at once; every further window's worth waits a full minute.
+    def projected_seconds(self, label, requests, characters):
+        rpm, cpm = self.quotas.get(label, (0, 0))
+        if not (rpm or cpm):
+            return None
+        windows = max(math.ceil(requests / rpm) if rpm else 1, math.ceil(characters / cpm) if cpm else 1)
+        return max(0, windows - 1) * WINDOW
+
+
+# Reorder work so the quota is used evenly: alternate the longest remaining text with the shortest,
+# so the character budget and the request budget run out at about the same rate.
+def interleave_by_length(items, length):
+    ordered = sorted(items, key=length)
+    result = []
+    lo, hi = 0, len(ordered) - 1
+    while lo <= hi:
+        result.append(ordered[hi])
+        if lo != hi:
+            result.append(ordered[lo])
+        lo += 1
+        hi -= 1
+    return result
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
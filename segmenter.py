@@ -0,0 +1,89 @@
+# segmenter.py
+# Sentence-level chunking for cells longer than a backend accepts in one request (multi-paragraph
+# rule descriptions). Texts are split at paragraph and sentence boundaries, packed greedily into
+# chunks under the limit, translated in parallel and joined back in order with the original
+# separators. Split points never fall inside bracketed placeholders ([CARD_NUMBER]), placeholder
+# tokens (__PH_0__, __BOLD_1__) or **bold** markup, so those always reach the backend whole.
+
+import re
+
+
+# Spans that must stay inside a single chunk
+PROTECTED_PATTERN = re.compile(r"\*\*[^*]+\*\*|\[[^\[\]]*\]|__[A-Za-z]+_?\d*__")
+# Preferred split points, strongest first: paragraph breaks, sentence ends, clause breaks, any whitespace
+BOUNDARY_PATTERNS = [
+    re.compile(r"\n\s*\n\s*"),
+    re.compile(r"(?<=[.!?。！？])\s+"),
+    re.compile(r"(?<=[,;:])\s+"),
+    re.compile(r"\s+"),
+]
+
+
+def _protected_ranges(text):
+    return [match.span() for match in PROTECTED_PATTERN.finditer(text)]
+
+
+def _inside(pos, ranges):
+    return any(start < pos < end for start, end in ranges)
+
+
+# Split text into (piece, separator) pairs at boundaries of one strength, skipping protected spans
+def _split(text, pattern, ranges, offset=0):
+    pieces = []
+    last = 0
+    for match in pattern.finditer(text):
+        if match.start() == 0 or _inside(offset + match.start(), ranges):
+            continue
+        pieces.append((text[last:match.start()], match.group(0)))
+        last = match.end()
+    pieces.append((text[last:], ""))
+    return pieces
+
+
+def _segments(text, max_chars, ranges, level=0, offset=0):
+    if len(text) <= max_chars or level >= len(BOUNDARY_PATTERNS):
+        return [(text, "")]
+    result = []
+    position = offset
+    for piece, separator in _split(text, BOUNDARY_PATTERNS[level], ranges, offset):
+        if len(piece) > max_chars:
+            sub = _segments(piece, max_chars, ranges, level + 1, position)
+            sub[-1] = (sub[-1][0], sub[-1][1] + separator)
+            result.extend(sub)
+        else:
+            result.append((piece, separator))
+        position += len(piece) + len(separator)
+    return result
+
+
+# Split text into chunks of at most max_chars (where boundaries allow): list of (chunk, separator after it).
+# "".join(chunk + separator) gives back the original text.
+def split_into_chunks(text, max_chars):
+    if len(text) <= max_chars:
+        return [(text, "")]
+    chunks = []
+    current, current_sep = "", ""
+    for piece, separator in _segments(text, max_chars, _protected_ranges(text)):
+        if current and len(current) + len(current_sep) + len(piece) <= max_chars:
+            current += current_sep + piece
+        else:
+            if current:
+                chunks.append((current, current_sep))
+            current = piece
+        current_sep = separator
+    chunks.append((current, current_sep))
+    return chunks
+
+
+# translate(chunk) -> translated chunk. Texts within the limit go out as one request as before;
+# longer ones are chunked, translated in parallel on `executor` (if given) and joined in order.
+def translate_chunked(translate, text, max_chars, executor=None):
+    if len(text) <= max_chars:
+        return translate(text)
+    chunks = split_into_chunks(text, max_chars)
+    if executor is None:
+        translated = [translate(chunk) if chunk.strip() else chunk for chunk, _ in chunks]
+    else:
+        futures = [executor.submit(translate, chunk) if chunk.strip() else None for chunk, _ in chunks]
+        translated = [future.result() if future else chunk for future, (chunk, _) in zip(futures, chunks)]
+    return "".join(f"{part}{separator}" for part, (_, separator) in zip(translated, chunks))
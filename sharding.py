@@ -0,0 +1,115 @@
+# sharding.py
+# Process-pool execution for the CPU-bound stages of translate.py (text preprocessing,
+# SequenceMatcher/langdetect QA, the markdown formatting pass). Those run under the GIL on a
+# single core, so on large sheets the row range is split into shards and spread over worker
+# processes. Segment text goes to the workers through shared memory (one UTF-8 block plus an
+# offsets table per column) rather than pickling DataFrames; each worker only decodes its own
+# slice and sends back the small per-row results, which are merged in the original row order.
+
+import os
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+
+OFFSET_SIZE = array("q").itemsize
+
+
+# A list of strings packed into one shared memory block: n+1 int64 offsets, then the UTF-8 bytes
+class SharedStrings:
+    def __init__(self, values):
+        encoded = [str(v).encode("utf-8") for v in values]
+        offsets = array("q", [0])
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+        self.count = len(encoded)
+        header = offsets.tobytes()
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, len(header) + offsets[-1]))
+        self.shm.buf[:len(header)] = header
+        self.shm.buf[len(header):len(header) + offsets[-1]] = b"".join(encoded)
+        self.name = self.shm.name
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Attach to a block created by the parent without letting this process' resource tracker claim it
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument and registers attached blocks too; the parent owns the block
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def read_strings(name, count, start, stop):
+    shm = _attach(name)
+    try:
+        offsets = array("q")
+        offsets.frombytes(bytes(shm.buf[start * OFFSET_SIZE:(stop + 1) * OFFSET_SIZE]))
+        base = (count + 1) * OFFSET_SIZE
+        data = bytes(shm.buf[base + offsets[0]:base + offsets[-1]])
+    finally:
+        shm.close()
+    return [data[a - offsets[0]:b - offsets[0]].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+
+
+# Runs in the worker: decode this shard's slice of every column and apply the stage function
+def _run_shard(func, columns, start, stop):
+    return func(*[read_strings(name, count, start, stop) for name, count in columns])
+
+
+class ShardPool:
+    # processes: worker count (0 = one per core, 1 = run everything in this process)
+    # min_items: below this many rows a stage runs inline, since starting workers costs more than it saves
+    def __init__(self, processes=1, min_items=500):
+        self.processes = processes or os.cpu_count() or 1
+        self.min_items = min_items
+        self.executor = None
+        self.lock = threading.Lock()  # one pool may be shared by concurrent jobs (translation_service.py)
+
+    @property
+    def enabled(self):
+        return self.processes > 1
+
+    # func(*column_slices) -> list with one result per row; must be a module-level function
+    def map(self, func, *columns):
+        n = len(columns[0]) if columns else 0
+        if not self.enabled or n < self.min_items:
+            return func(*[list(map(str, col)) for col in columns])
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.processes)
+        # A few shards per worker, so one slow shard doesn't leave the other cores idle
+        n_shards = min(n, self.processes * 4)
+        bounds = [n * i // n_shards for i in range(n_shards + 1)]
+        blocks = [SharedStrings(col) for col in columns]
+        try:
+            handles = [(block.name, block.count) for block in blocks]
+            futures = [self.executor.submit(_run_shard, func, handles, start, stop)
+                       for start, stop in zip(bounds, bounds[1:])]
+            results = []
+            for future in futures:
+                results.extend(future.result())
+        finally:
+            for block in blocks:
+                block.close()
+        return results
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# tabular_io.py
+# Input and output formats besides .xlsx. CSV, JSONL (one JSON object per row) and Parquet follow the
+# same conventions as the workbooks: first column is the source text, one column per language header,
+# [BOLD] rows directly below their main row. Excel reading and writing are by far the slowest I/O in
+# a run, so upstream exports can hand over CSV/JSONL/Parquet and render .xlsx only at the end:
+#
+#   python translate.py                                   (pick Fraud_Rules.csv, output Fraud_Rules_translated.csv)
+#   python tabular_io.py render Fraud_Rules_translated.csv   -> Fraud_Rules_translated.xlsx
+#
+# Without workbook sheets, suspects go next to the output as <name>_suspects.<ext>. Parquet needs the
+# optional 'pyarrow' package.
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import pandas as pd
+
+
+TABLE_EXTENSIONS = (".xlsx", ".csv", ".jsonl", ".parquet")
+# Reports the scripts write themselves, never offered as input
+OWN_REPORTS = {"failed_translations_log.csv", "translation_clean_report.csv"}
+# Outputs by file-name suffix: translated tables (offered only when picking a file to repair), and
+# suspects tables and translation_clean checkpoints (never offered)
+OWN_OUTPUT_SUFFIXES = ("_translated", "_test_results")
+OWN_SIDE_FILE_SUFFIXES = ("_suspects", ".checkpoint")
+
+
+def table_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in TABLE_EXTENSIONS:
+        raise ValueError(f"Unsupported file type '{ext}' (use one of {', '.join(TABLE_EXTENSIONS)})")
+    return ext
+
+
+# Input tables in the current directory, in every supported format; translated=True also lists the
+# scripts' translated outputs (translate.py --retry-failed repairs one of those)
+def list_tables(directory=".", translated=False):
+    excluded = OWN_SIDE_FILE_SUFFIXES + (() if translated else OWN_OUTPUT_SUFFIXES)
+    return [f for f in os.listdir(directory)
+            if f.lower().endswith(TABLE_EXTENSIONS) and f not in OWN_REPORTS and not f.startswith("~$")
+            and not os.path.splitext(f)[0].lower().endswith(excluded)]
+
+
+def _require_parquet():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("Parquet files need 'pyarrow'. Install it with 'pip install pyarrow'.") from e
+
+
+# Every non-empty value as a string, empty cells as NaN, like pd.read_excel(..., dtype=str)
+def _as_text(df):
+    # map() infers a dtype again (an all-null column comes back as float64), so cast back to object
+    return df.astype(object).apply(lambda col: col.map(lambda v: v if pd.isna(v) else str(v)).astype(object))
+
+
+def read_table(path):
+    ext = table_format(path)
+    if ext == ".xlsx":
+        return pd.read_excel(path, dtype=str)
+    if ext == ".csv":
+        # Only truly empty cells are missing; "NA" or "null" in a text column is text
+        return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+    if ext == ".jsonl":
+        return _as_text(pd.read_json(path, lines=True, dtype=False, convert_dates=False))
+    _require_parquet()
+    return _as_text(pd.read_parquet(path))
+
+
+# Header row first, then the data rows as lists of str/None, without loading the whole file
+# (for inputs too large for a DataFrame, e.g. translation memory imports). Workbooks are read from
+# their 'Translations' sheet when there is one.
+def iter_rows(path):
+    ext = table_format(path)
+    if ext == ".xlsx":
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            sheet = workbook["Translations"] if "Translations" in workbook.sheetnames else workbook.worksheets[0]
+            for row in sheet.iter_rows(values_only=True):
+                yield [None if v is None else str(v) for v in row]
+        finally:
+            workbook.close()
+    elif ext == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                yield [v if v != "" else None for v in row]
+    elif ext == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            header = None
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if header is None:
+                    header = list(record)
+                    yield header
+                yield [None if record.get(k) is None else str(record[k]) for k in header]
+    else:
+        _require_parquet()
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        yield list(parquet.schema_arrow.names)
+        for batch in parquet.iter_batches():
+            for record in batch.to_pylist():
+                yield [None if v is None else str(v) for v in record.values()]
+
+
+def write_table(df, path):
+    ext = table_format(path)
+    if ext == ".xlsx":
+        df.to_excel(path, index=False)
+    elif ext == ".csv":
+        df.to_csv(path, index=False, encoding="utf-8")
+    elif ext == ".jsonl":
+        df.to_json(path, orient="records", lines=True, force_ascii=False)
+    else:
+        _require_parquet()
+        # Parquet columns need one type; headers are strings in every other format too
+        df = df.copy()
+        df.columns = [str(c) for c in df.columns]
+        df.astype(object).where(df.notna(), None).to_parquet(path, index=False)
+
+
+def suspects_path(output_file):
+    base, ext = os.path.splitext(output_file)
+    return f"{base}_suspects{ext}"
+
+
+# Translations and suspects for the non-workbook formats. Returns the suspects file (or None).
+def write_results_table(df_with_bold, suspect_translations, output_file):
+    write_table(df_with_bold, output_file)
+    if not suspect_translations:
+        return None
+    path = suspects_path(output_file)
+    write_table(pd.DataFrame(suspect_translations), path)
+    return path
+
+
+# Final rendering step: a translated CSV/JSONL/Parquet (and its _suspects file) as the usual workbook
+def render_workbook(input_file, output_file=None, processes=1):
+    from engine import format_workbook, write_workbook
+    from sharding import ShardPool
+
+    output_file = output_file or f"{os.path.splitext(input_file)[0]}.xlsx"
+    df = read_table(input_file)
+    suspects = suspects_path(input_file)
+    suspect_translations = read_table(suspects).to_dict("records") if os.path.exists(suspects) else []
+    write_workbook(df, suspect_translations, output_file)
+    with ShardPool(processes) as shard_pool:
+        format_workbook(output_file, shard_pool)
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Table formats for translate.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("render", help="Render a translated CSV/JSONL/Parquet file (and its _suspects file) as .xlsx")
+    p.add_argument("input_file")
+    p.add_argument("-o", "--output", help="Output workbook (default: same name with .xlsx)")
+    p.add_argument("--processes", type=int, default=1, help="Worker processes for the formatting pass (0 = one per core)")
+    p = sub.add_parser("convert", help="Convert a table between formats (e.g. an .xlsx export to .parquet)")
+    p.add_argument("input_file")
+    p.add_argument("output_file")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "render":
+            print(f"Saved '{render_workbook(args.input_file, args.output, args.processes)}'.")
+        else:
+            write_table(read_table(args.input_file), args.output_file)
+            print(f"Saved '{args.output_file}'.")
+    except (ValueError, RuntimeError) as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
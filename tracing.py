@@ -0,0 +1,72 @@
+# tracing.py
+# Per-cell trace timeline for translate.py --trace, in Chrome trace-event format: open the file in
+# chrome://tracing, https://ui.perfetto.dev or speedscope. Every cell is a span on the thread that
+# handled it, with its backend requests (forward, batch, fallback, QA back-translation, [BOLD]
+# lookups), queue waits, retry waits and the pause between cells nested inside; requests sent
+# concurrently show up on their own worker threads. Where the profiler shows how much time went
+# where, the trace shows when: stalls, serialization points and idle gaps.
+
+import gzip
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TraceRecorder:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.events = []
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.threads = {}  # thread ident -> (small id, thread name)
+
+    def now(self):
+        return time.perf_counter()
+
+    def _tid(self):
+        ident = threading.get_ident()
+        if ident not in self.threads:
+            self.threads[ident] = (len(self.threads) + 1, threading.current_thread().name)
+        return self.threads[ident][0]
+
+    # A span measured by the caller (perf_counter start and end)
+    def add(self, name, category, start, end, **args):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.append({"name": name, "cat": category, "ph": "X", "pid": self.pid, "tid": self._tid(),
+                                "ts": round((start - self.origin) * 1e6, 1),
+                                "dur": round((end - start) * 1e6, 1), "args": args})
+
+    @contextmanager
+    def span(self, name, category, **args):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.perf_counter(), **args)
+
+    # A point in time (fallback to the next backend, interruption, ...)
+    def instant(self, name, category, **args):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.append({"name": name, "cat": category, "ph": "i", "s": "t", "pid": self.pid, "tid": self._tid(),
+                                "ts": round((time.perf_counter() - self.origin) * 1e6, 1), "args": args})
+
+    # Write {"traceEvents": [...]}; a path ending in .gz is gzip-compressed
+    def write(self, path):
+        with self.lock:
+            names = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                     for tid, name in self.threads.values()]
+            trace = {"traceEvents": names + sorted(self.events, key=lambda e: e["ts"]), "displayTimeUnit": "ms"}
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False, separators=(",", ":"))
+        return len(self.events)
@@ -6,22 +6,29 @@
 
 import os
 import sys
-import time
+import argparse
 import csv
-import threading
+import time
+
 import pandas as pd
-from deep_translator import GoogleTranslator, LibreTranslator
-from tqdm import tqdm
-from langdetect import detect, LangDetectException
-import difflib
-import openpyxl
-from openpyxl.styles import PatternFill
+from metrics import Metrics
+from profiling import PhaseProfiler
+from tracing import TraceRecorder
+from backends import BACKEND_CHOICES
+from sharding import ShardPool
+from translation_memory import TranslationMemory, DEFAULT_THRESHOLD
+from tabular_io import TABLE_EXTENSIONS, list_tables, read_table, suspects_path, write_results_table, write_table
+from cassette import start_recording, start_replay
+from metrics import read_mean_latency
+from engine import (EngineOptions, plan_dataframe, translate_dataframe, format_workbook, write_failed_log, write_workbook,
+                    STATUS_OK, STATUS_SUSPECT, STATUS_FAILED, STATUS_SKIPPED)
 
 
 
-# List all Excel files in the current directory
-def list_excel_files():
-    return [f for f in os.listdir('.') if f.endswith('.xlsx')]
+# List all input files in the current directory (.xlsx, .csv, .jsonl, .parquet); translated=True
+# also lists translated outputs, for --retry-failed
+def list_excel_files(translated=False):
+    return list_tables('.', translated)
 
 
 # Prompt user to select a file from a list
@@ -36,48 +43,223 @@ def choose_file(files, prompt):
         print("Invalid choice. Try again.")
 
 
-# Prompt user to select translation backend
+# Prompt user to select translation backend (choices come from the backend registry)
 def choose_backend():
     print("\nChoose translation backend:")
-    print("  [1] GoogleTranslator")
-    print("  [2] LibreTranslator")
-    print("  [3] Try Google, fallback to Libre")
+    for key, (label, _) in BACKEND_CHOICES.items():
+        print(f"  [{key}] {label}")
     while True:
         choice = input("Enter number: ")
-        if choice in ['1', '2', '3']:
+        if choice in BACKEND_CHOICES:
             return choice
         print("Invalid choice. Try again.")
 
 
+# --dry-run: everything before the first backend request, then a report of what the run would need
+def dry_run(args, input_file, source_lang):
+    ignore_terms_input = input("Enter comma-separated terms to ignore (leave blank for none): ").strip()
+    ignore_terms = [t.strip() for t in ignore_terms_input.split(",") if t.strip()]
+    try:
+        df = read_table(input_file)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    backend_choice = choose_backend()
+    latency = {}
+    if os.path.exists(args.latency_from):
+        latency = read_mean_latency(args.latency_from)
+        print(f"Using latency measured in '{args.latency_from}'.")
+    memory = TranslationMemory(args.tm, args.tm_threshold) if args.tm else None
+    options = EngineOptions(source_lang=source_lang, backend_choice=backend_choice, ignore_terms=ignore_terms,
+                            processes=args.processes, memory=memory, bold_alignment=args.bold_alignment,
+                            skip_untranslatable=args.skip_untranslatable, concurrency=args.concurrency)
+    plan = plan_dataframe(df, None, options)
+    if memory:
+        memory.close()
+    print(f"\nDry run for '{input_file}' ({BACKEND_CHOICES[backend_choice][0]}), nothing was translated:")
+    for line in plan.report_lines(latency, options.pacing):
+        print(f"  {line}")
+
+
+# Failures-only re-run: translate again just the cells listed in a failed-translations log and write
+# them into the translated file in place (new suspects are added, the log keeps what still fails)
+def retry_failed(args, output_file, source_lang):
+    if not os.path.exists(args.retry_failed):
+        print(f"Failed-translations log '{args.retry_failed}' not found.")
+        sys.exit(1)
+    with open(args.retry_failed, newline="", encoding="utf-8") as f:
+        failures = list(csv.DictReader(f))
+    if not failures:
+        print(f"'{args.retry_failed}' lists no failed translations.")
+        return
+    ignore_terms_input = input("Enter comma-separated terms to ignore (leave blank for none): ").strip()
+    ignore_terms = [t.strip() for t in ignore_terms_input.split(",") if t.strip()]
+    try:
+        table = read_table(output_file)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    backend_choice = choose_backend()
+
+    # Failed rows per backend code and language column (variant columns such as ar-SA and ar-EG share
+    # one code); cells that are no longer in the file stay in the log
+    positions = {str(col): i for i, col in enumerate(table.columns)}
+    by_code, remaining = {}, []
+    for fail in failures:
+        row = int(fail["row"])
+        if fail["language_code"] not in positions or not 0 <= row < len(table):
+            print(f"Row {row + 1}, Language: {fail['language_code']} is not in '{output_file}'; kept in the log.")
+            remaining.append(fail)
+            continue
+        by_code.setdefault(fail["short_code"], {}).setdefault(fail["language_code"], []).append(row)
+
+    shard_pool = ShardPool(args.processes)
+    memory = TranslationMemory(args.tm, args.tm_threshold) if args.tm else None
+    options = EngineOptions(source_lang=source_lang, backend_choice=backend_choice, ignore_terms=ignore_terms,
+                            shard_pool=shard_pool, memory=memory, bold_alignment=args.bold_alignment,
+                            concurrency=args.concurrency, retry_delay=args.retry_delay)
+    fixed, suspects = [], []  # fixed: (row, column position, translation)
+    for code, columns in by_code.items():
+        # The failed rows of every column with this code, emptied so the engine fills them. As in a full
+        # run, each row is translated once for all those columns; only the cells that failed are kept.
+        rows = sorted(set().union(*columns.values()))
+        index = {row: i for i, row in enumerate(rows)}
+        sub = table.iloc[rows, [0] + [positions[col] for col in columns]].reset_index(drop=True)
+        sub.iloc[:, 1:] = ""
+        labels = dict(zip(sub.columns[1:], columns))  # sub column -> log column name
+        result = translate_dataframe(sub, [(label, code) for label in labels], options)
+        if result.interrupted:
+            print("\nRe-run interrupted by user; nothing was written.")
+            shard_pool.close()
+            sys.exit(1)
+        failed_cells = {(index[row], label) for label, col in labels.items() for row in columns[col]}
+        for i, label in sorted(failed_cells, key=lambda cell: cell[0]):
+            if result.store.get_status(i, label) in (STATUS_OK, STATUS_SUSPECT):
+                fixed.append((rows[i], positions[labels[label]], result.store.get_translation(i, label)))
+        for record in result.suspect_translations:
+            if (record["row"], record["language_code"]) in failed_cells:
+                suspects.append(dict(record, row=rows[record["row"]]))
+        for record in result.failed_translations:
+            if (record["row"], record["language_code"]) in failed_cells:
+                remaining.append(dict(record, row=rows[record["row"]], language_code=labels[record["language_code"]]))
+    if memory:
+        memory.close()
+
+    if output_file.lower().endswith(".xlsx"):
+        # Cell by cell, so the rest of the workbook (formatting, other sheets) is left as it is
+        import openpyxl
+        workbook = openpyxl.load_workbook(output_file)
+        sheet = workbook["Translations"] if "Translations" in workbook.sheetnames else workbook.worksheets[0]
+        for row, position, text in fixed:
+            sheet.cell(row=row + 2, column=position + 1, value=text)
+        if suspects:
+            if "SuspectTranslations" not in workbook.sheetnames:
+                workbook.create_sheet("SuspectTranslations").append(list(suspects[0]))
+            suspect_sheet = workbook["SuspectTranslations"]
+            header = [cell.value for cell in suspect_sheet[1]]
+            for record in suspects:
+                suspect_sheet.append([record.get(name, "") for name in header])
+        workbook.save(output_file)
+        format_workbook(output_file, shard_pool)
+    else:
+        for row, position, text in fixed:
+            table.iat[row, position] = text
+        write_table(table, output_file)
+        if suspects:
+            path = suspects_path(output_file)
+            previous = read_table(path).to_dict("records") if os.path.exists(path) else []
+            write_table(pd.DataFrame(previous + suspects), path)
+    shard_pool.close()
+
+    if remaining:
+        write_failed_log(remaining, args.retry_failed)
+    else:
+        os.remove(args.retry_failed)
+    print(f"\n✅ Re-translated {len(fixed)} of {len(failures)} failed cells in '{output_file}'.")
+    print(f"  Suspect translations (review): {len(suspects)}")
+    if remaining:
+        print(f"⚠️ {len(remaining)} cells still failed; '{args.retry_failed}' now lists only those.")
+    else:
+        print(f"No failures left; '{args.retry_failed}' was removed.")
+
+
+# Command-line options (everything else is still prompted interactively)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Translate the first column of an Excel file into each language column.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record wall/CPU time per phase and a cProfile dump into a profile_<file>_<timestamp> directory")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Worker processes for preprocessing, QA scoring and the formatting pass on large sheets (0 = one per core)")
+    parser.add_argument("--no-bold-alignment", dest="bold_alignment", action="store_false",
+                        help="Translate every [BOLD] word on its own instead of reading it from the marked main translation")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE",
+                          help="Save every backend request, response and latency of this run to a cassette file")
+    cassette.add_argument("--replay", metavar="CASSETTE",
+                          help="Answer backend requests from a recorded cassette instead of the real backends (offline)")
+    parser.add_argument("--replay-latency", type=float, default=0.0, metavar="FACTOR",
+                        help="With --replay, wait the recorded latency times FACTOR per request (default 0: no waiting; 1: original)")
+    parser.add_argument("--translate-all", dest="skip_untranslatable", action="store_false",
+                        help="Send every cell to the backend, including numbers, IDs, URLs and cells made of ignore terms only")
+    parser.add_argument("--concurrency", type=int, default=1, metavar="MAX",
+                        help="Send up to MAX requests per backend at once; the level adapts to latency, errors and 429s "
+                             "(default 1: one cell at a time with a pause between cells)")
+    parser.add_argument("--trace", nargs="?", const="translation_trace.json", metavar="PATH",
+                        help="Write a per-cell timeline in Chrome trace-event format (default path: translation_trace.json; "
+                             "end it in .gz to compress)")
+    parser.add_argument("--retry-delay", type=float, default=5.0, metavar="SECONDS",
+                        help="Failed cells are retried after all languages are done, this long after failing at first "
+                             "(doubling per round, up to 2 rounds)")
+    parser.add_argument("--retry-failed", nargs="?", const="failed_translations_log.csv", metavar="LOG",
+                        help="Only re-translate the cells listed in a failed-translations log (default: "
+                             "failed_translations_log.csv), in place in the translated file you select")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only plan the run: unique segments, characters and requests per backend, and an estimated duration")
+    parser.add_argument("--latency-from", metavar="METRICS_JSON", default="translation_metrics.json",
+                        help="Run metrics whose measured latency the --dry-run estimate uses (default: the last run's translation_metrics.json)")
+    parser.add_argument("--tm", metavar="PATH",
+                        help="Fuzzy translation memory file (SQLite): reuse earlier translations of the same or nearly the same text")
+    parser.add_argument("--tm-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Lowest word-level similarity for a near match to be reused (default: {DEFAULT_THRESHOLD})")
+    return parser.parse_args(argv)
+
+
 def main():
+    args = parse_args()
+    # Backend traffic goes to (or comes from) a cassette with --record / --replay
+    recorder = start_recording(args.record) if args.record else None
+    if args.replay:
+        print(f"Replaying {start_replay(args.replay, args.replay_latency)} recorded backend calls from '{args.replay}'.")
+    # Phase timing is a no-op unless --profile is given
+    profiler = PhaseProfiler(enabled=args.profile)
+    tracer = TraceRecorder(enabled=bool(args.trace))
+    profiler.start()
+
     # Prompt for source language code
     default_source_lang = "en"
     source_lang = input(f"Enter source language code for the first column (default: {default_source_lang}): ").strip()
     if not source_lang:
         source_lang = default_source_lang
     print("\n=== Translation Script ===")
-    excel_files = list_excel_files()
+    excel_files = list_excel_files(translated=bool(args.retry_failed))
     if not excel_files:
-        print("No .xlsx files found in current directory.")
+        print(f"No {'/'.join(TABLE_EXTENSIONS)} files found in current directory.")
         sys.exit(1)
 
-    # Import mapping from language_mapping.py
-    try:
-        from language_mapping import LANGUAGE_MAPPING
-    except ImportError:
-        LANGUAGE_MAPPING = {}
-
-
-
-    input_file = choose_file(excel_files, "Select input Excel file:")
-    # Suggest default output name based on input
-    base_name = os.path.splitext(os.path.basename(input_file))[0]
-    default_output = f"{base_name}_translated.xlsx"
-    output_file = input(f"Enter output Excel filename (default: {default_output}): ").strip()
+    input_file = choose_file(excel_files, "Select the translated file to repair:" if args.retry_failed else "Select input file:")
+    if args.retry_failed:
+        return retry_failed(args, input_file, source_lang)
+    if args.dry_run:
+        return dry_run(args, input_file, source_lang)
+    # Suggest default output name based on input; the output format follows its extension
+    base_name, input_ext = os.path.splitext(os.path.basename(input_file))
+    default_output = f"{base_name}_translated{input_ext.lower()}"
+    output_file = input(f"Enter output filename (default: {default_output}): ").strip()
     if not output_file:
         output_file = default_output
-    if not output_file.lower().endswith('.xlsx'):
-        output_file += '.xlsx'
+    if not output_file.lower().endswith(TABLE_EXTENSIONS):
+        output_file += input_ext.lower()
+    workbook_output = output_file.lower().endswith('.xlsx')
     # Prompt before overwriting
     if os.path.exists(output_file):
         confirm = input(f"Output file '{output_file}' already exists. Overwrite? (y/n): ").strip().lower()
@@ -99,411 +281,121 @@ def main():
     else:
         ignore_terms = []
 
-    import re
-
-
-    df = pd.read_excel(input_file, dtype=str)
-
-    # Detect [BOLD] rows and build a list of (main_row_idx, bold_word) pairs
-    bold_pairs = []
-    rows_to_translate = []
-    i = 0
-    while i < len(df):
-        cell_val = str(df.iloc[i, 0]) if pd.notna(df.iloc[i, 0]) else ""
-        if cell_val.strip().startswith("[BOLD]"):
-            # This is a [BOLD] row, pair with previous row
-            if i > 0:
-                bold_words = [w.strip() for w in cell_val.strip()[6:].split(",") if w.strip()]
-                bold_pairs.append((i-1, bold_words, i))
-            i += 1
-        else:
-            rows_to_translate.append(i)
-            i += 1
+    with profiler.phase("workbook load"), tracer.span("workbook load", "stage"):
+        try:
+            df = read_table(input_file)
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
 
     # Warn if first column is empty
     if df.shape[1] == 0 or df.iloc[:,0].isnull().all() or (df.iloc[:,0].astype(str).str.strip() == '').all():
         print("Warning: The first column (source text) is empty. Please check your input file.")
         sys.exit(1)
 
-    # Ensure all columns are of type 'object' to avoid dtype issues when assigning strings
-    for col in df.columns:
-        df[col] = df[col].astype('object')
-
-
-
-    # Validate columns: support codes, mapped names, or a mix
-    col_headers = [str(col).strip() for col in df.columns[1:]]
-    try:
-        google_dict = GoogleTranslator().get_supported_languages(as_dict=True)
-        google_codes = set(google_dict.values())
-    except Exception:
-        google_codes = set()
-    try:
-        libre_dict = LibreTranslator().get_supported_languages(as_dict=True)
-        libre_codes = set(libre_dict.values())
-    except Exception:
-        libre_codes = set()
-    supported_codes = google_codes | libre_codes
-
-    valid_columns = []  # List of (col_name, target_code)
-    skipped_codes = []
-    for col in col_headers:
-        if not col:
-            skipped_codes.append("<empty header>")
-        elif col in supported_codes or col in LANGUAGE_MAPPING or len(col) == 2:
-            # Always use the original header, never change
-            valid_columns.append((col, col))
-        else:
-            skipped_codes.append(col)
-    if skipped_codes:
-        print(f"Warning: Skipping unsupported or empty language columns: {', '.join(map(str, skipped_codes))}")
-
-    # Prepare exclusion report for summary
-    exclusion_report = ""
-    if skipped_codes:
-        exclusion_report = f"Excluded columns (unsupported or empty): {', '.join(map(str, skipped_codes))}"
-
-    # Check for empty language columns and alert the user
-    empty_lang_cols = []
-    for col, _ in valid_columns:
-        # Always include the column, even if empty, and ensure it is filled by translation
-        if df[col].isnull().all() or (df[col].astype(str).str.strip() == '').all():
-            empty_lang_cols.append(col)
-            # Fill the column with empty strings to ensure it is present and will be filled
-            df[col] = ""
-    if empty_lang_cols:
-        print(f"Note: The following language columns are completely empty and will be filled by translation: {', '.join(map(str, empty_lang_cols))}")
-
-
     backend_choice = choose_backend()
 
-    failed_translations = []
-    # rows_to_translate now only includes main text rows (not [BOLD] rows)
-
-    success_count = 0
-    skip_count = 0
-    fail_count = 0
-    suspect_translations = []
-
-
-
-    # Preprocess input for clarity: clean whitespace, remove unnecessary punctuation, standardize casing
-    import string
-    def preprocess_text(text):
-        # Remove extra whitespace
-        text = ' '.join(str(text).split())
-        # Remove unnecessary punctuation except for basic sentence structure
-        allowed_punct = set('.!?,-:;')
-        text = ''.join(ch for ch in text if ch.isalnum() or ch.isspace() or ch in allowed_punct)
-        # Standardize casing (capitalize first letter, rest lower)
-        if text:
-            text = text[0].upper() + text[1:]
-        return text
-
-    # Helper: extract bold markdown (**) and replace with placeholders
-    # Also, always preserve user-specified ignore terms (case-insensitive) as links and never translate them
-    def extract_bold(text):
-        bold_pattern = r"(\*\*([^*]+)\*\*)"
-        placeholders = {}
-        new_text = text
-        # First, handle bolds
-        bolds = re.findall(bold_pattern, new_text)
-        for i, (full, inner) in enumerate(bolds):
-            # If the bolded text matches any ignore term, always treat as link and preserve
-            matched_ignore = None
-            for term in ignore_terms:
-                if inner.strip().lower() == term.lower():
-                    matched_ignore = term
-                    break
-            if matched_ignore:
-                placeholder = f"__IGNORE_{i}__"
-                placeholders[placeholder] = f"[{matched_ignore}](#)"
-                new_text = new_text.replace(full, placeholder, 1)
-            else:
-                placeholder = f"__BOLD_{i}__"
-                placeholders[placeholder] = f"[{inner}](#)"
-                new_text = new_text.replace(full, placeholder, 1)
-        # Then, handle any remaining ignore terms (not bolded)
-        def ignore_replacer_factory(term):
-            def ignore_replacer(match):
-                idx = len([k for k in placeholders if k.startswith("__IGNORE_")])
-                placeholder = f"__IGNORE_{idx}__"
-                placeholders[placeholder] = f"[{term}](#)"
-                return placeholder
-            return ignore_replacer
-        for term in ignore_terms:
-            pattern = re.compile(re.escape(term), re.IGNORECASE)
-            def italicize(match):
-                return f"*{match.group(0)}*"
-            new_text = pattern.sub(italicize, new_text)
-        return new_text, placeholders
-
-    def restore_bold(text, placeholders):
-        for placeholder, link in placeholders.items():
-            text = text.replace(placeholder, link)
-        return text
-
-    # Helper: run translation with timeout
-    def translate_with_timeout(func, args=(), timeout=15):
-        result = {}
-        def wrapper():
-            try:
-                result['value'] = func(*args)
-            except Exception as e:
-                result['error'] = e
-        thread = threading.Thread(target=wrapper)
-        thread.start()
-        thread.join(timeout)
-        if thread.is_alive():
-            return None, TimeoutError('Translation timed out')
-        return result.get('value'), result.get('error')
-
-
-    try:
-        # Store context-aware bold translations for output
-        context_bold_rows = []
-        # Loop over actual columns in df (excluding the source column)
-        for col_name, target_code in valid_columns:
-            lang_code = col_name
-            col_idx = df.columns.get_loc(col_name)
-            print(f"Translating column: {col_name} (using code: {target_code})")
-            print(f"[DEBUG] lang_code: {lang_code}, target_code: {target_code}")
-            for row_idx in rows_to_translate:
-                english_text = str(df.iat[row_idx, 0]).strip()
-                prepped_text = preprocess_text(english_text)
-                # Always translate and overwrite, regardless of current cell contents
-                try:
-                    translated = None
-                    backend = ""
-                    max_attempts = 3
-                    attempt = 0
-                    error = None
-                    while attempt < max_attempts:
-                        if backend_choice == '1':
-                            translated, error = translate_with_timeout(
-                                GoogleTranslator(source=source_lang, target=target_code).translate,
-                                (prepped_text,), 15)
-                            backend = "Google"
-                        elif backend_choice == '2':
-                            translated, error = translate_with_timeout(
-                                LibreTranslator(source=source_lang, target=target_code).translate,
-                                (prepped_text,), 15)
-                            backend = "Libre"
-                        else:
-                            translated, error = translate_with_timeout(
-                                GoogleTranslator(source=source_lang, target=target_code).translate,
-                                (prepped_text,), 15)
-                            backend = "Google"
-                            if error:
-                                translated, error = translate_with_timeout(
-                                    LibreTranslator(source=source_lang, target=target_code).translate,
-                                    (prepped_text,), 15)
-                                backend = "Libre"
-                        if not error:
-                            break
-                        attempt += 1
-                        time.sleep(0.5)
-                    if error:
-                        raise error
-                    translated_str = str(translated)
-                    df.iat[row_idx, col_idx] = translated_str
-                    success_count += 1
-
-                    # Context-aware [BOLD] handling
-                    for (main_idx, bold_words, bold_row_idx) in bold_pairs:
-                        if main_idx == row_idx:
-                            bold_translations = []
-                            for bold_word in bold_words:
-                                # Check if bold_word is in main text
-                                if bold_word not in english_text:
-                                    print(f"[WARN] [BOLD] word '{bold_word}' not found in main text at row {row_idx+2}")
-                                # Try to find translation of bold_word in translated_str
-                                try:
-                                    bold_translated, _ = translate_with_timeout(
-                                        GoogleTranslator(source=source_lang, target=target_code).translate,
-                                        (bold_word,), 15)
-                                except Exception:
-                                    bold_translated = ""
-                                found_in_sentence = False
-                                if bold_translated and bold_translated in translated_str:
-                                    found_in_sentence = True
-                                    bold_translations.append(f"{bold_word} → {bold_translated} (in sentence)")
-                                else:
-                                    import difflib
-                                    matches = difflib.get_close_matches(bold_translated, translated_str.split(), n=1, cutoff=0.7)
-                                    if matches:
-                                        found_in_sentence = True
-                                        bold_translations.append(f"{bold_word} → {matches[0]} (fuzzy match)")
-                                    else:
-                                        bold_translations.append(f"{bold_word} → {bold_translated} (not found)")
-                            context_bold_rows.append({
-                                "Row": row_idx+2,
-                                "Language": lang_code,
-                                "Source": english_text,
-                                "Bold Words & Translations": "; ".join(bold_translations)
-                            })
-
-                    try:
-                        back_translated, bt_error = translate_with_timeout(
-                            GoogleTranslator(source=target_code, target=source_lang).translate,
-                            (translated_str,), 15)
-                        if bt_error:
-                            back_translated = ""
-                        similarity = difflib.SequenceMatcher(None, english_text, back_translated).ratio() if back_translated else 0.0
-                        try:
-                            detected_lang = detect(translated_str)
-                        except LangDetectException:
-                            detected_lang = "unknown"
-                        # Technical document: more forgiving criteria
-                        if similarity < 0.7 or (
-                            detected_lang not in [target_code, lang_code, "unknown", "en"]
-                        ):
-                            suspect_translations.append({
-                                "row": row_idx,
-                                "english_text": english_text,
-                                "language_code": lang_code,
-                                "short_code": target_code,
-                                "translated_text": translated_str,
-                                "back_translated": back_translated,
-                                "similarity": similarity,
-                                "detected_lang": detected_lang
-                            })
-                    except Exception:
-                        pass
-
-                except Exception as e:
-                    failed_translations.append({
-                        "row": row_idx,
-                        "english_text": english_text,
-                        "language_code": lang_code,
-                        "short_code": target_code,
-                        "error": str(e)
-                    })
-                    df.iat[row_idx, col_idx] = ""
-                    backend = "FAILED"
-                    fail_count += 1
-                time.sleep(0.3)
-            print(f"Finished translating column: {lang_code}")
-    except KeyboardInterrupt:
+    # CPU-bound stages are sharded over worker processes with --processes (inline otherwise)
+    shard_pool = ShardPool(args.processes)
+    # Run telemetry, exported next to the summary report at the end of the run
+    metrics = Metrics()
+    # Near matches from the translation memory are reused and listed in SuspectTranslations for review
+    memory = TranslationMemory(args.tm, args.tm_threshold) if args.tm else None
+    options = EngineOptions(source_lang=source_lang, backend_choice=backend_choice, ignore_terms=ignore_terms,
+                            shard_pool=shard_pool, profiler=profiler, metrics=metrics, memory=memory,
+                            bold_alignment=args.bold_alignment, skip_untranslatable=args.skip_untranslatable,
+                            concurrency=args.concurrency, tracer=tracer, retry_delay=args.retry_delay)
+    if args.replay:
+        options.pacing *= args.replay_latency  # the pause between cells is for the real services only
+    result = translate_dataframe(df, None, options)
+    if result.interrupted:
         print("\nTranslation interrupted by user.")
-        print(f"Rows translated: {success_count}, Failed: {fail_count}, Skipped: {skip_count}")
+        print(f"Rows translated: {result.store.count(STATUS_OK, STATUS_SUSPECT)}, Failed: {result.store.count(STATUS_FAILED)}, Skipped: {result.store.count(STATUS_SKIPPED)}")
+        shard_pool.close()
+        if memory:
+            memory.close()
+        if recorder:
+            recorder.close()
+        if args.trace:
+            tracer.write(args.trace)  # the trace up to the interruption is often the interesting part
+            print(f"Trace saved to '{args.trace}'.")
         sys.exit(1)
-
-    # Save main results and suspects to separate sheets in the same Excel file
-    import openpyxl
-    from pandas import ExcelWriter
-
-    # Ensure output file is created even if there are no translations
-
-    with ExcelWriter(output_file, engine="openpyxl") as writer:
-        # Only keep the source and valid language columns in the output (including duplicates)
-        # Output columns should always match input headers, never auto-corrected or mapped
-        output_cols = list(df.columns)
-        # Insert [BOLD] rows as new rows in the main sheet after each main row (always)
-        new_rows = []
-        for idx in range(df.shape[0]):
-            # If this is a [BOLD] row, insert the bold row only (do not add extra row above)
-            is_bold_row = False
-            for (main_idx, bold_words, bold_row_idx) in bold_pairs:
-                if bold_row_idx == idx:
-                    # Build a new row for bold words, keep '[BOLD]' in the source column for clarity
-                    phrase = df.iloc[idx, 0].strip()
-                    if not phrase.startswith('[BOLD]'):
-                        phrase = '[BOLD] ' + phrase
-                    bold_row = pd.Series([phrase], index=[df.columns[0]])
-                    for col_name, target_code in valid_columns:
-                        translated_bolds = []
-                        for bold_word in bold_words:
-                            try:
-                                bold_translated, _ = translate_with_timeout(
-                                    GoogleTranslator(source=source_lang, target=target_code).translate,
-                                    (bold_word,), 15)
-                            except Exception:
-                                bold_translated = ""
-                            if not bold_translated or str(bold_translated).strip() == "":
-                                # Italicize if not translated
-                                translated_bolds.append(f"*{bold_word}*")
-                            else:
-                                translated_bolds.append(str(bold_translated))
-                        bold_row[col_name] = ", ".join(translated_bolds)
-                    new_rows.append(bold_row)
-                    is_bold_row = True
-                    break
-            if not is_bold_row:
-                new_rows.append(df.iloc[idx])
-        # Rebuild DataFrame
-        df_with_bold = pd.DataFrame(new_rows, columns=df.columns)
-        if df_with_bold.shape[0] == 0:
-            empty_df = pd.DataFrame(columns=output_cols)
-            empty_df.to_excel(writer, index=False, sheet_name="Translations")
-        else:
-            df_with_bold[output_cols].to_excel(writer, index=False, sheet_name="Translations")
-        if suspect_translations:
-            suspects_df = pd.DataFrame(suspect_translations)
-            suspects_df.to_excel(writer, index=False, sheet_name="SuspectTranslations")
-
-    # --- Apply real bold and italic formatting in Excel for markdown bold (**...**) and italics (*...*) ---
-    import re
-    from openpyxl.styles import Font
-    wb = openpyxl.load_workbook(output_file)
-    for sheet_name in ["Translations", "SuspectTranslations"]:
-        if sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            for row in ws.iter_rows(min_row=2):  # skip header
-                for cell in row:
-                    if cell.value and isinstance(cell.value, str):
-                        # Bold formatting
-                        if "**" in cell.value:
-                            matches = list(re.finditer(r"\*\*([^*]+)\*\*", cell.value))
-                            if matches:
-                                new_val = re.sub(r"\*\*([^*]+)\*\*", r"\1", cell.value)
-                                cell.value = new_val
-                                cell.font = Font(bold=True)
-                        # Italic formatting for ignored terms
-                        if "*" in cell.value:
-                            matches = list(re.finditer(r"\*([^*]+)\*", cell.value))
-                            if matches:
-                                new_val = re.sub(r"\*([^*]+)\*", r"\1", cell.value)
-                                cell.value = new_val
-                                cell.font = Font(italic=True)
-    wb.save(output_file)
+    success_count = result.success_count
+    skip_count = result.skip_count
+    fail_count = result.fail_count
+    failed_translations = result.failed_translations
+    suspect_translations = result.suspect_translations
+    exclusion_report = result.exclusion_report
+
+    suspects_file = None
+    if workbook_output:
+        with profiler.phase("excel write"), tracer.span("excel write", "stage"):
+            write_workbook(result.df_with_bold, suspect_translations, output_file)
+
+        with profiler.phase("formatting pass"), tracer.span("formatting pass", "stage"):
+            format_workbook(output_file, shard_pool)
+    else:
+        # CSV/JSONL/Parquet: no sheets and no formatting pass; suspects go to <name>_suspects.<ext>
+        with profiler.phase("table write"), tracer.span("table write", "stage"):
+            try:
+                suspects_file = write_results_table(result.df_with_bold, suspect_translations, output_file)
+            except RuntimeError as e:
+                print(e)
+                sys.exit(1)
+    shard_pool.close()
+    if memory:
+        memory.close()
+    if recorder:
+        recorder.close()
+        print(f"Recorded {recorder.count} backend calls to '{args.record}'.")
 
     # (No longer highlighting suspect translations in the main Translations sheet)
 
     # Still save failures to CSV for easy review
     if failed_translations:
-        with open("failed_translations_log.csv", mode="w", newline="", encoding="utf-8") as log_file:
-            writer = csv.DictWriter(
-                log_file,
-                fieldnames=["row", "english_text", "language_code", "short_code", "error"]
-            )
-            writer.writeheader()
-            writer.writerows(failed_translations)
+        write_failed_log(failed_translations)
 
 
     print(f"\n✅ Translations complete. Results saved to '{output_file}'.")
     print(f"Summary:")
     print(f"  Successful translations: {success_count}")
-    print(f"  Skipped cells (already translated): {skip_count}")
+    print(f"  Skipped cells (no translation needed): {skip_count}")
     print(f"  Failed translations: {fail_count}")
     print(f"  Suspect translations (review): {len(suspect_translations)}")
+    if memory:
+        print(f"  From translation memory: {result.memory_hits['exact']} exact, {result.memory_hits['fuzzy']} near matches (flagged for review), {result.memory_hits['reviewed']} of them reviewed")
+    if result.coalesced:
+        print(f"  Requests joined to an identical one in flight: {result.coalesced}")
+    if result.retry_queued:
+        print(f"  Deferred retries: {result.retry_recovered} of {result.retry_queued} cells that failed at first were translated on a retry round")
     if failed_translations:
         print(f"⚠️ {len(failed_translations)} failures logged to 'failed_translations_log.csv'")
         print("First 3 failed translations:")
         for fail in failed_translations[:3]:
             print(f"  Row {fail['row']+1}, Language: {fail['language_code']}, Error: {fail['error']}")
-    if suspect_translations:
+    if suspect_translations and suspects_file:
+        print(f"⚠️ {len(suspect_translations)} suspect translations are saved to '{suspects_file}'.")
+    elif suspect_translations:
         print(f"⚠️ {len(suspect_translations)} suspect translations are included as a sheet in the output Excel file.")
+    for line in result.concurrency_report:
+        if not line.startswith(" "):
+            print(f"  Concurrency: {line}")
 
     # Save summary report to file
     summary_report = [
         f"Translations complete. Results saved to '{output_file}'.",
         "Summary:",
         f"  Successful translations: {success_count}",
-        f"  Skipped cells (already translated): {skip_count}",
+        f"  Skipped cells (no translation needed): {skip_count}",
         f"  Failed translations: {fail_count}",
         f"  Suspect translations (review): {len(suspect_translations)}"
     ]
+    if memory:
+        summary_report.append(f"  From translation memory: {result.memory_hits['exact']} exact, {result.memory_hits['fuzzy']} near matches (flagged for review), {result.memory_hits['reviewed']} of them reviewed")
+    if result.coalesced:
+        summary_report.append(f"  Requests joined to an identical one in flight: {result.coalesced}")
+    if result.retry_queued:
+        summary_report.append(f"  Deferred retries: {result.retry_recovered} of {result.retry_queued} cells that failed at first were translated on a retry round")
     if exclusion_report:
         summary_report.append("")
         summary_report.append(exclusion_report)
@@ -511,11 +403,35 @@ def main():
         summary_report.append(f"{len(failed_translations)} failures logged to 'failed_translations_log.csv'")
         for fail in failed_translations[:3]:
             summary_report.append(f"  Row {fail['row']+1}, Language: {fail['language_code']}, Error: {fail['error']}")
-    if suspect_translations:
+    if suspect_translations and suspects_file:
+        summary_report.append(f"{len(suspect_translations)} suspect translations are saved to '{suspects_file}'.")
+    elif suspect_translations:
         summary_report.append(f"{len(suspect_translations)} suspect translations are included as a sheet ('SuspectTranslations') in the output Excel file.")
+    if result.concurrency_report:
+        summary_report.append("")
+        summary_report.append(f"Concurrency (adaptive, up to {args.concurrency} requests in flight per backend):")
+        summary_report.extend(f"  {line}" for line in result.concurrency_report)
     with open("translation_summary_report.txt", "w", encoding="utf-8") as summary_file:
         summary_file.write("\n".join(summary_report))
 
+    # Export run metrics: JSON next to the summary, Prometheus textfile for node exporter
+    # (set TRANSLATOR_METRICS_TEXTFILE to write the .prom file into the collector directory)
+    metrics.write_json("translation_metrics.json")
+    metrics.write_prometheus(os.environ.get("TRANSLATOR_METRICS_TEXTFILE", "translation_metrics.prom"))
+    print("Run metrics saved to 'translation_metrics.json' (Prometheus textfile: 'translation_metrics.prom').")
+
+    if args.trace:
+        events = tracer.write(args.trace)
+        print(f"Trace with {events} events saved to '{args.trace}' (open it in chrome://tracing or https://ui.perfetto.dev).")
+
+    if args.profile:
+        profiler.stop()
+        run_dir = f"profile_{base_name}_{time.strftime('%Y%m%d-%H%M%S')}"
+        profiler.write(run_dir)
+        print(f"\nProfile saved to '{run_dir}/' (phases.txt, phases.json, profile.pstats):")
+        for line in profiler.report_lines():
+            print(f"  {line}")
+
 
 if __name__ == "__main__":
     main()
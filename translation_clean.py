@@ -1,55 +1,253 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import pandas as pd
-from deep_translator import GoogleTranslator
 from tqdm import tqdm
-import time
 
-# Load flagged file
-df = pd.read_excel("Fraud_Rules_translations_final.xlsx'")
-language_codes = df.iloc[1, 1:].tolist()
+from backends import get_backend
+from concurrency import AIMDController
+
+
+# Bracketed placeholders such as [CARD_NUMBER] must survive translation untouched
+PLACEHOLDER_PATTERN = re.compile(r"\[[^\[\]]+\]")
+# Backends sometimes add spaces or change case inside our tokens, so match them loosely
+TOKEN_PATTERN = re.compile(r"__\s*ph\s*_?\s*(\d+)\s*__", re.IGNORECASE)
+
+
+# Replace bracketed placeholders with neutral tokens so the whole cell goes out in one call
+def protect_placeholders(text):
+    placeholders = []
+    def replace(match):
+        placeholders.append(match.group(0))
+        return f"__PH_{len(placeholders) - 1}__"
+    return PLACEHOLDER_PATTERN.sub(replace, text), placeholders
+
+
+# Put the placeholders back; returns None if the backend lost or duplicated any of them
+def restore_placeholders(text, placeholders):
+    seen = []
+    def replace(match):
+        idx = int(match.group(1))
+        if idx >= len(placeholders):
+            return match.group(0)
+        seen.append(idx)
+        return placeholders[idx]
+    restored = TOKEN_PATTERN.sub(replace, text)
+    if sorted(seen) != list(range(len(placeholders))):
+        return None
+    return restored
+
+
+# Shared across worker threads: spaces backend calls at least 1/rate seconds apart
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_time)
+            self.next_time = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def translate_with_placeholders(call, text):
+    protected, placeholders = protect_placeholders(text)
+    translated = call(protected)
+    restored = restore_placeholders(translated, placeholders) if placeholders else translated
+    if restored is not None:
+        return restored
+    # Rare: the backend mangled a token. Fall back to translating the text between placeholders.
+    parts = []
+    for piece in re.split(f"({PLACEHOLDER_PATTERN.pattern})", text):
+        if not piece.strip() or PLACEHOLDER_PATTERN.fullmatch(piece):
+            parts.append(piece)
+        else:
+            parts.append(call(piece))
+    return "".join(parts)
+
+
+# Write the workbook to a temp file and swap it in, so an interrupted save never corrupts the output
+def save_workbook_atomic(df, path):
+    tmp_path = f"{path}.tmp.xlsx"
+    df.to_excel(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+# Replay an existing checkpoint (one JSON object per line) into df; returns the set of repaired (row, col) cells
+def load_checkpoint(path, df):
+    done_cells = set()
+    if not os.path.exists(path):
+        return done_cells
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # torn last line from an interrupted run
+            df.iat[entry["row"], entry["col"]] = entry["value"]
+            done_cells.add((entry["row"], entry["col"]))
+    return done_cells
+
+
+# Find every cell that needs work with column-wide comparisons instead of a Python loop per cell.
+# Returns a list of (row_idx, col_idx, reason) with reason "missing", "untranslated" or "placeholder".
+def find_broken_cells(df, first_row=2):
+    source = df.iloc[first_row:, 0].fillna("").astype(str).str.strip()
+    has_source = source.ne("")
+    source_lower = source.str.lower()
+    broken = []
+    for col_idx in range(1, df.shape[1]):
+        values = df.iloc[first_row:, col_idx].fillna("").astype(str).str.strip()
+        missing = values.eq("") | values.str.lower().eq("nan")
+        untranslated = ~missing & values.str.lower().eq(source_lower)
+        placeholder = ~missing & ~untranslated & values.str.contains("[", regex=False) & values.str.contains("]", regex=False)
+        for reason, mask in (("missing", missing), ("untranslated", untranslated), ("placeholder", placeholder)):
+            for offset in (mask & has_source).to_numpy().nonzero()[0]:
+                broken.append((first_row + int(offset), col_idx, reason))
+    broken.sort()
+    return broken
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Retry missing/untranslated cells and clean bracketed placeholders.")
+    parser.add_argument("--input", default="Fraud_Rules_translations_final.xlsx")
+    parser.add_argument("--output", default="Fraud_rules.xlsx")
+    parser.add_argument("--compact-every", type=int, default=200,
+                        help="Rewrite the output workbook from the checkpoint every N repaired cells (0 = only at the end)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Most concurrent translation requests; the level adapts between 1 and this to latency, errors and 429s")
+    parser.add_argument("--rate", type=float, default=3.0, help="Maximum backend calls per second across all workers")
+    parser.add_argument("--detect-only", action="store_true", help="Only list broken cells in the report, don't translate")
+    parser.add_argument("--report", default="translation_clean_report.csv", help="CSV listing every broken cell and its outcome")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    checkpoint_path = f"{args.output}.checkpoint.jsonl"
+
+    # Load flagged file
+    df = pd.read_excel(args.input)
+    language_codes = df.iloc[1, 1:].tolist()
+
+    # Create editable copy (resuming from the checkpoint of an interrupted run, if any)
+    df_cleaned = df.copy().astype(object)
+    done_cells = load_checkpoint(checkpoint_path, df_cleaned)
+    if done_cells:
+        print(f"Resuming: {len(done_cells)} cells already repaired according to '{checkpoint_path}'.")
+
+    broken = [cell for cell in find_broken_cells(df_cleaned) if cell[:2] not in done_cells]
+    by_reason = {}
+    for _, _, reason in broken:
+        by_reason[reason] = by_reason.get(reason, 0) + 1
+    total_cells = (df.shape[0] - 2) * len(language_codes)
+    print(f"Found {len(broken)} of {total_cells} cells to repair: "
+          + (", ".join(f"{n} {reason}" for reason, n in sorted(by_reason.items())) or "nothing to do"))
+
+    outcomes = []  # report rows
+    if args.detect_only:
+        for row_idx, col_idx, reason in broken:
+            outcomes.append({"row": row_idx + 2, "language_code": language_codes[col_idx - 1], "reason": reason,
+                             "status": "detected", "error": ""})
+    else:
+        translator = get_backend("google")
+        limiter = RateLimiter(args.rate)
+        # Starts at one request in flight and works its way up to --workers while the backend keeps up
+        controller = AIMDController(translator.label, args.workers)
 
-# Create editable copy
-df_cleaned = df.copy()
-num_rows = df.shape[0] - 2
-num_cols = len(language_codes)
+        def repair(english_text, col_idx, reason):
+            short_code = str(language_codes[col_idx - 1]).split("_")[0].strip()
+            def call(text):
+                limiter.wait()
+                return controller.call(translator.translate, text, "en", short_code)
+            # Placeholders in the source are protected whatever the reason the cell was broken
+            if PLACEHOLDER_PATTERN.search(english_text):
+                return translate_with_placeholders(call, english_text)
+            return call(english_text)
 
-# Progress bar
-with tqdm(total=num_rows * num_cols, desc="Cleaning translations", unit="cell") as pbar:
-    for row_idx in range(2, df.shape[0]):
-        english_text = str(df.iat[row_idx, 0]).strip()
-        if not english_text:
-            pbar.update(num_cols)
-            continue
+        with open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+                ThreadPoolExecutor(max_workers=args.workers) as pool, \
+                tqdm(total=len(broken), desc="Repairing translations", unit="cell") as pbar:
+            # Submitted in a bounded window, so an interrupt leaves only a few requests to cancel
+            window = args.workers * 4
+            cells = iter(broken)
+            pending = {}
 
-        for col_idx in range(1, len(df.columns)):
-            lang_code = language_codes[col_idx - 1]
-            short_code = lang_code.split("_")[0].strip()
-            cell_value = str(df_cleaned.iat[row_idx, col_idx]).strip()
+            def submit_more():
+                for row_idx, col_idx, reason in cells:
+                    future = pool.submit(repair, str(df_cleaned.iat[row_idx, 0]).strip(), col_idx, reason)
+                    pending[future] = (row_idx, col_idx, reason)
+                    if len(pending) >= window:
+                        break
 
+            fixed_since_compaction = 0
             try:
-                # Retry missing/untranslated
-                if not cell_value or cell_value.lower() == english_text.lower():
-                    translated = GoogleTranslator(source='en', target=short_code).translate(english_text)
-                    df_cleaned.iat[row_idx, col_idx] = translated
-                    time.sleep(0.3)
-
-                # Clean bracketed placeholders
-                elif "[" in cell_value and "]" in cell_value:
-                    parts = []
-                    for token in english_text.split():
-                        if token.startswith("[") and token.endswith("]"):
-                            parts.append(token)
+                submit_more()
+                # Results are applied and checkpointed on this thread only, so the DataFrame is never shared
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        row_idx, col_idx, reason = pending.pop(future)
+                        outcome = {"row": row_idx + 2, "language_code": language_codes[col_idx - 1], "reason": reason}
+                        try:
+                            translated = future.result()
+                            if not translated or not str(translated).strip():
+                                raise ValueError("Backend returned an empty translation")
+                        except Exception as e:
+                            outcomes.append(dict(outcome, status="failed", error=f"{type(e).__name__}: {e}"))
                         else:
-                            translated = GoogleTranslator(source='en', target=short_code).translate(token)
-                            parts.append(translated)
-                            time.sleep(0.3)
-                    df_cleaned.iat[row_idx, col_idx] = " ".join(parts)
+                            df_cleaned.iat[row_idx, col_idx] = translated
+                            checkpoint.write(json.dumps({"row": row_idx, "col": col_idx, "value": translated},
+                                                        ensure_ascii=False) + "\n")
+                            checkpoint.flush()
+                            outcomes.append(dict(outcome, status="fixed", error=""))
+                            fixed_since_compaction += 1
+                            if args.compact_every and fixed_since_compaction >= args.compact_every:
+                                save_workbook_atomic(df_cleaned, args.output)
+                                fixed_since_compaction = 0
+                        pbar.update(1)
+                    submit_more()
+            except KeyboardInterrupt:
+                # Queued repairs are dropped; the few in flight finish without being applied
+                pool.shutdown(wait=False, cancel_futures=True)
+                pbar.close()
+                fixed = sum(1 for o in outcomes if o["status"] == "fixed")
+                print(f"\nInterrupted by user: {fixed} repairs are in '{checkpoint_path}'. "
+                      "Run again with the same --output to resume.")
+                sys.exit(1)
 
-            except:
-                pass  # Leave cell unchanged on error
+        # Final compaction: the workbook now holds everything, so the checkpoint can go
+        save_workbook_atomic(df_cleaned, args.output)
+        os.remove(checkpoint_path)
+        print(f"✅ Cleaned file saved as: {args.output}")
+        print("Concurrency:")
+        for line in controller.report_lines():
+            print(f"  {line}")
 
-            pbar.update(1)
+    outcomes.sort(key=lambda o: (o["row"], str(o["language_code"])))
+    with open(args.report, "w", newline="", encoding="utf-8") as report_file:
+        writer = csv.DictWriter(report_file, fieldnames=["row", "language_code", "reason", "status", "error"])
+        writer.writeheader()
+        writer.writerows(outcomes)
+    fixed = sum(1 for o in outcomes if o["status"] == "fixed")
+    failed = [o for o in outcomes if o["status"] == "failed"]
+    if not args.detect_only:
+        print(f"Repaired: {fixed}, could not repair: {len(failed)}")
+        for o in failed[:3]:
+            print(f"  Row {o['row']}, Language: {o['language_code']}, Error: {o['error']}")
+    print(f"Report saved to '{args.report}'.")
 
-        # 🔐 Auto-save after each row
-        df_cleaned.to_excel("Fraud_rules.xlsx", index=False)
 
-print("✅ Cleaned file saved as: SRCi_translations_autocleaned.xlsx")
+if __name__ == "__main__":
+    main()
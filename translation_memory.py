@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+# translation_memory.py
+# Fuzzy translation memory. Every translation that passed QA is kept in a SQLite file together with
+# its source segment; a later run finds the same segment (exact hit) or one that differs by a word
+# or a number (fuzzy hit) without calling a backend.
+#
+# Near matches are found with MinHash over 5-character shingles and locality-sensitive hashing: each
+# segment gets NUM_PERM min-hashes, grouped into BANDS bands whose hashes go into one sorted array
+# per language pair. A lookup hashes the query, finds segments sharing at least one band with two
+# binary searches, and scores only those few candidates with a word-level difflib ratio (one changed
+# word in a 20-word rule scores 0.95, in a 5-word one 0.8). Only the band keys live in memory
+# (BANDS x 16 bytes per segment); texts stay in SQLite.
+#
+# Existing reviewed translations are seeded in bulk from translated workbooks (any tabular_io format)
+# and TMX files, and can be exported back. Each segment has an origin: 'reviewed' segments are never
+# replaced by machine output and win ties between equally close near matches.
+#
+#   python translation_memory.py import Fraud_Rules_translations_final.xlsx vendor.tmx --tm translation_memory.sqlite
+#   python translation_memory.py export translation_memory.tmx --tm translation_memory.sqlite
+#   python translation_memory.py stats --tm translation_memory.sqlite
+#   python translation_memory.py benchmark --segments 1000000
+
+import argparse
+import difflib
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter, namedtuple
+from functools import lru_cache
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+from engine import LANGUAGE_MAPPING, preprocess_text, resolve_language
+from tabular_io import iter_rows, write_table
+
+
+SHINGLE = 5                # characters per shingle
+NUM_PERM = 48
+BANDS = 12
+# With 4 rows per band, segments sharing 50% of their 5-character shingles (Jaccard) become candidates
+# about half the time, at 60% ~80% of the time and at 70% ~96%
+ROWS = NUM_PERM // BANDS   # 4 rows per band
+MAX_BUCKET = 64            # ids read per band; very common band keys (boilerplate) are cut off here
+MAX_CANDIDATES = 8         # candidates scored per lookup
+DEFAULT_THRESHOLD = 0.85
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+# Where a translation came from, lowest priority first: machine output never replaces a reviewed one
+ORIGIN_PRIORITY = {"machine": 0, "reviewed": 1}
+IMPORT_BATCH = 20000  # pairs per transaction when importing
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+LANGUAGE_HEADER = re.compile(r"[a-z]{2,3}(?:[-_][A-Za-z0-9]{2,4})?")
+TMX_CODES = {"bpt", "ept", "ph", "it", "ut"}  # inline elements holding native markup, not text
+XML_INVALID = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+Match = namedtuple("Match", "translation similarity source origin")
+
+
+# Fixed hash constants (splitmix64), so band keys stored in the file stay valid across runs and numpy versions
+def _constants(count, seed):
+    values = []
+    for _ in range(count):
+        seed = (seed + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        z = seed
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        values.append(z ^ (z >> 31))
+    return np.array(values, dtype=np.uint64)
+
+
+_HASH_A = _constants(NUM_PERM, 1) | np.uint64(1)
+_HASH_B = _constants(NUM_PERM, 2)
+_BAND_MIX = _constants(BANDS * ROWS, 3).reshape(BANDS, ROWS)
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+# Character 5-grams of the normalized text as 64-bit ints (polynomial hash of the code points)
+def _shingles(text):
+    text = normalize(text)
+    if len(text) < SHINGLE:
+        text = text.ljust(SHINGLE)
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    grams = np.zeros(len(codes) - SHINGLE + 1, dtype=np.uint64)
+    for i in range(SHINGLE):
+        grams = grams * np.uint64(1000003) + codes[i:len(codes) - SHINGLE + 1 + i]
+    return np.unique(grams)
+
+
+# One 64-bit key per band; two segments share a band key when all ROWS min-hashes of that band agree.
+# Cached, because an import stores the same source once per target language (treat as read-only).
+@lru_cache(maxsize=IMPORT_BATCH)
+def band_keys(text):
+    grams = _shingles(text)
+    signature = ((grams[None, :] * _HASH_A[:, None] + _HASH_B[:, None]) >> np.uint64(32)).min(axis=1)
+    mixed = signature.reshape(BANDS, ROWS) * _BAND_MIX
+    keys = mixed[:, 0]
+    for r in range(1, ROWS):
+        keys = keys ^ (mixed[:, r] >> np.uint64(r * 7))
+    # Band number in the low bits, so all bands can share one sorted array
+    return (keys & ~np.uint64(0xFF)) | np.arange(BANDS, dtype=np.uint64)
+
+
+# When two segments differ only in their numbers, carry the new numbers into the stored translation.
+# Returns None if the translation doesn't contain the old numbers in the same order (e.g. reformatted).
+def adapt_numbers(source, matched_source, translation):
+    if NUMBER_PATTERN.sub("#", source) != NUMBER_PATTERN.sub("#", matched_source):
+        return None
+    old, new = NUMBER_PATTERN.findall(matched_source), NUMBER_PATTERN.findall(source)
+    if NUMBER_PATTERN.findall(translation) != old:
+        return None
+    replacements = iter(new)
+    return NUMBER_PATTERN.sub(lambda _: next(replacements), translation)
+
+
+# LSH index for one (source, target) language pair: a sorted array of band keys plus the ids they
+# belong to, and a small unsorted tail for segments added since the last merge
+class _PairIndex:
+    def __init__(self, ids, keys):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.pending = {}  # band key -> [id, ...]
+        self.pending_count = 0
+        self.size = 0
+        if len(ids):
+            self._merge(np.repeat(np.asarray(ids, dtype=np.int64), BANDS), np.asarray(keys, dtype=np.uint64).ravel())
+
+    def _merge(self, ids, keys):
+        keys = np.concatenate([self.keys, keys])
+        ids = np.concatenate([self.ids, ids])
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.ids = keys[order], ids[order]
+        self.size = len(self.keys) // BANDS
+
+    def add(self, segment_id, keys):
+        for key in keys.tolist():
+            self.pending.setdefault(key, []).append(segment_id)
+        self.pending_count += 1
+        # Re-sort once the tail is a noticeable fraction of the index
+        if self.pending_count >= max(1024, self.size // 8):
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        ids = [i for segment_ids in self.pending.values() for i in segment_ids]
+        keys = [key for key, segment_ids in self.pending.items() for _ in segment_ids]
+        self.pending, self.pending_count = {}, 0
+        self._merge(np.array(ids, dtype=np.int64), np.array(keys, dtype=np.uint64))
+
+    # Segment ids sharing the most bands with the query, best first
+    def candidates(self, keys, limit=MAX_CANDIDATES):
+        found = []
+        if len(self.keys):
+            starts = self.keys.searchsorted(keys, "left")
+            stops = np.minimum(self.keys.searchsorted(keys, "right"), starts + MAX_BUCKET)
+            found = [self.ids[start:stop] for start, stop in zip(starts.tolist(), stops.tolist()) if stop > start]
+        if self.pending:
+            found.extend(np.array(self.pending[key], dtype=np.int64) for key in keys.tolist() if key in self.pending)
+        if not found:
+            return []
+        ids, counts = np.unique(np.concatenate(found), return_counts=True)
+        return ids[np.argsort(-counts, kind="stable")[:limit]].tolist()
+
+
+class TranslationMemory:
+    def __init__(self, path, threshold=DEFAULT_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                source TEXT NOT NULL,         -- preprocessed, the lookup key
+                original TEXT,                -- source as imported or translated (NULL: same as source)
+                translation TEXT NOT NULL,
+                origin TEXT NOT NULL DEFAULT 'machine',
+                band_keys BLOB NOT NULL,
+                updated REAL NOT NULL,
+                UNIQUE (source_lang, target_lang, source)
+            );
+        """)
+        # Files from before the original column get it added (their sources stay as stored)
+        if "original" not in [column[1] for column in self.conn.execute("PRAGMA table_info(segments)")]:
+            self.conn.execute("ALTER TABLE segments ADD COLUMN original TEXT")
+        self.lock = threading.Lock()
+        self.indexes = {}  # (source_lang, target_lang) -> _PairIndex, loaded on first use
+
+    def _index(self, source_lang, target_lang):
+        pair = (source_lang, target_lang)
+        if pair not in self.indexes:
+            rows = self.conn.execute(
+                "SELECT id, band_keys FROM segments WHERE source_lang = ? AND target_lang = ?", pair).fetchall()
+            keys = np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.uint64).reshape(-1, BANDS)
+            self.indexes[pair] = _PairIndex([segment_id for segment_id, _ in rows], keys)
+        return self.indexes[pair]
+
+    # Best stored translation for text: an exact hit (similarity 1.0), the closest near match at or
+    # above the threshold, or None
+    def lookup(self, text, source_lang, target_lang, threshold=None):
+        threshold = self.threshold if threshold is None else threshold
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT translation, origin FROM segments WHERE source_lang = ? AND target_lang = ? AND source = ?",
+                (source_lang, target_lang, text)).fetchone()
+            if row:
+                return Match(row[0], 1.0, text, row[1])
+            if threshold >= 1.0:
+                return None
+            candidates = self._index(source_lang, target_lang).candidates(band_keys(text))
+            if not candidates:
+                return None
+            rows = self.conn.execute(
+                f"SELECT source, translation, origin FROM segments WHERE id IN ({','.join('?' * len(candidates))})",
+                candidates).fetchall()
+        best = None
+        words = normalize(text).split()
+        for source, translation, origin in rows:
+            matcher = difflib.SequenceMatcher(None, words, normalize(source).split())
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            score = matcher.ratio()
+            # Equally close: a reviewed translation beats a machine one
+            if score >= threshold and (best is None or (score, ORIGIN_PRIORITY.get(origin, 0))
+                                       > (best.similarity, ORIGIN_PRIORITY.get(best.origin, 0))):
+                best = Match(translation, score, source, origin)
+        if best:
+            adapted = adapt_numbers(text, best.source, best.translation)
+            if adapted is not None:
+                best = best._replace(translation=adapted)
+        return best
+
+    # entries: (source, translation) or (source, translation, original) with source the preprocessed
+    # lookup key and original the text as it was written. An existing segment gets the newer
+    # translation unless its origin has a higher priority. Returns {"added": n, "updated": n, "kept": n}.
+    def add_many(self, entries, source_lang, target_lang, origin="machine"):
+        now = time.time()
+        priority = ORIGIN_PRIORITY[origin]
+        counts = {"added": 0, "updated": 0, "kept": 0}
+        with self.lock:
+            index = self.indexes.get((source_lang, target_lang))
+            for source, translation, *original in entries:
+                original = original[0] if original and original[0] != source else None
+                existing = self.conn.execute(
+                    "SELECT id, origin FROM segments WHERE source_lang = ? AND target_lang = ? AND source = ?",
+                    (source_lang, target_lang, source)).fetchone()
+                if existing:
+                    if ORIGIN_PRIORITY.get(existing[1], 0) > priority:
+                        counts["kept"] += 1
+                    else:
+                        self.conn.execute("UPDATE segments SET translation = ?, origin = ?, original = ?, updated = ? "
+                                          "WHERE id = ?", (translation, origin, original, now, existing[0]))
+                        counts["updated"] += 1
+                    continue
+                keys = band_keys(source)
+                cursor = self.conn.execute(
+                    "INSERT INTO segments (source_lang, target_lang, source, original, translation, origin, band_keys, "
+                    "updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (source_lang, target_lang, source, original, translation, origin, keys.tobytes(), now))
+                if index is not None:
+                    index.add(cursor.lastrowid, keys)
+                counts["added"] += 1
+            self.conn.commit()
+        return counts
+
+    def add(self, source, translation, source_lang, target_lang, origin="machine", original=None):
+        self.add_many([(source, translation, original)], source_lang, target_lang, origin)
+
+    # Bulk load of (target_lang, source, translation, origin or None) pairs from read_tmx/read_table_pairs.
+    # Pairs are streamed in batches of IMPORT_BATCH, so millions of them never sit in memory at once.
+    # Sources are keyed preprocessed, the way the engine looks them up, and the original text is kept for
+    # export. Returns add_many's counts summed.
+    def import_pairs(self, pairs, source_lang, origin="reviewed", progress=None):
+        totals = Counter()
+        batch, pending = {}, 0  # (target_lang, origin) -> {source: (translation, original)}
+        def flush():
+            # Lower priorities first, so a reviewed pair wins over a machine one in the same batch
+            for (target_lang, pair_origin), entries in sorted(batch.items(), key=lambda item: ORIGIN_PRIORITY[item[0][1]]):
+                totals.update(self.add_many([(source, translation, original) for source, (translation, original)
+                                             in entries.items()], source_lang, target_lang, pair_origin))
+            batch.clear()
+            if progress:
+                progress(sum(totals.values()))
+        source, key = None, None
+        for target_lang, pair_source, translation, pair_origin in pairs:
+            if pair_source != source:  # consecutive pairs usually share their source (one per language)
+                source, key = pair_source, preprocess_text(pair_source)
+            batch.setdefault((target_lang, pair_origin or origin), {})[key] = (translation, source)
+            pending += 1
+            if pending >= IMPORT_BATCH:
+                flush()
+                pending = 0
+        flush()
+        return dict(totals)
+
+    # (source key, original text, target_lang, translation, origin) of one source language, ordered by
+    # source so all languages of a segment are adjacent
+    def segments(self, source_lang, targets=None, origin=None):
+        query = ("SELECT source, COALESCE(original, source), target_lang, translation, origin FROM segments "
+                 "WHERE source_lang = ?")
+        params = [source_lang]
+        if targets:
+            query += f" AND target_lang IN ({','.join('?' * len(targets))})"
+            params += list(targets)
+        if origin:
+            query += " AND origin = ?"
+            params.append(origin)
+        with self.lock:
+            yield from self.conn.execute(query + " ORDER BY source, target_lang", params)
+
+    # TMX 1.4: one <tu> per source segment with a <tuv> per language; the origin goes in an x-origin prop.
+    # Written as a stream. Returns the number of <tu> elements.
+    def export_tmx(self, path, source_lang, targets=None, origin=None):
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tmx version="1.4">\n')
+            f.write(f'  <header creationtool="translation_memory.py" creationtoolversion="1" segtype="sentence" '
+                    f'o-tmf="sqlite" adminlang="en" srclang={quoteattr(source_lang)} datatype="plaintext"/>\n  <body>\n')
+            current = None
+            for source, original, target_lang, translation, segment_origin in self.segments(source_lang, targets, origin):
+                if source != current:
+                    if current is not None:
+                        f.write("    </tu>\n")
+                    current = source
+                    count += 1
+                    f.write(f"    <tu>\n      <tuv xml:lang={quoteattr(source_lang)}><seg>{_xml_text(original)}</seg></tuv>\n")
+                f.write(f'      <tuv xml:lang={quoteattr(target_lang)}><prop type="x-origin">{segment_origin}</prop>'
+                        f"<seg>{_xml_text(translation)}</seg></tuv>\n")
+            if current is not None:
+                f.write("    </tu>\n")
+            f.write("  </body>\n</tmx>\n")
+        return count
+
+    # Workbook layout (source column, one column per language) in any tabular_io format, e.g. for review
+    def export_table(self, path, source_lang, targets=None, origin=None):
+        import pandas as pd
+        rows = [(original, target_lang, translation) for _, original, target_lang, translation, _
+                in self.segments(source_lang, targets, origin)]
+        df = pd.DataFrame(rows, columns=[source_lang, "target", "translation"])
+        df = df.pivot(index=source_lang, columns="target", values="translation").reset_index()
+        df.columns.name = None
+        write_table(df, path)
+        return len(df)
+
+    def stats(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT source_lang, target_lang, origin, COUNT(*) FROM segments "
+                "GROUP BY source_lang, target_lang, origin ORDER BY source_lang, target_lang, origin").fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def _xml_text(text):
+    return escape(XML_INVALID.sub("", str(text)))
+
+
+# Language codes as the engine uses them: TMX/header spellings like 'fr-fr' or 'fr_FR' become
+# 'fr-FR' and then go through language_mapping.py like column headers (-> 'fr')
+@lru_cache(maxsize=1024)
+def language_code(code):
+    parts = str(code).strip().replace("_", "-").split("-")
+    code = "-".join([parts[0].lower()] + [p.upper() if len(p) == 2 else p for p in parts[1:]])
+    return resolve_language(code)
+
+
+# Text of a <seg>: inline codes (<bpt>, <ph>, ...) are dropped, text inside <hi>/<sub> is kept
+def _seg_text(element):
+    parts = [element.text or ""]
+    for child in element:
+        if child.tag not in TMX_CODES:
+            parts.append(_seg_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+# (target_lang, source, translation, origin) from a TMX file, parsed as a stream. The source side is
+# the <tuv> in source_lang.
+def read_tmx(path, source_lang):
+    source_code = language_code(source_lang)
+    body = None
+    for event, element in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            if element.tag == "body":
+                body = element
+            continue
+        if element.tag != "tu":
+            continue
+        texts, origins = {}, {}
+        tu_origin = next((p.text for p in element.findall("prop") if p.get("type") == "x-origin"), None)
+        for tuv in element.findall("tuv"):
+            seg = tuv.find("seg")
+            text = " ".join(_seg_text(seg).split()) if seg is not None else ""
+            if text:
+                code = language_code(tuv.get(XML_LANG) or tuv.get("lang") or "")
+                texts.setdefault(code, text)
+                origins.setdefault(code, next((p.text for p in tuv.findall("prop") if p.get("type") == "x-origin"), tu_origin))
+        source = texts.pop(source_code, None)
+        if source:
+            for code, text in texts.items():
+                origin = origins[code]
+                yield code, source, text, origin if origin in ORIGIN_PRIORITY else None
+        if body is not None:
+            body.clear()  # keep memory flat on files with millions of units
+
+
+# (target_lang, source, translation, None) from a translated workbook or table: first column the
+# source, language columns by header. [BOLD] rows and non-language columns (e.g. 'Notes') are skipped;
+# variant columns that resolve to the same language contribute their first non-empty cell.
+def read_table_pairs(path, source_lang):
+    rows = iter_rows(path)
+    header = next(rows, None) or []
+    source_code = language_code(source_lang)
+    columns = [(i, language_code(h)) for i, h in enumerate(header[1:], 1)
+               if h and (LANGUAGE_HEADER.fullmatch(h.strip()) or h.strip() in LANGUAGE_MAPPING)]
+    columns = [(i, code) for i, code in columns if code != source_code]
+    for row in rows:
+        source = (row[0] or "").strip() if row else ""
+        if not source or source.startswith("[BOLD]"):
+            continue
+        seen = set()
+        for i, code in columns:
+            value = row[i] if i < len(row) else None
+            if value and value.strip() and code not in seen:
+                seen.add(code)
+                yield code, source, value.strip(), None
+
+
+# Synthetic rule-like sentences over a Zipf-distributed vocabulary of made-up words
+def _synthetic_segments(count, seed=0):
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"] + ["tion", "ment", "er", "st", "ing"]
+    vocabulary = list(dict.fromkeys("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(8000)))
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    segments = set()
+    while len(segments) < count:
+        batch = rng.choices(vocabulary, weights, k=4000)
+        position = 0
+        while position < len(batch) - 16 and len(segments) < count:
+            n = rng.randint(5, 16)
+            words = batch[position:position + n]
+            position += n
+            if rng.random() < 0.3:
+                words.insert(rng.randrange(len(words)), str(rng.randint(1, 5000)))
+            segments.add(" ".join(words).capitalize() + ".")
+    return list(segments)
+
+
+# Change one word (or one number) of a segment, like a rule edited from an existing one
+def _edit(segment, rng):
+    words = segment.rstrip(".").split()
+    i = rng.randrange(len(words))
+    words[i] = str(rng.randint(1, 5000)) if words[i].isdigit() or rng.random() < 0.3 else words[rng.randrange(len(words))] + "s"
+    return " ".join(words) + "."
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def benchmark(segments, queries, threshold, path=None):
+    rng = random.Random(1)
+    workdir = None
+    if path is None:
+        workdir = tempfile.mkdtemp(prefix="tm_bench_")
+        path = os.path.join(workdir, "tm.sqlite")
+    print(f"Generating {segments} segments...")
+    sources = _synthetic_segments(segments)
+    memory = TranslationMemory(path, threshold)
+    started = time.perf_counter()
+    for start in range(0, len(sources), 50000):
+        memory.add_many(((s, s.upper()) for s in sources[start:start + 50000]), "en", "xx")
+        print(f"  stored {min(start + 50000, len(sources))}/{len(sources)}", end="\r")
+    print(f"\nStored in {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    memory._index("en", "xx")
+    print(f"Index built in {time.perf_counter() - started:.1f}s "
+          f"({memory.indexes['en', 'xx'].keys.nbytes * 2 / 2**20:.0f} MiB in memory)")
+
+    originals = rng.sample(sources, queries)
+    edited = [_edit(s, rng) for s in originals]
+    # Edits that still score above the threshold against their original; these should all be found
+    reachable = sum(difflib.SequenceMatcher(None, normalize(e).split(), normalize(o).split()).ratio() >= threshold
+                    for e, o in zip(edited, originals))
+    print(f"{reachable} of the {queries} edited segments are still above the {threshold} threshold")
+    results = {}
+    for label, texts in [("exact", originals),
+                         ("near (one word/number changed)", edited),
+                         ("unrelated", _synthetic_segments(queries, seed=99))]:
+        latencies, hits = [], 0
+        for text in texts:
+            started = time.perf_counter()
+            match = memory.lookup(text, "en", "xx")
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += match is not None
+        results[label] = (hits, latencies)
+        print(f"{label:>32}: hits {hits}/{len(texts)}, "
+              f"p50 {_percentile(latencies, 50):.3f} ms, p95 {_percentile(latencies, 95):.3f} ms, "
+              f"p99 {_percentile(latencies, 99):.3f} ms")
+    memory.close()
+    if workdir:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzzy translation memory used by translate.py --tm")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("stats", help="Segments stored per language pair and origin")
+    p.add_argument("--tm", default="translation_memory.sqlite")
+    p = sub.add_parser("import", help="Seed the memory from translated workbooks/tables and TMX files")
+    p.add_argument("files", nargs="+", help=".tmx, or a translated .xlsx/.csv/.jsonl/.parquet (first column = source)")
+    p.add_argument("--tm", default="translation_memory.sqlite")
+    p.add_argument("--source", default="en", help="Source language of the files (default: en)")
+    p.add_argument("--origin", choices=list(ORIGIN_PRIORITY), default="reviewed",
+                   help="Origin of the imported translations, unless a TMX unit has an x-origin prop (default: reviewed)")
+    p = sub.add_parser("export", help="Write the memory to a .tmx file or a workbook/table")
+    p.add_argument("output", help=".tmx, or .xlsx/.csv/.jsonl/.parquet (one column per language)")
+    p.add_argument("--tm", default="translation_memory.sqlite")
+    p.add_argument("--source", default="en")
+    p.add_argument("--target", action="append", help="Only this target language (repeatable)")
+    p.add_argument("--origin", choices=list(ORIGIN_PRIORITY), help="Only segments of this origin")
+    p = sub.add_parser("benchmark", help="Lookup latency with a large synthetic memory")
+    p.add_argument("--segments", type=int, default=1000000)
+    p.add_argument("--queries", type=int, default=1000)
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    p.add_argument("--tm", help="Keep the benchmark memory in this file (default: a temp file)")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        memory = TranslationMemory(args.tm)
+        for source_lang, target_lang, origin, count in memory.stats():
+            print(f"{source_lang} -> {target_lang} ({origin}): {count} segments")
+        memory.close()
+    elif args.command == "import":
+        memory = TranslationMemory(args.tm)
+        for path in args.files:
+            started = time.perf_counter()
+            pairs = read_tmx(path, args.source) if path.lower().endswith(".tmx") else read_table_pairs(path, args.source)
+            counts = memory.import_pairs(pairs, args.source, args.origin,
+                                         progress=lambda n: print(f"  {path}: {n} pairs", end="\r"))
+            print(f"\n{path}: {counts.get('added', 0)} added, {counts.get('updated', 0)} updated, "
+                  f"{counts.get('kept', 0)} kept (reviewed translations are not replaced by machine ones) "
+                  f"in {time.perf_counter() - started:.1f}s")
+        memory.close()
+    elif args.command == "export":
+        memory = TranslationMemory(args.tm)
+        if args.output.lower().endswith(".tmx"):
+            count = memory.export_tmx(args.output, args.source, args.target, args.origin)
+        else:
+            count = memory.export_table(args.output, args.source, args.target, args.origin)
+        memory.close()
+        print(f"Saved {count} segments to '{args.output}'.")
+    else:
+        benchmark(args.segments, args.queries, args.threshold, args.tm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Long-running local translation service built on engine.py.
+
+Accepts workbook jobs over HTTP and runs them with the same engine as translate.py, but in
+one warm process: backend connection pools, the supported-language catalogue, quota windows
+and loaded local models stay in memory between jobs instead of being rebuilt by every run.
+
+    python translation_service.py --port 8765
+    curl --data-binary @Fraud_Rules.xlsx "http://127.0.0.1:8765/jobs?backend=3&source=en"
+    curl http://127.0.0.1:8765/jobs/1
+    curl -o Fraud_Rules_translated.xlsx http://127.0.0.1:8765/jobs/1/result
+
+Endpoints:
+    POST /jobs                 body: .xlsx/.csv/.jsonl/.parquet bytes; query: backend, source,
+                               ignore (comma-separated), name (its extension gives the format, default .xlsx)
+    GET  /jobs                 all jobs and their status
+    GET  /jobs/<id>            status, counts and log of one job
+    GET  /jobs/<id>/result     translated workbook (Translations / SuspectTranslations sheets),
+                               or the translated table in the input's format
+    GET  /jobs/<id>/suspects   suspects of a .csv/.jsonl/.parquet job
+    GET  /jobs/<id>/failed     failed_translations_log.csv for the job
+    GET  /health               uptime and what is warm
+    GET  /metrics              Prometheus metrics accumulated over all jobs
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import backends
+import engine
+from backends import BACKEND_CHOICES, get_backend
+from engine import (EngineOptions, format_workbook, supported_language_codes, translate_dataframe,
+                    write_failed_log, write_workbook)
+from metrics import Metrics
+from sharding import ShardPool
+from tabular_io import TABLE_EXTENSIONS, read_table, suspects_path, write_results_table
+from translation_memory import DEFAULT_THRESHOLD, TranslationMemory
+
+
+CONTENT_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".csv": "text/csv",
+    ".jsonl": "application/x-ndjson",
+    ".parquet": "application/vnd.apache.parquet",
+}
+
+
+class Job:
+    def __init__(self, job_id, name, workdir, source_lang, backend_choice, ignore_terms):
+        self.id = job_id
+        self.name = name
+        self.workdir = workdir
+        self.source_lang = source_lang
+        self.backend_choice = backend_choice
+        self.ignore_terms = ignore_terms
+        self.status = "queued"
+        self.error = ""
+        self.log = []
+        self.counts = {}
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def format(self):
+        ext = os.path.splitext(self.name)[1].lower()
+        return ext if ext in TABLE_EXTENSIONS else ".xlsx"
+
+    @property
+    def input_path(self):
+        return os.path.join(self.workdir, f"input{self.format}")
+
+    @property
+    def output_path(self):
+        return os.path.join(self.workdir, f"output{self.format}")
+
+    @property
+    def failed_path(self):
+        return os.path.join(self.workdir, "failed_translations_log.csv")
+
+    def to_dict(self, with_log=False):
+        info = {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "backend": BACKEND_CHOICES[self.backend_choice][0],
+            "counts": self.counts,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if with_log:
+            info["log"] = self.log[-200:]
+        return info
+
+
+class TranslationService:
+    def __init__(self, workers=2, processes=1, workdir=None, memory=None, concurrency=1):
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.shard_pool = ShardPool(processes)
+        self.metrics = Metrics()  # shared by all jobs, exported on /metrics
+        self.memory = memory      # translation memory shared by all jobs (None = off)
+        self.concurrency = concurrency  # most requests in flight per backend, adapted across all jobs
+        self.workdir = workdir or tempfile.mkdtemp(prefix="translation_service_")
+        self._owns_workdir = workdir is None  # only a temp directory we made is removed on close
+        self.started = time.time()
+
+    # Load what every job needs once, before the first request comes in
+    def warm_up(self):
+        for _, names in BACKEND_CHOICES.values():
+            for name in names:
+                get_backend(name)
+        return len(supported_language_codes())
+
+    def submit(self, data, name, source_lang, backend_choice, ignore_terms):
+        with self.lock:
+            job_id = next(self.ids)
+            workdir = os.path.join(self.workdir, f"job_{job_id}")
+            os.makedirs(workdir, exist_ok=True)
+            job = Job(job_id, name, workdir, source_lang, backend_choice, ignore_terms)
+            self.jobs[job_id] = job
+        with open(job.input_path, "wb") as f:
+            f.write(data)
+        self.executor.submit(self.run, job)
+        return job
+
+    def run(self, job):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            df = read_table(job.input_path)
+            options = EngineOptions(source_lang=job.source_lang, backend_choice=job.backend_choice,
+                                    ignore_terms=job.ignore_terms, shard_pool=self.shard_pool,
+                                    metrics=self.metrics, log=job.log.append, memory=self.memory,
+                                    concurrency=self.concurrency)
+            result = translate_dataframe(df, None, options)
+            job.log.extend(result.concurrency_report)
+            if job.format == ".xlsx":
+                write_workbook(result.df_with_bold, result.suspect_translations, job.output_path)
+                format_workbook(job.output_path, self.shard_pool)
+            else:
+                write_results_table(result.df_with_bold, result.suspect_translations, job.output_path)
+            if result.failed_translations:
+                write_failed_log(result.failed_translations, job.failed_path)
+            job.counts = {
+                "successful": result.success_count,
+                "skipped": result.skip_count,
+                "failed": result.fail_count,
+                "suspect": len(result.suspect_translations),
+                "memory_exact": result.memory_hits["exact"],
+                "memory_fuzzy": result.memory_hits["fuzzy"],
+                "memory_reviewed": result.memory_hits["reviewed"],
+                "coalesced": result.coalesced,
+            }
+            if result.exclusion_report:
+                job.log.append(result.exclusion_report)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            job.finished = time.time()
+
+    def health(self):
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "jobs": {status: statuses.count(status) for status in set(statuses)},
+            "warm_backends": sorted(backends._instances),
+            "languages": len(supported_language_codes()),
+            "requests_in_flight": engine._inflight.in_flight(),
+            "concurrency": {label: controller.limit for label, controller in engine._concurrency.controllers.items()},
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.shard_pool.close()
+        if self.memory:
+            self.memory.close()
+        if self._owns_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", filename=None):
+        data = body if isinstance(body, bytes) else body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if filename:
+            self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json(self, status, value):
+        self._send(status, json.dumps(value, ensure_ascii=False))
+
+    def _job(self, job_id):
+        job = self.service.jobs.get(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            self._json(404, {"error": f"No job {job_id}"})
+        return job
+
+    def do_GET(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if parts == ["health"]:
+            return self._json(200, self.service.health())
+        if parts == ["metrics"]:
+            return self._send(200, self.service.metrics.to_prometheus(), "text/plain; version=0.0.4")
+        if parts == ["jobs"]:
+            return self._json(200, [job.to_dict() for job in self.service.jobs.values()])
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self._job(parts[1])
+            if job is None:
+                return
+            if len(parts) == 2:
+                return self._json(200, job.to_dict(with_log=True))
+            if parts[2:] == ["result"]:
+                if job.status != "done":
+                    return self._json(409, {"error": f"Job {job.id} is {job.status}"})
+                with open(job.output_path, "rb") as f:
+                    name = f"{os.path.splitext(job.name)[0]}_translated{job.format}"
+                    return self._send(200, f.read(), CONTENT_TYPES[job.format], name)
+            if parts[2:] == ["suspects"]:
+                path = suspects_path(job.output_path)
+                if job.status != "done" or not os.path.exists(path):
+                    return self._json(404, {"error": f"Job {job.id} has no suspects file"})
+                with open(path, "rb") as f:
+                    name = f"{os.path.splitext(job.name)[0]}_translated_suspects{job.format}"
+                    return self._send(200, f.read(), CONTENT_TYPES[job.format], name)
+            if parts[2:] == ["failed"]:
+                if not os.path.exists(job.failed_path):
+                    return self._json(404, {"error": f"Job {job.id} has no failed translations"})
+                with open(job.failed_path, "rb") as f:
+                    return self._send(200, f.read(), "text/csv", "failed_translations_log.csv")
+        self._json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/jobs":
+            return self._json(404, {"error": "Not found"})
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        backend_choice = params.get("backend", "1")
+        if backend_choice not in BACKEND_CHOICES:
+            return self._json(400, {"error": f"Unknown backend '{backend_choice}'. Choices: {', '.join(BACKEND_CHOICES)}"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return self._json(400, {"error": "POST the workbook or table as the request body"})
+        data = self.rfile.read(length)
+        ignore_terms = [t.strip() for t in params.get("ignore", "").split(",") if t.strip()]
+        job = self.service.submit(data, params.get("name", "workbook.xlsx"), params.get("source", "en"),
+                                  backend_choice, ignore_terms)
+        self._json(202, job.to_dict())
+
+
+def make_server(service, host="127.0.0.1", port=8765):
+    handler = type("BoundServiceHandler", (ServiceHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm, long-running translation service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--jobs", type=int, default=2, help="Jobs translated at the same time")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Worker processes for CPU-bound stages, shared by all jobs (0 = one per core)")
+    parser.add_argument("--concurrency", type=int, default=1, metavar="MAX",
+                        help="Requests in flight per backend, adapted between 1 and MAX across all jobs (see translate.py --concurrency)")
+    parser.add_argument("--workdir", help="Where job inputs and outputs are kept (default: a temp directory)")
+    parser.add_argument("--tm", metavar="PATH", help="Fuzzy translation memory file shared by all jobs (see translate.py --tm)")
+    parser.add_argument("--tm-threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    memory = TranslationMemory(args.tm, args.tm_threshold) if args.tm else None
+    service = TranslationService(args.jobs, args.processes, args.workdir, memory, args.concurrency)
+    print("Warming up backends and language catalogue...")
+    n_languages = service.warm_up()
+    server = make_server(service, args.host, args.port)
+    host, port = server.server_address
+    print(f"Translation service listening on http://{host}:{port}/ ({n_languages} language codes known)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping translation service.")
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()